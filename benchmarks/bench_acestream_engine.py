@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Permitir importar los módulos de scripts/
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+sys.path.insert(0, os.path.join(parent_dir, 'scripts'))
+
+from acestream_engine import AceStreamEngine, EngineCluster, EngineError, EngineSessionPool, EngineUnavailable
+from stream_probe import STATUS_ENGINE, STATUS_TIMEOUT, StreamProber
+
+parser = argparse.ArgumentParser(description='Comprueba y mide el cliente de acestream_engine.py contra un motor AceStream simulado')
+parser.add_argument('--sessions', type=int, default=200, help='Sesiones abiertas en la medición')
+parser.add_argument('--pool_size', type=int, default=4, help='Tamaño del pool de sesiones')
+parser.add_argument('--hold', type=float, default=0.02, help='Segundos que se mantiene abierta cada sesión')
+parser.add_argument('--ready_after', type=int, default=2, help='Consultas a stat en prebuf antes de pasar a dl')
+parser.add_argument('--cluster_sizes', type=int, nargs='+', default=[2, 4, 2], help='Tamaño del pool de cada motor del clúster (el segundo deja de responder)')
+args = parser.parse_args()
+
+
+class StubEngine:
+    """Motor AceStream simulado en un hilo: getstream?format=json, stat y command?method=stop.
+
+    stat devuelve prebuf las primeras ready_after consultas de cada sesión y
+    luego dl. Los contenidos que empiezan por "never" no llegan a dl y los
+    que empiezan por "missing" devuelven error en getstream. Con responding
+    a False deja de responder: se queda colgado sin contestar. Lleva la
+    cuenta de las peticiones, las sesiones abiertas, paradas y el máximo de
+    abiertas a la vez.
+    """
+
+    def __init__(self, ready_after=2):
+        self.ready_after = ready_after
+        self.responding = True
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.active = set()
+        self.max_active = 0
+        self.started = 0
+        self.stopped = 0
+        self.polls = {}
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def _handler(self):
+        engine = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *_):
+                pass
+
+            def send_json(self, data):
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with engine.lock:
+                    engine.requests += 1
+                if not engine.responding:
+                    time.sleep(1)
+                    self.close_connection = True
+                    return
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+                base = f'http://127.0.0.1:{engine.port}'
+                if url.path == '/ace/getstream' and query.get('format') == ['json']:
+                    content_id, pid = query['id'][0], query['pid'][0]
+                    if content_id.startswith('missing'):
+                        return self.send_json({'response': None, 'error': 'content not found'})
+                    with engine.lock:
+                        engine.active.add(pid)
+                        engine.started += 1
+                        engine.max_active = max(engine.max_active, len(engine.active))
+                    return self.send_json({'response': {'playback_url': f'{base}/ace/r/{content_id}/{pid}',
+                                                        'stat_url': f'{base}/ace/stat/{content_id}/{pid}',
+                                                        'command_url': f'{base}/ace/cmd/{content_id}/{pid}'}, 'error': None})
+                if url.path.startswith('/ace/stat/'):
+                    content_id, pid = url.path.split('/')[3:5]
+                    with engine.lock:
+                        engine.polls[pid] = engine.polls.get(pid, 0) + 1
+                        ready = not content_id.startswith('never') and engine.polls[pid] > engine.ready_after
+                    return self.send_json({'response': {'status': 'dl' if ready else 'prebuf', 'peers': 3}, 'error': None})
+                if url.path.startswith('/ace/cmd/') and query.get('method') == ['stop']:
+                    with engine.lock:
+                        engine.active.discard(url.path.split('/')[4])
+                        engine.stopped += 1
+                    return self.send_json({'response': 'ok', 'error': None})
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        return Handler
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+failures = []
+
+
+def check(description, condition):
+    print(f"{'✅' if condition else '❌'} {description}")
+    if not condition:
+        failures.append(description)
+
+
+def check_wait_ready(stub):
+    engine = AceStreamEngine('127.0.0.1', stub.port)
+    try:
+        engine_session = engine.start('ready')
+        check("getstream?format=json devuelve las URLs de la sesión",
+              all((engine_session.playback_url, engine_session.stat_url, engine_session.command_url)))
+        pid = engine_session.stat_url.rsplit('/', 1)[-1]
+        check("wait_ready espera a que stat pase a dl", engine.wait_ready(engine_session, timeout=5, poll_interval=0.01))
+        check(f"wait_ready consulta stat hasta el estado dl ({stub.polls[pid]} consultas)", stub.polls[pid] == stub.ready_after + 1)
+        engine.stop(engine_session)
+
+        never = engine.start('never')
+        start = time.monotonic()
+        ready = engine.wait_ready(never, timeout=0.2, poll_interval=0.05)
+        elapsed = time.monotonic() - start
+        check(f"wait_ready devuelve False al agotar el plazo ({elapsed:.2f}s)", not ready and 0.2 <= elapsed < 1)
+        engine.stop(never)
+    finally:
+        engine.close()
+
+
+def check_pool(stub):
+    pool = EngineSessionPool(AceStreamEngine('127.0.0.1', stub.port), size=args.pool_size, ready_timeout=5, poll_interval=0.005)
+    started, stopped = stub.started, stub.stopped
+
+    def hold(index):
+        with pool.session(f'stream{index}'):
+            time.sleep(args.hold)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.pool_size * 4) as executor:
+        list(executor.map(hold, range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    print(f"⏱️ {args.sessions} sesiones en {elapsed:.2f}s ({args.sessions / elapsed:.0f} sesiones/s, pool de {args.pool_size})")
+    check(f"nunca hay más de {args.pool_size} sesiones abiertas en el motor (máximo {stub.max_active})",
+          stub.max_active == args.pool_size)
+    check("todas las sesiones se paran al salir del bloque",
+          stub.started - started == args.sessions and stub.stopped - stopped == args.sessions and not stub.active)
+
+    # Los huecos se liberan también cuando algo falla
+    stopped = stub.stopped
+    try:
+        with pool.session('error'):
+            raise RuntimeError('fallo en la captura')
+    except RuntimeError:
+        pass
+    check("un error dentro del bloque para la sesión", stub.stopped - stopped == 1)
+
+    pool.ready_timeout = 0.05
+    stopped = stub.stopped
+    try:
+        pool.open('never')
+        check("open lanza TimeoutError si el buffer no se llena", False)
+    except TimeoutError:
+        check("open lanza TimeoutError si el buffer no se llena y para la sesión", stub.stopped - stopped == 1)
+
+    try:
+        pool.open('missing')
+        check("un error de getstream llega como EngineError", False)
+    except EngineError as e:
+        check(f"un error de getstream llega como EngineError ({e})", True)
+
+    # El plazo del sondeo de un canal incluye la espera del hueco y del buffer
+    pool.ready_timeout = 5
+    prober = StreamProber(timeout=0.3, engine_pool=pool)
+    start = time.monotonic()
+    result = prober.probe('canal', 'http://127.0.0.1/ace/getstream?id=never', os.devnull)
+    elapsed = time.monotonic() - start
+    check(f"el sondeo respeta su plazo aunque ready_timeout sea mayor ({result.status} en {elapsed:.2f}s)",
+          result.status == STATUS_TIMEOUT and elapsed < 1)
+    with ExitStack() as stack:
+        for index in range(args.pool_size):
+            stack.enter_context(pool.session(f'stream{index}'))
+        start = time.monotonic()
+        result = prober.probe('canal', 'http://127.0.0.1/ace/getstream?id=stream0', os.devnull)
+        elapsed = time.monotonic() - start
+        check(f"sin huecos libres el sondeo acaba en su plazo como fallo del motor ({result.status} en {elapsed:.2f}s)",
+              result.status == STATUS_ENGINE and elapsed < 1)
+    started = stub.started
+    results = list(prober.probe_all([('canal', 'http://127.0.0.1/ace/getstream?id=never', os.devnull), ('espejo', 'http://127.0.0.1/ace/getstream?id=never', os.devnull)]))
+    check("probe_all sondea una sola vez cada stream", len(results) == 1 and stub.started - started == 1)
+
+    # Tras los fallos tienen que quedar todos los huecos libres
+    acquired = [pool._slots.acquire(blocking=False) for _ in range(args.pool_size)]
+    check("los fallos no dejan huecos ocupados en el pool", all(acquired) and not pool._slots.acquire(blocking=False))
+    for _ in acquired:
+        pool._slots.release()
+    pool.engine.close()
+
+
+def check_cluster(stubs):
+    pools = [EngineSessionPool(AceStreamEngine('127.0.0.1', stub.port, request_timeout=0.2), size=size, ready_timeout=5, poll_interval=0.005)
+             for stub, size in zip(stubs, args.cluster_sizes)]
+    cluster = EngineCluster(pools)
+    check("el clúster suma los huecos de todos los motores", cluster.size == sum(args.cluster_sizes))
+
+    # Reparto al menos cargado: con la mitad de los huecos ocupados, cada
+    # motor tiene la mitad de los suyos
+    with ExitStack() as stack:
+        for index in range(cluster.size // 2):
+            stack.enter_context(cluster.session(f'stream{index}'))
+        loads = [len(stub.active) for stub in stubs]
+        check(f"cada sesión va al motor menos cargado (abiertas por motor: {loads})",
+              loads == [size // 2 for size in args.cluster_sizes])
+        for index in range(cluster.size // 2, cluster.size):
+            stack.enter_context(cluster.session(f'stream{index}'))
+        loads = [len(stub.active) for stub in stubs]
+        check(f"con el clúster lleno se usan todos los huecos (abiertas por motor: {loads})", loads == args.cluster_sizes)
+    check("al salir se paran todas las sesiones", not any(stub.active for stub in stubs))
+
+    # Un motor deja de responder: al tocarle una sesión se marca como caído
+    # retry_after segundos y la sesión va a otro; mientras tanto no se le
+    # vuelve a preguntar
+    dead = stubs[1]
+    dead.responding = False
+    requests = dead.requests
+    live_size = cluster.size - args.cluster_sizes[1]
+    start = time.monotonic()
+    with ExitStack() as stack:
+        for index in range(live_size):
+            stack.enter_context(cluster.session(f'stream{index}'))
+        elapsed = time.monotonic() - start
+        loads = [len(stub.active) for stub in stubs]
+        check(f"las {live_size} sesiones se abren en los demás motores ({elapsed:.2f}s, abiertas por motor: {loads})",
+              loads == [size if stub is not dead else 0 for stub, size in zip(stubs, args.cluster_sizes)])
+    for index in range(cluster.size * 2):
+        with cluster.session(f'stream{index}'):
+            pass
+    down_for = cluster._down_until[1] - time.monotonic()
+    check(f"el motor sin respuesta queda fuera {cluster.retry_after}s (quedan {down_for:.1f}s)",
+          cluster.retry_after == 60 and 59 < down_for <= 60)
+    check(f"solo se le pregunta una vez en ese tiempo ({dead.requests - requests} peticiones)",
+          dead.requests - requests == 1 and cluster.stats[1]['unavailable'] == 1)
+
+    # Cuando vence el plazo (se adelanta aquí) se vuelve a probar el motor
+    dead.responding = True
+    cluster._down_until[1] = 0.0
+    with ExitStack() as stack:
+        for index in range(cluster.size):
+            stack.enter_context(cluster.session(f'stream{index}'))
+        check("al vencer el plazo el motor vuelve a recibir sesiones", len(dead.active) == args.cluster_sizes[1])
+
+    # Un error del motor con el stream cuenta como error, no como caída
+    try:
+        with cluster.session('missing'):
+            pass
+    except EngineError:
+        pass
+    check("un error de getstream cuenta en errors y no marca el motor como caído",
+          sum(stats['errors'] for stats in cluster.stats) == 1 and not any(cluster._down_until[index] for index in (0, 2)))
+
+    # Con todos los motores caídos la sesión falla con EngineUnavailable, y el
+    # sondeo lo da como fallo del motor (no cuenta contra el stream)
+    for stub in stubs:
+        stub.responding = False
+    try:
+        with cluster.session('stream0'):
+            pass
+        check("sin motores disponibles se lanza EngineUnavailable", False)
+    except EngineUnavailable:
+        check("sin motores disponibles se lanza EngineUnavailable", True)
+    result = StreamProber(engine_pool=cluster).probe('canal', 'http://127.0.0.1/ace/getstream?id=stream0', os.devnull)
+    check(f"StreamProber devuelve {STATUS_ENGINE} si no hay motor", result.status == STATUS_ENGINE)
+
+    for stats in cluster.stats:
+        print(f"🛰️ {stats['engine']}: {stats['sessions']} sesiones, {stats['errors']} fallidas, {stats['unavailable']} veces sin respuesta")
+    check("stats acumula las sesiones de cada motor",
+          [stats['sessions'] for stats in cluster.stats] == [stub.started for stub in stubs])
+    check("stats acumula las veces que cada motor no respondió",
+          [stats['unavailable'] for stats in cluster.stats] == [1, 2, 1])
+    cluster.close()
+
+
+stub = StubEngine(ready_after=args.ready_after)
+try:
+    check_wait_ready(stub)
+    check_pool(stub)
+finally:
+    stub.close()
+
+stubs = [StubEngine(ready_after=args.ready_after) for _ in args.cluster_sizes]
+try:
+    check_cluster(stubs)
+finally:
+    for stub in stubs:
+        stub.close()
+
+if failures:
+    print(f"\n❌ {len(failures)} comprobaciones fallidas")
+    sys.exit(1)
+print("\n✅ Todas las comprobaciones correctas")
@@ -0,0 +1,149 @@
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Permitir importar los módulos de scripts/
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+sys.path.insert(0, os.path.join(parent_dir, 'scripts'))
+
+from channel_db import CANALES_COLUMNS, configure_connection, create_export_indexes, ensure_canales_table, insert_canales, sync_canales
+from match_cache import MatchCache
+
+parser = argparse.ArgumentParser(description='Benchmark de la carga de canales_iptv_temp (fila a fila frente a executemany) '
+                                             'y de sync_canales sobre la tabla vacía (fría) y ya cargada (caliente)')
+parser.add_argument('--db_file', default=os.path.join(parent_dir, 'aux', 'zz_canales.db'), help='Base de datos de referencia')
+parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='Factores de multiplicación de los canales')
+parser.add_argument('--changed', type=float, default=0.01, help='Fracción de canales renombrados en la pasada caliente con cambios')
+args = parser.parse_args()
+
+EXPORT_QUERIES = (
+    'SELECT iptv_epg_id_new, iptv_group_new, name_new, iptv_url, FHD FROM canales_iptv_temp WHERE presente = 1 AND activo = 1 ORDER BY iptv_group_new, name_new',
+    'SELECT iptv_epg_id_original, name_original, iptv_url FROM canales_iptv_temp WHERE presente = 1 AND activo = 0 ORDER BY name_original',
+)
+
+
+def empty_db(db_path):
+    """Copia de la base de referencia sin canales ni caché de correspondencias"""
+    shutil.copyfile(args.db_file, db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute('DROP TABLE IF EXISTS canales_iptv_temp')
+    conn.execute('DROP TABLE IF EXISTS match_cache')
+    conn.commit()
+    conn.close()
+
+
+def legacy_load(db_path, rows):
+    """Reproduce la carga anterior: un INSERT y un UPDATE por canal"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    ensure_canales_table(cursor)
+    for row in rows:
+        cursor.execute(f'''INSERT INTO canales_iptv_temp ({', '.join(CANALES_COLUMNS)})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', row[:3] + ("",) + row[4:5] + ("", row[6], "", 0, row[9]))
+    for id_temp, row in enumerate(rows, start=1):
+        if row[8]:
+            cursor.execute('UPDATE canales_iptv_temp SET activo = 1, iptv_epg_id_new = ?, iptv_group_new = ?, name_new = ? WHERE id = ?',
+                           (row[3], row[5], row[7], id_temp))
+        else:
+            cursor.execute('UPDATE canales_iptv_temp SET activo = 0 WHERE id = ?', (id_temp,))
+    conn.commit()
+    conn.close()
+
+
+def bulk_load(db_path, rows):
+    """Carga en bloque: executemany en una sola transacción y los índices al final"""
+    conn = sqlite3.connect(db_path)
+    configure_connection(conn)
+    cursor = conn.cursor()
+    cursor.execute('BEGIN')
+    ensure_canales_table(cursor)
+    insert_canales(cursor, rows)
+    create_export_indexes(cursor)
+    conn.commit()
+    conn.close()
+
+
+def scaled_canales(base, scale):
+    """Repite los canales con ids de Acestream y nombres distintos en cada copia"""
+    canales = []
+    for copy in range(scale):
+        for channel_name, tvg_id, group_title, url, fhd in base:
+            if copy:
+                channel_name, url = f"{channel_name} {copy}", f"{url}{copy:04x}"
+            canales.append((channel_name, tvg_id, group_title, url, fhd))
+    return canales
+
+
+def timed_sync(db_path, canales):
+    """Importación como la de process_channel_list: una transacción con la
+    caché de correspondencias, sync_canales y los índices de la exportación"""
+    conn = sqlite3.connect(db_path)
+    configure_connection(conn)
+    cursor = conn.cursor()
+    start = time.perf_counter()
+    cursor.execute('BEGIN')
+    ensure_canales_table(cursor)
+    matcher = MatchCache(cursor, 'bench')
+    stats = sync_canales(cursor, canales, matcher, datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3])
+    create_export_indexes(cursor)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed, stats
+
+
+def export_time(db_path):
+    conn = sqlite3.connect(db_path)
+    start = time.perf_counter()
+    for query in EXPORT_QUERIES:
+        conn.execute(query).fetchall()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+conn = sqlite3.connect(args.db_file)
+base_rows = conn.execute(f"SELECT {', '.join(CANALES_COLUMNS)} FROM canales_iptv_temp ORDER BY id").fetchall()
+base = [(row[1], row[2], row[4], row[6], row[9]) for row in base_rows]
+conn.close()
+if not base:
+    print(f"Error: la tabla canales_iptv_temp de {args.db_file} está vacía")
+    sys.exit(1)
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    print("Carga de canales_iptv_temp")
+    print(f"{'filas':>8} {'fila a fila (s)':>16} {'executemany (s)':>16} {'mejora':>8} {'export antes (s)':>17} {'export después (s)':>19}")
+    for scale in args.scales:
+        rows = base_rows * scale
+        timings = {}
+        for name, load in (('legacy', legacy_load), ('bulk', bulk_load)):
+            db_path = os.path.join(tmp_dir, f"{name}_{scale}.db")
+            empty_db(db_path)
+            start = time.perf_counter()
+            load(db_path, rows)
+            timings[name] = (time.perf_counter() - start, export_time(db_path))
+        print(f"{len(rows):>8} {timings['legacy'][0]:>16.3f} {timings['bulk'][0]:>16.3f} {timings['legacy'][0] / timings['bulk'][0]:>7.1f}x"
+              f" {timings['legacy'][1]:>17.4f} {timings['bulk'][1]:>19.4f}", flush=True)
+
+    print("\nsync_canales")
+    print(f"{'filas':>8} {'fría (s)':>9} {'caliente (s)':>13} {'mejora':>8} {f'con {args.changed:.0%} cambios (s)':>20} {'recalculados':>13} {'export (s)':>11}")
+    for scale in args.scales:
+        canales = scaled_canales(base, scale)
+        db_path = os.path.join(tmp_dir, f"sync_{scale}.db")
+        empty_db(db_path)
+
+        cold, _ = timed_sync(db_path, canales)
+        # Caliente: la misma lista otra vez, sin cambios
+        warm, _ = timed_sync(db_path, canales)
+        # Caliente con una parte de los canales renombrados, que hay que volver a emparejar
+        step = max(1, round(1 / args.changed)) if args.changed else len(canales) + 1
+        changed = [(f"{canal[0]} NUEVO",) + canal[1:] if index % step == 0 else canal for index, canal in enumerate(canales)]
+        warm_changed, stats = timed_sync(db_path, changed)
+        print(f"{len(canales):>8} {cold:>9.3f} {warm:>13.3f} {cold / warm:>7.1f}x {warm_changed:>20.3f} {stats['recalculados']:>13}"
+              f" {export_time(db_path):>11.4f}", flush=True)
@@ -0,0 +1,102 @@
+import argparse
+import os
+import random
+import sqlite3
+import string
+import sys
+import time
+
+import Levenshtein
+
+# Permitir importar los módulos de scripts/
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(script_dir), 'scripts'))
+
+from channel_matcher import ChannelMatcher
+
+parser = argparse.ArgumentParser(description='Benchmark del emparejado de canales: LIKE en SQLite frente a Aho-Corasick')
+parser.add_argument('--channels', type=int, nargs='+', default=[1000, 10000], help='Número de canales importados')
+parser.add_argument('--roots', type=int, nargs='+', default=[500, 5000], help='Número de channel_root en correspondencia_canales')
+parser.add_argument('--sql_limit', type=int, default=2000, help='Máximo de canales a emparejar con LIKE (se extrapola el resto)')
+parser.add_argument('--seed', type=int, default=1234)
+args = parser.parse_args()
+
+
+def random_word(rng, min_len=3, max_len=8):
+    return ''.join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(rng.randint(min_len, max_len)))
+
+
+def generate_roots(rng, count):
+    roots = set()
+    while len(roots) < count:
+        roots.add(' '.join(random_word(rng) for _ in range(rng.randint(1, 3))))
+    return sorted(roots)
+
+
+def generate_names(rng, roots, count):
+    names = []
+    for _ in range(count):
+        # Dos de cada tres nombres contienen alguna raíz, el resto no
+        if rng.random() < 0.66:
+            base = rng.choice(roots)
+        else:
+            base = random_word(rng)
+        quality = rng.choice(['FHD', 'HD', '1080', 'SD'])
+        names.append(f"{base} {quality} {random_word(rng, 4, 4)} --> NEW ERA")
+    return names
+
+
+def build_db(roots):
+    conn = sqlite3.connect(':memory:')
+    cursor = conn.cursor()
+    cursor.execute('''CREATE TABLE correspondencia_canales (
+        channel_root TEXT UNIQUE, channel_epg_id TEXT, channel_name TEXT, channel_group TEXT,
+        id INTEGER PRIMARY KEY AUTOINCREMENT)''')
+    cursor.executemany('INSERT INTO correspondencia_canales (channel_root, channel_epg_id, channel_name, channel_group) VALUES (?, ?, ?, ?)',
+                       [(root, f"{root} HD", root.title(), 'GRUPO') for root in roots])
+    conn.commit()
+    return conn
+
+
+def match_sql(cursor, names):
+    results = []
+    for name in names:
+        cursor.execute("SELECT id, channel_root, channel_epg_id, channel_group, channel_name FROM correspondencia_canales WHERE ? LIKE '%' || channel_root || '%'", (name,))
+        posibles_correspondencias = cursor.fetchall()
+        if posibles_correspondencias:
+            results.append(min(posibles_correspondencias, key=lambda x: Levenshtein.distance(name, x[1])))
+        else:
+            results.append(None)
+    return results
+
+
+rng = random.Random(args.seed)
+print(f"{'canales':>8} {'raíces':>7} {'LIKE (s)':>10} {'construir (s)':>14} {'autómata (s)':>13} {'mejora':>8}")
+for n_roots in args.roots:
+    roots = generate_roots(rng, n_roots)
+    conn = build_db(roots)
+    cursor = conn.cursor()
+    for n_channels in args.channels:
+        names = generate_names(rng, roots, n_channels)
+
+        start = time.perf_counter()
+        matcher = ChannelMatcher.from_db(cursor)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        automaton_results = [matcher.best_match(name) for name in names]
+        automaton_time = time.perf_counter() - start
+
+        # La consulta LIKE se mide sobre una muestra y se extrapola
+        sample = names[:args.sql_limit]
+        start = time.perf_counter()
+        sql_results = match_sql(cursor, sample)
+        sql_time = (time.perf_counter() - start) * len(names) / len(sample)
+
+        if sql_results != automaton_results[:len(sample)]:
+            print("Error: los resultados del autómata no coinciden con la consulta LIKE")
+            sys.exit(1)
+
+        total = build_time + automaton_time
+        print(f"{n_channels:>8} {n_roots:>7} {sql_time:>10.3f} {build_time:>14.3f} {automaton_time:>13.3f} {sql_time / total:>7.1f}x")
+    conn.close()
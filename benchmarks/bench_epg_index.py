@@ -0,0 +1,77 @@
+import argparse
+import gzip
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+# Permitir importar los módulos de scripts/
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+sys.path.insert(0, os.path.join(parent_dir, 'scripts'))
+
+from epg_index import iter_xmltv_channels
+
+parser = argparse.ArgumentParser(description='Benchmark de lectura de los canales de guías XMLTV en streaming frente a cargar el árbol entero')
+parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 150], help='Tamaño aproximado de cada guía sin comprimir (MB)')
+parser.add_argument('--channels', type=int, default=2000, help='Canales de cada guía')
+parser.add_argument('--tree_max_mb', type=float, default=50, help='Tamaño máximo para medir ET.parse del árbol completo')
+parser.add_argument('--seed', type=int, default=1234)
+args = parser.parse_args()
+
+
+def generate_guide(path, size_mb, channels, rng):
+    """Guía XMLTV sintética comprimida con gzip: canales y programas hasta size_mb"""
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=1) as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<tv generator-info-name="bench">\n')
+        for i in range(channels):
+            f.write(f'<channel id="Canal{i}.es"><display-name lang="es">Canal {i} HD</display-name>'
+                    f'<display-name lang="en">Channel {i}</display-name><icon src="https://example.com/{i}.png"/></channel>\n')
+        written = 0
+        programme = 0
+        while written < size_mb * 1e6:
+            hour = programme % 24
+            line = (f'<programme start="20251014{hour:02d}0000 +0200" stop="20251014{hour:02d}5900 +0200" '
+                    f'channel="Canal{rng.randrange(channels)}.es"><title lang="es">Programa {programme}</title>'
+                    f'<desc lang="es">Descripción del programa {programme} con algo de texto para ocupar espacio</desc>'
+                    f'<category lang="es">Deportes</category></programme>\n')
+            f.write(line)
+            written += len(line)
+            programme += 1
+        f.write('</tv>\n')
+
+
+def streaming(path):
+    return sum(1 for _ in iter_xmltv_channels(path))
+
+
+def full_tree(path):
+    with gzip.open(path, 'rb') as f:
+        return len(ET.parse(f).getroot().findall('channel'))
+
+
+def measure(func, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+rng = random.Random(args.seed)
+print(f"{'MB':>6} {'gzip MB':>8} {'canales':>8} {'streaming (s)':>14} {'pico (KB)':>10} {'árbol (s)':>10} {'pico árbol (KB)':>16}")
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for size_mb in args.sizes:
+        path = os.path.join(tmp_dir, f'guia_{size_mb}.xml.gz')
+        generate_guide(path, size_mb, args.channels, rng)
+        count, elapsed, peak = measure(streaming, path)
+        tree = '-', '-'
+        if size_mb <= args.tree_max_mb:
+            _, tree_elapsed, tree_peak = measure(full_tree, path)
+            tree = f'{tree_elapsed:.3f}', f'{tree_peak / 1024:.0f}'
+        print(f"{size_mb:>6} {os.path.getsize(path) / 1e6:>8.1f} {count:>8} {elapsed:>14.3f} {peak / 1024:>10.0f} {tree[0]:>10} {tree[1]:>16}", flush=True)
@@ -0,0 +1,92 @@
+import argparse
+import csv
+import io
+import os
+import re
+import sys
+import time
+
+# Permitir importar los módulos de scripts/
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(script_dir), 'scripts'))
+
+from event_extractor import EVENT_FIELDS, available_backends, extract_events
+from synthetic import generate_iframe_html
+
+parser = argparse.ArgumentParser(description='Benchmark de la extracción de eventos del HTML del iframe')
+parser.add_argument('--scales', type=int, nargs='+', default=[1, 10], help='Escalas de la página sintética (1 = captura real)')
+parser.add_argument('--legacy_max_scale', type=int, default=1, help='Escala máxima para medir la búsqueda cuadrática anterior')
+args = parser.parse_args()
+
+
+def legacy_events(html):
+    """Extracción anterior: find() de la fila de detalles sobre todo el día por cada evento"""
+    from bs4 import BeautifulSoup
+    from event_extractor import _bs4_format_competition_info, _bs4_format_match_info, replace_commas_with_dots
+
+    soup = BeautifulSoup(html, 'html.parser')
+    events = []
+    for day in soup.find('div', id='eventsContainer').find_all('div', class_='events-day'):
+        date_from_attr = day.get('data-date', '')
+        date_from_text = re.search(r'(\d{2}/\d{2}/\d{4})', day.h2.get_text() if day.h2 else '')
+        date = date_from_attr if date_from_attr else (date_from_text.group(1) if date_from_text else 'Fecha desconocida')
+        for event_row in day.find_all('tr', class_='event-row'):
+            event_id = event_row.get('data-event-id', '')
+            detail_row = day.find('tr', class_='event-detail', attrs={'data-event-id': event_id})
+            if not detail_row:
+                continue
+            cols = event_row.find_all('td')
+            if len(cols) < 4:
+                continue
+            time_text = cols[0].get_text(strip=True)
+            competition = _bs4_format_competition_info(cols[1])
+            match = _bs4_format_match_info(cols[2])
+            if event_id.endswith('--'):
+                teams = match.split(' vs ') if ' vs ' in match else [match]
+                event_id = f"{time_text}-{'-'.join([t.strip() for t in teams])}"
+            for group in detail_row.find_all('div', class_='stream-channel-group'):
+                group_name = group.find('h4').get_text(strip=True) if group.find('h4') else 'Sin grupo'
+                for link in group.find_all('a', class_='stream-link', onclick=re.compile(r"openAcestream\('([a-f0-9]+)'")):
+                    acestream_id = re.search(r"openAcestream\('([a-f0-9]+)'", link['onclick']).group(1)
+                    quality = 'FHD' if 'FHD' in link.get_text() else ('SD' if 'SD' in link.get_text() else '')
+                    events.append(replace_commas_with_dots({
+                        'date': date, 'event_id': event_id, 'time': time_text, 'competition': competition,
+                        'match': match, 'group': group_name, 'acestream_id': acestream_id, 'quality': quality}))
+    return events
+
+
+def to_csv(events):
+    output = io.StringIO(newline='')
+    writer = csv.DictWriter(output, fieldnames=EVENT_FIELDS)
+    writer.writeheader()
+    writer.writerows(events)
+    return output.getvalue()
+
+
+backends = available_backends()
+print(f"{'escala':>6} {'KB':>8} {'entradas':>9} " + ' '.join(f"{name + ' (s)':>10}" for name in backends) + f" {'anterior (s)':>13}")
+for scale in args.scales:
+    html = generate_iframe_html(scale)
+    timings = []
+    reference = None
+    for backend in backends:
+        start = time.perf_counter()
+        events = extract_events(html, backend=backend)
+        timings.append(time.perf_counter() - start)
+        output = to_csv(events)
+        if reference is None:
+            reference = output
+        elif output != reference:
+            print(f"Error: el CSV del backend {backend} no coincide con el de {backends[0]}")
+            sys.exit(1)
+
+    legacy = f"{'-':>13}"
+    if 'bs4' in backends and scale <= args.legacy_max_scale:
+        start = time.perf_counter()
+        legacy_output = to_csv(legacy_events(html))
+        legacy = f"{time.perf_counter() - start:>13.3f}"
+        if legacy_output != reference:
+            print("Error: el CSV no coincide con el de la extracción anterior")
+            sys.exit(1)
+
+    print(f"{scale:>6} {len(html) / 1024:>8.0f} {len(events):>9} " + ' '.join(f"{t:>10.3f}" for t in timings) + f" {legacy}", flush=True)
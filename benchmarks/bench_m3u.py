@@ -0,0 +1,73 @@
+import argparse
+import glob
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Permitir importar los módulos de scripts/
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+sys.path.insert(0, os.path.join(parent_dir, 'scripts'))
+
+from m3u import M3UWriter, iter_m3u_file
+
+parser = argparse.ArgumentParser(description='Benchmark de lectura de listas M3U en streaming frente a la regex DOTALL anterior')
+parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='Número de veces que se repiten las entradas de cada fichero')
+parser.add_argument('--legacy_max_mb', type=float, default=1.0,
+                    help='Tamaño máximo para medir la regex anterior, que es cuadrática en listas sin tvg-logo')
+args = parser.parse_args()
+
+# Expresión que usaba process_m3u.py sobre el fichero completo en memoria
+LEGACY_PATTERN = re.compile(
+    r'#EXTINF:-1.*?tvg-logo="(?P<logo_url>[^"]+)".*?tvg-id="(?P<tvg_id>[^"]+)".*?group-title="[^"]*",(?P<channel_name>[^\n]+)\n(?P<stream_url>http[^\n]+)',
+    re.DOTALL
+)
+
+
+def legacy_parse(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    return sum(1 for _ in LEGACY_PATTERN.finditer(content))
+
+
+def streaming_parse(path):
+    return sum(1 for _ in iter_m3u_file(path))
+
+
+def measure(func, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+sources = [os.path.join(parent_dir, 'aux', 'kanalak_jatorrizko.m3u')] + sorted(glob.glob(os.path.join(parent_dir, 'zerrendak', '*.m3u')))
+
+print(f"{'fichero':<24} {'escala':>6} {'MB':>7} {'entradas':>9} {'streaming (s)':>14} {'entradas/s':>11} {'pico (KB)':>10} {'regex (s)':>10} {'pico regex (KB)':>16}")
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for source in sources:
+        entries = list(iter_m3u_file(source))
+        for scale in args.scales:
+            path = os.path.join(tmp_dir, os.path.basename(source))
+            with open(path, 'w', encoding='utf-8') as f:
+                writer = M3UWriter(f)
+                writer.write_header('#EXTM3U\n')
+                for _ in range(scale):
+                    for entry in entries:
+                        writer.write_entry(entry)
+            size_mb = os.path.getsize(path) / 1e6
+
+            count, elapsed, peak = measure(streaming_parse, path)
+            if size_mb <= args.legacy_max_mb:
+                _, legacy_elapsed, legacy_peak = measure(legacy_parse, path)
+                legacy = f"{legacy_elapsed:>10.3f} {legacy_peak / 1024:>16.0f}"
+            else:
+                legacy = f"{'-':>10} {'-':>16}"
+            print(f"{os.path.basename(source):<24} {scale:>6} {size_mb:>7.2f} {count:>9} {elapsed:>14.3f} {count / elapsed:>11.0f}"
+                  f" {peak / 1024:>10.0f} {legacy}", flush=True)
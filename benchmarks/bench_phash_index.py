@@ -0,0 +1,125 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Permitir importar los módulos de scripts/
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+sys.path.insert(0, os.path.join(parent_dir, 'scripts'))
+
+from phash_index import SAME_PICTURE_DISTANCE, TIME_FORMAT, PHashIndex, cluster_streams, hamming
+
+parser = argparse.ArgumentParser(description='Benchmark del índice de hashes perceptuales: búsqueda en el histórico '
+                                             'y agrupación de espejos frente a la matriz de distancias de todos los pares')
+parser.add_argument('--history', type=int, nargs='+', default=[10000, 100000, 1000000], help='Hashes en el histórico')
+parser.add_argument('--streams', type=int, nargs='+', default=[100, 500, 2000], help='Streams de un sondeo')
+parser.add_argument('--frames', type=int, default=3, help='Frames por stream')
+parser.add_argument('--mirrors', type=int, default=3, help='Streams que muestran la misma imagen')
+parser.add_argument('--queries', type=int, default=100, help='Búsquedas por tamaño de histórico')
+parser.add_argument('--pairwise_max', type=int, default=2000, help='Streams máximos para medir la matriz de todos los pares')
+parser.add_argument('--seed', type=int, default=1234)
+args = parser.parse_args()
+
+
+def random_hashes(rng, count):
+    return rng.integers(0, np.iinfo(np.uint64).max, size=count, dtype=np.uint64, endpoint=True)
+
+
+def flip_bits(rng, value, bits):
+    for bit in rng.choice(64, size=bits, replace=False):
+        value ^= np.uint64(1) << np.uint64(bit)
+    return value
+
+
+def synthetic_probe(rng, streams):
+    """acestream_id -> hashes de sus frames; cada args.mirrors streams seguidos
+    emiten la misma imagen con unos pocos bits distintos"""
+    stream_hashes = {}
+    for group in range(0, streams, args.mirrors):
+        base = random_hashes(rng, args.frames)
+        for index in range(group, min(group + args.mirrors, streams)):
+            stream_hashes[f'{index:040x}'] = np.array([flip_bits(rng, value, 3) for value in base], dtype=np.uint64)
+    return stream_hashes
+
+
+def pairwise_clusters(stream_hashes, max_distance=SAME_PICTURE_DISTANCE):
+    """Agrupación anterior: matriz de distancias de todos los pares de frames"""
+    keys = sorted(stream_hashes)
+    owners = np.concatenate([np.full(len(stream_hashes[key]), index) for index, key in enumerate(keys)])
+    hashes = np.concatenate([np.asarray(stream_hashes[key], dtype=np.uint64).ravel() for key in keys])
+    parent = list(range(len(keys)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    close = hamming(hashes[:, None], hashes[None, :]) <= max_distance
+    for a, b in zip(*np.nonzero(np.triu(close, k=1))):
+        root_a, root_b = find(owners[a]), find(owners[b])
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    return {key: keys[find(index)] for index, key in enumerate(keys)}
+
+
+def measure(func, *func_args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*func_args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+rng = np.random.default_rng(args.seed)
+now = datetime.now()
+
+print("Búsqueda en el histórico (PHashIndex.nearest)")
+print(f"{'hashes':>9} {'add (s)':>8} {'1ª búsqueda (s)':>16} {'búsqueda (ms)':>14} {'encontrados':>12}")
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for history in args.history:
+        db_path = os.path.join(tmp_dir, f'health_{history}.db')
+        hashes = random_hashes(rng, history)
+        per_probe = max(1, history // 30)
+        # Un sondeo por día hasta completar el histórico
+        with PHashIndex(db_path) as index:
+            start = time.perf_counter()
+            for day, offset in enumerate(range(0, history, per_probe)):
+                captured_at = (now - timedelta(days=29) + timedelta(days=day)).strftime(TIME_FORMAT)
+                chunk = hashes[offset:offset + per_probe]
+                index.add(captured_at, {f'{i:040x}': chunk[i:i + 1] for i in range(len(chunk))})
+            add_elapsed = time.perf_counter() - start
+
+        queries = [flip_bits(rng, value, 4) for value in rng.choice(hashes, size=args.queries)]
+        with PHashIndex(db_path) as index:
+            start = time.perf_counter()
+            found = len(index.nearest(queries[0]))
+            first = time.perf_counter() - start
+            start = time.perf_counter()
+            for value in queries:
+                found += len(index.nearest(value))
+            lookup = (time.perf_counter() - start) / len(queries)
+        print(f"{history:>9} {add_elapsed:>8.2f} {first:>16.3f} {lookup * 1000:>14.3f} {found:>12}", flush=True)
+
+print("\nAgrupación de espejos (cluster_streams)")
+print(f"{'streams':>8} {'frames':>7} {'todos los pares (s)':>20} {'pico (MB)':>10} {'búsqueda (s)':>13} {'pico (MB)':>10} {'grupos':>7}")
+for streams in args.streams:
+    stream_hashes = synthetic_probe(rng, streams)
+    clusters, elapsed, peak = measure(cluster_streams, stream_hashes)
+    pairwise = '-', '-'
+    if streams <= args.pairwise_max:
+        expected, pairwise_elapsed, pairwise_peak = measure(pairwise_clusters, stream_hashes)
+        if expected != clusters:
+            print(f"Error: cluster_streams no coincide con la matriz de todos los pares para {streams} streams")
+            sys.exit(1)
+        pairwise = f'{pairwise_elapsed:.3f}', f'{pairwise_peak / 1e6:.1f}'
+    print(f"{streams:>8} {streams * args.frames:>7} {pairwise[0]:>20} {pairwise[1]:>10} {elapsed:>13.3f} {peak / 1e6:>10.1f}"
+          f" {len(set(clusters.values())):>7}", flush=True)
@@ -0,0 +1,227 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Permitir importar los módulos de scripts/
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+scripts_dir = os.path.join(parent_dir, 'scripts')
+sys.path.insert(0, scripts_dir)
+
+from channel_db import (configure_connection, create_export_indexes, ensure_canales_table, read_correspondencias_csv,
+                        recreate_correspondencia_table, sync_canales)
+from channel_matcher import ChannelMatcher
+from event_extractor import extract_events
+from m3u import iter_m3u_file
+from process_channel_list import read_canales, write_channel_lists
+from stream_health import HEALTH_DB_FILE, attach_health_db, ensure_health_table
+from synthetic import generate_correspondencias_csv, generate_iframe_html
+
+parser = argparse.ArgumentParser(description='Benchmark de todas las etapas de generación de listas sobre datos sintéticos')
+parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='Escalas de los datos sintéticos (1 = captura real)')
+parser.add_argument('--repeat', type=int, default=3, help='Repeticiones de cada etapa (se guarda la más rápida)')
+parser.add_argument('--seed', type=int, default=1234)
+parser.add_argument('--report', default=os.path.join(script_dir, 'bench_pipeline.json'), help='Fichero JSON de resultados')
+parser.add_argument('--baseline', help='Informe JSON anterior con el que comparar los tiempos')
+parser.add_argument('--tolerance', type=float, default=0.25, help='Empeoramiento relativo permitido frente a --baseline')
+args = parser.parse_args()
+
+AUX = 'aux'
+LISTAS = 'listas'
+
+
+def timed(func, repeat):
+    """Ejecuta func repeat veces y devuelve (mejor tiempo, último resultado)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_script(name, work_dir, *script_args):
+    command = [sys.executable, os.path.join(scripts_dir, name), '--aux_folder', os.path.join(work_dir, AUX),
+               '--listas_folder', os.path.join(work_dir, LISTAS), *script_args]
+    completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{name} terminó con código {completed.returncode}: {completed.stderr.decode(errors='replace')}")
+
+
+def parse_iframe(work_dir):
+    run_script('parse_iframe_data.py', work_dir, '--html_file', 'page_iframe_content.html', '--csv_file', 'ekitaldiak.csv',
+               '--m3u_events_file', 'ekitaldiak.m3u', '--m3u_channels_file', 'kanalak_jatorrizko.m3u',
+               '--db_file', 'zz_canales.db', '--force')
+
+
+def process_channel_list(work_dir, force=True):
+    run_script('process_channel_list.py', work_dir, '--list_orig_file', 'kanalak_jatorrizko.m3u', '--db_file', 'zz_canales.db',
+               '--csv_channels_file', 'correspondencia_canales.csv', '--csv_list_file', 'canales_iptv_temp.csv',
+               '--m3u_channels_file', 'kanalak', *(['--force'] if force else []))
+
+
+def mark_unhealthy(work_dir, fraction=0.1):
+    """Simula un sondeo de process_m3u.py: marca como caídos una parte de los streams en stream_health.db"""
+    aux_dir = os.path.join(work_dir, AUX)
+    conn = sqlite3.connect(os.path.join(aux_dir, 'zz_canales.db'))
+    keys = [row[0] for row in conn.execute('SELECT acestream_id FROM canales_iptv_temp WHERE presente = 1 ORDER BY id')]
+    conn.close()
+    conn = sqlite3.connect(os.path.join(aux_dir, HEALTH_DB_FILE))
+    ensure_health_table(conn)
+    conn.executemany('INSERT OR REPLACE INTO stream_health (acestream_id, healthy) VALUES (?, 0)',
+                     [(key,) for key in keys[::max(1, round(1 / fraction))]])
+    conn.commit()
+    conn.close()
+
+
+def regenerated(work_dir, change=None):
+    """Ejecuta process_channel_list sin --force (tras change) y dice si ha vuelto a escribir las listas"""
+    list_path = os.path.join(work_dir, LISTAS, 'kanalak_ott.m3u')
+    before = os.stat(list_path).st_mtime_ns
+    if change is not None:
+        change(work_dir)
+    process_channel_list(work_dir, force=False)
+    return os.stat(list_path).st_mtime_ns != before
+
+
+def read_channels(m3u_path):
+    with open(m3u_path, 'r', encoding='utf-8') as file:
+        canales, _ = read_canales(file)
+    return canales
+
+
+def match_all(correspondencias, canales):
+    matcher = ChannelMatcher([(index, *row[:2], row[3], row[2]) for index, row in enumerate(correspondencias, start=1)])
+    return sum(1 for canal in canales if matcher.best_match(canal[0]))
+
+
+def db_write(db_path, correspondencias, canales):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    configure_connection(conn)
+    cursor = conn.cursor()
+    cursor.execute('BEGIN')
+    recreate_correspondencia_table(cursor, correspondencias)
+    ensure_canales_table(cursor)
+    sync_canales(cursor, canales, ChannelMatcher.from_db(cursor), datetime.now().strftime('%Y-%m-%d %H:%M:%S.000'),
+                 rematch_all=True)
+    create_export_indexes(cursor)
+    conn.commit()
+    conn.close()
+
+
+def export(db_path, health_db_path, base_path):
+    """Exportación de process_channel_list.py, con la salud de los streams del último sondeo"""
+    conn = sqlite3.connect(db_path)
+    try:
+        attach_health_db(conn, health_db_path)
+        write_channel_lists(conn.cursor(), base_path)
+    finally:
+        conn.close()
+
+
+def process_m3u_parse(m3u_path):
+    """Filtrado de la lista como en process_m3u.py"""
+    return sum(1 for entry in iter_m3u_file(m3u_path)
+               if entry.tvg_logo and entry.tvg_id and entry.url.startswith('http'))
+
+
+def bench_scale(scale, work_dir):
+    aux_dir = os.path.join(work_dir, AUX)
+    os.makedirs(aux_dir, exist_ok=True)
+    os.makedirs(os.path.join(work_dir, LISTAS), exist_ok=True)
+    rng = random.Random(args.seed)
+    html = generate_iframe_html(scale, seed=args.seed)
+    with open(os.path.join(aux_dir, 'page_iframe_content.html'), 'w', encoding='utf-8') as f:
+        f.write(html)
+    with open(os.path.join(aux_dir, 'correspondencia_canales.csv'), 'w', encoding='utf-8') as f:
+        f.write(generate_correspondencias_csv(rng, scale))
+
+    stages = {}
+    stages['parse_iframe_data'], _ = timed(lambda: parse_iframe(work_dir), args.repeat)
+    stages['parse_iframe_data.extract_events'], events = timed(lambda: extract_events(html), args.repeat)
+
+    m3u_path = os.path.join(aux_dir, 'kanalak_jatorrizko.m3u')
+    # La primera ejecución importa todo; las siguientes (con --force) solo
+    # recalculan desde la caché de correspondencias
+    stages['process_channel_list.first_run'], _ = timed(lambda: process_channel_list(work_dir), 1)
+    stages['process_channel_list'], _ = timed(lambda: process_channel_list(work_dir), args.repeat)
+    # Sin cambios en las entradas se salta la regeneración, pero un sondeo que
+    # cambia la salud de los streams tiene que reordenar las listas
+    stages['process_channel_list.skip'], skipped = timed(lambda: not regenerated(work_dir), 1)
+    if not skipped:
+        raise RuntimeError("process_channel_list ha regenerado las listas sin cambios en las entradas")
+    stages['process_channel_list.health_changed'], health_regenerated = timed(lambda: regenerated(work_dir, mark_unhealthy), 1)
+    if not health_regenerated:
+        raise RuntimeError("process_channel_list no ha regenerado las listas tras cambiar stream_health.db")
+
+    correspondencias = read_correspondencias_csv(os.path.join(aux_dir, 'correspondencia_canales.csv'))
+    stages['process_channel_list.parse'], canales = timed(lambda: read_channels(m3u_path), args.repeat)
+    stages['process_channel_list.match'], matched = timed(lambda: match_all(correspondencias, canales), args.repeat)
+    bench_db = os.path.join(work_dir, 'bench.db')
+    stages['process_channel_list.db_write'], _ = timed(lambda: db_write(bench_db, correspondencias, canales), args.repeat)
+    stages['process_channel_list.export'], _ = timed(lambda: export(bench_db, os.path.join(aux_dir, HEALTH_DB_FILE),
+                                                                    os.path.join(work_dir, 'bench')), args.repeat)
+
+    stages['process_m3u.parse'], probe_candidates = timed(lambda: process_m3u_parse(m3u_path), args.repeat)
+
+    sizes = {
+        'html_bytes': len(html.encode('utf-8')),
+        'events': len(events or []),
+        'channels': len(canales),
+        'matched': matched,
+        'correspondencias': len(correspondencias),
+        'probe_candidates': probe_candidates,
+    }
+    return {'scale': scale, 'sizes': sizes, 'stages': stages}
+
+
+def compare(report, baseline):
+    """Etapas más lentas que en baseline por encima de la tolerancia (y de 50 ms)"""
+    previous = {(entry['scale'], stage): elapsed for entry in baseline['scales'] for stage, elapsed in entry['stages'].items()}
+    regressions = []
+    for entry in report['scales']:
+        for stage, elapsed in entry['stages'].items():
+            before = previous.get((entry['scale'], stage))
+            if before is not None and elapsed > before * (1 + args.tolerance) and elapsed - before > 0.05:
+                regressions.append((entry['scale'], stage, before, elapsed))
+    return regressions
+
+
+report = {
+    'generated_at': datetime.now().isoformat(timespec='seconds'),
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'repeat': args.repeat,
+    'scales': [],
+}
+for scale in args.scales:
+    with tempfile.TemporaryDirectory() as work_dir:
+        entry = bench_scale(scale, work_dir)
+    report['scales'].append(entry)
+    print(f"\nEscala {scale}: " + ', '.join(f"{key} {value}" for key, value in entry['sizes'].items()))
+    for stage, elapsed in entry['stages'].items():
+        print(f"  {stage:<40} {elapsed:>9.3f} s", flush=True)
+
+with open(args.report, 'w', encoding='utf-8') as f:
+    json.dump(report, f, indent=2)
+print(f"\nInforme guardado en {args.report}")
+
+if args.baseline:
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        regressions = compare(report, json.load(f))
+    for scale, stage, before, elapsed in regressions:
+        print(f"Empeora escala {scale} {stage}: {before:.3f} s -> {elapsed:.3f} s")
+    if regressions:
+        sys.exit(1)
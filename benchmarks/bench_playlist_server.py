@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+# Permitir importar los módulos de scripts/
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+scripts_dir = os.path.join(parent_dir, 'scripts')
+sys.path.insert(0, scripts_dir)
+
+from m3u_targets import OUTPUT_TARGETS
+from synthetic import generate_correspondencias_csv, generate_iframe_html
+
+parser = argparse.ArgumentParser(description='Benchmark de peticiones por segundo de playlist_server.py sobre datos sintéticos')
+parser.add_argument('--scale', type=int, default=1, help='Escala de los datos sintéticos (1 = captura real)')
+parser.add_argument('--connections', type=int, default=50, help='Conexiones persistentes simultáneas')
+parser.add_argument('--requests', type=int, default=20000, help='Peticiones de cada escenario')
+parser.add_argument('--cache_size', type=int, default=256, help='--cache_size del servidor')
+parser.add_argument('--seed', type=int, default=1234)
+args = parser.parse_args()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def prepare(work_dir):
+    """Genera la base de datos con 'zerrendak.py run' sobre la página sintética"""
+    aux_dir = os.path.join(work_dir, 'aux')
+    os.makedirs(aux_dir)
+    rng = random.Random(args.seed)
+    with open(os.path.join(aux_dir, 'page_iframe_content.html'), 'w', encoding='utf-8') as f:
+        f.write(generate_iframe_html(args.scale, seed=args.seed))
+    with open(os.path.join(aux_dir, 'correspondencia_canales.csv'), 'w', encoding='utf-8') as f:
+        f.write(generate_correspondencias_csv(rng, args.scale))
+    subprocess.run([sys.executable, os.path.join(scripts_dir, 'zerrendak.py'), 'run', '--aux_folder', aux_dir,
+                    '--listas_folder', os.path.join(work_dir, 'listas')], check=True, stdout=subprocess.DEVNULL)
+    return aux_dir
+
+
+async def fetch(reader, writer, path, headers=''):
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: bench\r\n{headers}\r\n'.encode('latin-1'))
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head[9:12])
+    length = 0
+    etag = None
+    for line in head.decode('latin-1').split('\r\n')[1:]:
+        name, _, value = line.partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+        elif name.lower() == 'etag':
+            etag = value.strip()
+    body = await reader.readexactly(length) if length else b''
+    return status, etag, body
+
+
+async def scenario(port, requests_for):
+    """Reparte las peticiones entre las conexiones; requests_for(i) da (ruta, cabeceras)"""
+    counter = iter(range(args.requests))
+    statuses = {}
+    transferred = 0
+
+    async def client():
+        nonlocal transferred
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            for i in counter:
+                status, _, body = await fetch(reader, writer, *requests_for(i))
+                statuses[status] = statuses.get(status, 0) + 1
+                transferred += len(body)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.connections)))
+    return time.perf_counter() - start, statuses, transferred
+
+
+async def run_benchmark(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    _, etag, body = await fetch(reader, writer, '/kanalak.m3u')
+    _, gzip_etag, _ = await fetch(reader, writer, '/kanalak.m3u', 'Accept-Encoding: gzip\r\n')
+    writer.close()
+    groups = sorted({line.split('group-title="')[1].split('"')[0] for line in body.decode('utf-8').splitlines()
+                     if line.startswith('#EXTINF')})
+    targets = sorted(OUTPUT_TARGETS)
+    variants = [f"/kanalak.m3u?{urlencode({'target': target, 'group': group, 'quality': quality})}"
+                for target in targets for group in groups for quality in ('FHD', 'HD')]
+
+    scenarios = [
+        ('kanalak.m3u (en caché)', lambda i: ('/kanalak.m3u', '')),
+        ('kanalak.m3u gzip', lambda i: ('/kanalak.m3u', 'Accept-Encoding: gzip\r\n')),
+        ('kanalak.m3u 304', lambda i: ('/kanalak.m3u', f'If-None-Match: {etag}\r\n')),
+        ('kanalak.m3u gzip 304', lambda i: ('/kanalak.m3u', f'Accept-Encoding: gzip\r\nIf-None-Match: {gzip_etag}\r\n')),
+        ('ekitaldiak.m3u (en caché)', lambda i: ('/ekitaldiak.m3u', '')),
+        (f'filtros variados ({len(variants)})', lambda i: (variants[i % len(variants)], '')),
+    ]
+    print(f"{'escenario':<32} {'peticiones/s':>13} {'MB/s':>8}  estados")
+    for name, requests_for in scenarios:
+        elapsed, statuses, transferred = await scenario(port, requests_for)
+        print(f"{name:<32} {args.requests / elapsed:>13.0f} {transferred / elapsed / 1e6:>8.1f}  {statuses}", flush=True)
+
+
+with tempfile.TemporaryDirectory() as work_dir:
+    aux_dir = prepare(work_dir)
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(scripts_dir, 'playlist_server.py'), '--aux_folder', aux_dir,
+                               '--port', str(port), '--cache_size', str(args.cache_size)],
+                              stderr=subprocess.DEVNULL)
+    try:
+        # Esperar a que el servidor acepte conexiones
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port)).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        asyncio.run(run_benchmark(port))
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,118 @@
+"""Generador determinista de datos sintéticos para los benchmarks.
+
+Escala 1 equivale aproximadamente a una captura real de la página de eventos
+(unas 1.700 entradas de Acestream).
+"""
+import random
+from datetime import date, timedelta
+
+COMPETITIONS = [
+    ('LaLiga EA Sports', 'Jornada 9'), ('Premier League', ''), ('NBA', 'Regular Season'),
+    ('NHL', 'Regular Season'), ('Serie A', 'Giornata 7'), ('Tour de Holanda', 'Etapa Prólogo'),
+    ('Copa del Rey', 'Primera ronda'), ('ATP 500 Viena', 'Octavos, dobles'), ('Liga F', ''),
+]
+TEAMS = [
+    'Real Madrid', 'FC Barcelona', 'Atlético de Madrid', 'Athletic Club', 'Real Sociedad', 'Osasuna',
+    'Philadelphia Flyers', 'Florida Panthers', 'Boston Celtics', 'Los Angeles Lakers', 'Juventus',
+    'Inter', 'Arsenal', 'Chelsea', 'Alavés', 'Eibar', 'Sevilla & Betis',
+]
+GROUPS = ['DAZN', 'MOVISTAR', 'M+ LALIGA', 'ESPN', 'SKY SPORTS', 'EUROSPORT', 'Canales 1RFEF']
+LINK_LABELS = ['Enlace FHD', 'Enlace HD', 'Enlace SD', 'Multi-audio', 'FHD 1080p']
+
+
+def acestream_id(rng):
+    return '%040x' % rng.getrandbits(160)
+
+
+def _event_rows(rng, day_index, events_per_day, link_ids):
+    rows = []
+    for event_index in range(events_per_day):
+        hour = (event_index * 7 + day_index) % 24
+        time = f"{hour:02d}:{rng.choice(['00', '15', '30', '45'])}"
+        competition, fase = rng.choice(COMPETITIONS)
+        home, away = rng.sample(TEAMS, 2)
+        # Algunos eventos traen un id genérico terminado en '--'
+        if rng.random() < 0.2:
+            event_id = f"evt-{day_index}-{event_index}--"
+        else:
+            event_id = f"evt-{day_index}-{event_index}"
+
+        fase_html = f'<div class="fase">{fase}</div>' if fase else ''
+        if rng.random() < 0.1:
+            match_html = f'{home} - {away}'
+        else:
+            match_html = (f'<div class="match-info"><img class="team-logo" src="a.png"><span>{home.replace("&", "&amp;")}</span>'
+                          f'<img class="vs-text" src="vs.png"><span>{away.replace("&", "&amp;")}</span></div>')
+        rows.append(
+            f'<tr class="event-row" data-event-id="{event_id}">'
+            f'<td>{time}</td>'
+            f'<td><div class="competition-info"><span class="competition-name">{competition}</span>{fase_html}</div></td>'
+            f'<td>{match_html}</td>'
+            f'<td><button class="toggle">+</button></td></tr>'
+        )
+
+        # Un pequeño porcentaje de eventos no tiene fila de detalles
+        if rng.random() < 0.03:
+            continue
+        groups_html = []
+        for group in rng.sample(GROUPS, rng.randint(1, 3)):
+            links = []
+            for _ in range(rng.randint(1, 5)):
+                links.append(f'<a class="stream-link" href="#" onclick="openAcestream(\'{rng.choice(link_ids)}\')">'
+                             f'<span class="icon"></span>{rng.choice(LINK_LABELS)}</a>')
+            groups_html.append(f'<div class="stream-channel-group"><h4>{group}</h4>{"".join(links)}</div>')
+        rows.append(f'<tr class="event-detail" data-event-id="{event_id}"><td colspan="4">{"".join(groups_html)}</td></tr>')
+    return rows
+
+
+def generate_m3u(rng, channels, link_ids=None):
+    """Lista M3U de canales con el formato de get.txt / kanalak_jatorrizko.m3u"""
+    lines = ['#EXTM3U url-tvg="https://raw.githubusercontent.com/davidmuma/EPG_dobleM/refs/heads/master/guiatv.xml" refresh="3600"',
+             '#EXTVLCOPT:network-caching=1000', '']
+    for index in range(channels):
+        stream_id = link_ids[index % len(link_ids)] if link_ids else acestream_id(rng)
+        group = rng.choice(GROUPS)
+        name = f"{rng.choice(GROUPS)} {rng.randint(1, 9)} {rng.choice(['FHD', 'HD', '1080', 'SD'])} {stream_id[-4:]} --> NEW ERA"
+        lines.append(f'#EXTINF:-1 tvg-logo="https://example.org/logos/{group.replace(" ", "%20")}.png" tvg-id="{group} HD" group-title="{group}", {name}')
+        lines.append(f'http://127.0.0.1:6878/ace/getstream?id={stream_id}')
+    return '\n'.join(lines) + '\n'
+
+
+def generate_correspondencias_csv(rng, scale=1):
+    """CSV de correspondencias con raíces que casan con los nombres de generate_m3u.
+
+    Además de '<GRUPO> <n>' para cada grupo se añaden 70 * scale raíces que no
+    casan con ningún canal, para que la tabla crezca con la escala.
+    """
+    lines = ['channel_root,channel_epg_id,channel_name,channel_group,id']
+    for group in GROUPS:
+        for number in range(1, 10):
+            lines.append(f"{group.upper()} {number},{group} {number} HD,{group} {number},{group},")
+    roots = set()
+    while len(roots) < 70 * scale:
+        roots.add(f"XR{rng.randint(0, 10 ** 6):06d} {rng.choice(LINK_LABELS).upper()}")
+    for root in sorted(roots):
+        lines.append(f"{root},{root} HD,{root},VARIOS,")
+    return '\n'.join(lines) + '\n'
+
+
+def generate_iframe_html(scale=1, seed=1234, days=4, events_per_day=60):
+    """Página del iframe de ZeroNet con fileContents (get.txt) y eventsContainer"""
+    rng = random.Random(seed)
+    link_ids = [acestream_id(rng) for _ in range(max(50, 330 * scale))]
+    m3u = generate_m3u(rng, len(link_ids), link_ids)
+    escaped_m3u = m3u.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    parts = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>Eventos</title>',
+             '<script>',
+             "const fileContents = { 'readme.txt': `Listas actualizadas`, 'get.txt': `" + escaped_m3u + "`, 'otros.txt': `-` };",
+             '</script></head><body><header><h1>Agenda</h1></header><div id="eventsContainer">']
+    start = date(2025, 10, 14)
+    for day_index in range(days):
+        day = start + timedelta(days=day_index)
+        parts.append(f'<div class="events-day" data-date="{day.isoformat()}"><h2>Eventos del {day.strftime("%d/%m/%Y")}</h2>'
+                     '<table class="events-table"><tbody>')
+        parts.extend(_event_rows(rng, day_index, events_per_day * scale, link_ids))
+        parts.append('</tbody></table></div>')
+    parts.append('</div><footer>New Era</footer></body></html>')
+    return '\n'.join(parts)
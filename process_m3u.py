@@ -1,137 +1,187 @@
 import os
-import re
-import requests
-import hashlib
-from urllib.parse import urlparse
-import cv2
-import subprocess
+import sys
 import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+# Los módulos compartidos viven en scripts/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+
+import run_report
+from acestream_engine import AceStreamEngine, EngineCluster, EngineSessionPool, parse_endpoints
+from logo_cache import LogoCache, safe_filename
+from m3u import iter_m3u_file
+from channel_db import stream_key
+from frame_analysis import HEALTH_OK, analyze_batch
+from phash_index import PHashIndex, cluster_streams, dhash
+from probe_scheduler import ProbeScheduler
+from stream_health import HEALTH_DB_FILE, HealthStore, migrate_health_db
+from stream_probe import STATUS_ENGINE, STATUS_OK, STATUS_TIMEOUT, StreamProber
 
 # Configuración
 M3U_FILE = "aux/kanalak_jatorrizko.m3u"
 LOGOS_DIR = "logos_canales"
 SCREENSHOTS_DIR = "canales_screenshots"
+DB_FILE = "aux/zz_canales.db"
+# Estado de los sondeos y hashes de los frames; este script no escribe en DB_FILE
+HEALTH_DB = os.path.join("aux", HEALTH_DB_FILE)
+REPORT_FILE = "aux/run_report_process_m3u.json"
 TIMEOUT_SECONDS = 15
 ACESTREAM_PORT = 6878
+# Motores AceStream entre los que se reparten las capturas ("host:puerto,...")
+ACESTREAM_ENGINES = parse_endpoints(os.environ.get('ACESTREAM_ENGINES', f"127.0.0.1:{ACESTREAM_PORT}"))
+# Streams capturados a la vez en cada motor; un motor AceStream se satura con
+# más de unos pocos streams simultáneos
+PARALLELISM = int(os.environ.get('PROBE_PARALLELISM', '4'))
+# Tiempo máximo (segundos) dedicado a sondear streams en cada ejecución; 0 sin límite
+PROBE_BUDGET_SECONDS = int(os.environ.get('PROBE_BUDGET_SECONDS', '900'))
 
 def ensure_dir(directory):
     os.makedirs(directory, exist_ok=True)
 
-def clean_dir(directory):
-    if os.path.exists(directory):
-        for f in os.listdir(directory):
+def prune_dir(directory, keep):
+    """Borra los ficheros de directory que no estén en keep (rutas)"""
+    ensure_dir(directory)
+    keep = {os.path.basename(path) for path in keep}
+    for f in os.listdir(directory):
+        if f not in keep:
             os.remove(os.path.join(directory, f))
-    else:
-        os.makedirs(directory)
-
-def safe_filename(name):
-    return re.sub(r'[\\/*?:"<>|]', "_", name).strip()
-
-def download_logo(url, tvg_id):
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        ext = os.path.splitext(urlparse(url).path)[1] or ".png"
-        base_filename = f"{safe_filename(tvg_id)}{ext}"
-        filename = os.path.join(LOGOS_DIR, base_filename)
-        
-        # Verificar si existe y es diferente
-        counter = 1
-        while os.path.exists(filename):
-            with open(filename, 'rb') as f:
-                existing_hash = hashlib.md5(f.read()).hexdigest()
-            new_hash = hashlib.md5(response.content).hexdigest()
-            
-            if existing_hash == new_hash:
-                return filename
-            
-            filename = os.path.join(LOGOS_DIR, 
-                                  f"{safe_filename(tvg_id)}-{counter}{ext}")
-            counter += 1
-        
-        with open(filename, 'wb') as f:
-            f.write(response.content)
-            
-        return filename
-    except Exception as e:
-        print(f"❌ Error descargando logo {url}: {str(e)}")
-        return None
-
-def capture_stream_screenshot(stream_url, output_path):
-    try:
-        # Usamos ffmpeg para capturar el frame
-        command = [
-            'ffmpeg',
-            '-y',
-            '-ss', '10',
-            '-i', stream_url,
-            '-frames:v', '1',
-            '-f', 'image2',
-            '-loglevel', 'error',
-            output_path
-        ]
-        subprocess.run(command, check=True, timeout=TIMEOUT_SECONDS)
-        return True
-    except subprocess.TimeoutExpired:
-        print(f"⌛ Timeout al capturar {stream_url}")
-    except Exception as e:
-        print(f"❌ Error capturando {stream_url}: {str(e)}")
-    return False
 
 def process_m3u_file():
     ensure_dir(LOGOS_DIR)
-    clean_dir(SCREENSHOTS_DIR)
-    
-    with open(M3U_FILE, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Expresión regular para extraer información
-    pattern = re.compile(
-        r'#EXTINF:-1.*?tvg-logo="(?P<logo_url>[^"]+)".*?tvg-id="(?P<tvg_id>[^"]+)".*?group-title="[^"]*",(?P<channel_name>[^\n]+)\n(?P<stream_url>http[^\n]+)',
-        re.DOTALL
-    )
-    
-    for match in pattern.finditer(content):
-        logo_url = match.group('logo_url')
-        tvg_id = match.group('tvg_id')
-        channel_name = match.group('channel_name').strip()
-        stream_url = match.group('stream_url')
-        stream_id = stream_url.split('=')[-1]
-        
-        print(f"\n📺 Procesando: {channel_name}")
-        
-        # Paso 1: Descargar logo
-        print(f"🖼️ Descargando logo...")
-        logo_path = download_logo(logo_url, tvg_id)
-        if logo_path:
-            print(f"✅ Logo guardado: {os.path.basename(logo_path)}")
-        
-        # Paso 2: Capturar screenshot del stream
-        screenshot_filename = f"{safe_filename(channel_name)} - {stream_id}.jpg"
-        screenshot_path = os.path.join(SCREENSHOTS_DIR, screenshot_filename)
-        
-        print(f"🎥 Capturando stream ({TIMEOUT_SECONDS}s)...")
-        if capture_stream_screenshot(stream_url, screenshot_path):
-            print(f"📸 Screenshot guardado: {screenshot_filename}")
-            
-            # Verificar calidad de la captura
-            try:
-                img = cv2.imread(screenshot_path)
-                if img is None or img.size == 0:
-                    print("⚠️ Captura vacía o corrupta")
-                    os.remove(screenshot_path)
-                else:
-                    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                    fm = cv2.Laplacian(gray, cv2.CV_64F).var()
-                    print(f"📊 Calidad de imagen: {fm:.2f}")
-            except Exception as e:
-                print(f"⚠️ Error analizando imagen: {str(e)}")
+
+    # Recorrer la lista en streaming; solo interesan los canales con logo,
+    # tvg-id y URL http
+    jobs = []
+    logos = []
+    with run_report.timer('parse'):
+        for entry in iter_m3u_file(M3U_FILE):
+            if not entry.tvg_logo or not entry.tvg_id or not entry.url.startswith('http'):
+                continue
+            channel_name = entry.name
+            stream_url = entry.url
+            stream_id = stream_url.split('=')[-1]
+
+            logos.append((entry.tvg_logo, entry.tvg_id))
+            screenshot_filename = f"{safe_filename(channel_name)} - {stream_id}.jpg"
+            jobs.append((stream_key(stream_url), (channel_name, stream_url, os.path.join(SCREENSHOTS_DIR, screenshot_filename))))
+    run_report.count('canales', len(jobs))
+
+    # Las capturas de los canales que siguen en la lista se conservan aunque
+    # no toque sondearlos en esta ejecución
+    prune_dir(SCREENSHOTS_DIR, [job[2] for _, job in jobs])
+
+    # Paso 1: Descargar logos en paralelo; los que no han cambiado se
+    # revalidan con peticiones condicionales sin volver a descargarlos
+    print(f"🖼️ Descargando {len(logos)} logos...")
+    with run_report.timer('logos'), LogoCache(LOGOS_DIR) as logo_cache:
+        for logo_url, tvg_id, logo_path, error in logo_cache.get_many(logos):
+            if logo_path:
+                print(f"✅ Logo guardado: {os.path.basename(logo_path)}")
+            else:
+                print(f"❌ Error descargando logo {logo_url}: {str(error)}")
+        stats = logo_cache.stats
+    print(f"🖼️ Logos descargados: {stats['downloaded']}, sin cambios: {stats['not_modified']}")
+    for name, value in stats.items():
+        run_report.count(f"logos.{name}", value)
+
+    # Paso 2: Elegir los streams que toca sondear según su historial (los caídos
+    # se sondean cada vez menos) dentro del presupuesto de tiempo, y capturarlos
+    # en paralelo repartiéndolos entre los motores
+    engines = EngineCluster([EngineSessionPool(AceStreamEngine(host, port), size=PARALLELISM, ready_timeout=TIMEOUT_SECONDS)
+                             for host, port in ACESTREAM_ENGINES])
+    scheduler = ProbeScheduler(default_cost=TIMEOUT_SECONDS)
+    if migrate_health_db(HEALTH_DB, DB_FILE):
+        print(f"🗄️ Historial de sondeos copiado de {DB_FILE} a {HEALTH_DB}")
+    with HealthStore(HEALTH_DB, scheduler) as health_store:
+        states = health_store.states()
+    selected, not_due, over_budget = scheduler.select(jobs, states, datetime.now(), budget=PROBE_BUDGET_SECONDS or None,
+                                                      parallelism=engines.size)
+    run_report.count('streams.not_due', not_due)
+    run_report.count('streams.over_budget', over_budget)
+    print(f"\n🗓️ Toca sondear {len(selected)} de {len(jobs)} streams ({not_due} aún no tocan, {over_budget} fuera del presupuesto)")
+
+    # Cada captura abre una sesión en el motor y espera a que el buffer esté
+    # listo consultando sus estadísticas, así que no hace falta saltar los
+    # primeros segundos del stream con -ss
+    print(f"\n🎥 Capturando {len(selected)} streams en {len(ACESTREAM_ENGINES)} motores "
+          f"({engines.size} en paralelo, {TIMEOUT_SECONDS}s por canal)...")
+    prober = StreamProber(parallelism=engines.size, timeout=TIMEOUT_SECONDS, seek=0, engine_pool=engines)
+    results = []
+    probe_start = time.perf_counter()
+    for result in prober.probe_all(selected):
+        results.append(result)
+        screenshot_filename = os.path.basename(result.output_path)
+        if result.status == STATUS_OK:
+            print(f"📸 {result.channel_name}: {screenshot_filename} ({result.elapsed:.1f}s)")
+        elif result.status == STATUS_TIMEOUT:
+            print(f"⌛ {result.channel_name}: timeout al capturar {result.stream_url}")
+        elif result.status == STATUS_ENGINE:
+            print(f"🛰️ {result.channel_name}: sin motor para capturarlo, se reintentará ({result.error})")
         else:
-            print("❌ Fallo en la captura")
+            print(f"❌ {result.channel_name}: fallo en la captura ({result.error})")
+            # No dejar capturas vacías o corruptas
+            if os.path.exists(result.output_path):
+                os.remove(result.output_path)
+    run_report.add_time('probe', time.perf_counter() - probe_start)
+    engines.close()
+    for engine_stats in engines.stats:
+        print(f"🛰️ {engine_stats['engine']}: {engine_stats['sessions']} sesiones, {engine_stats['errors']} fallidas, "
+              f"{engine_stats['unavailable']} veces sin respuesta")
+
+    ok = sum(1 for result in results if result.status == STATUS_OK)
+    timeouts = sum(1 for result in results if result.status == STATUS_TIMEOUT)
+    engine_errors = sum(1 for result in results if result.status == STATUS_ENGINE)
+    print(f"\n📊 Capturas correctas: {ok}, timeouts: {timeouts}, errores: {len(results) - ok - timeouts - engine_errors}, "
+          f"sin motor: {engine_errors}")
+    for status, value in Counter(result.status for result in results).items():
+        run_report.count(f"streams.{status}", value)
+
+    # Paso 3: Analizar los frames de todos los canales en una sola pasada
+    # vectorizada y guardar el estado de cada stream en la base de datos
+    analysis_start = time.perf_counter()
+    metrics = analyze_batch([result.frames for result in results])
+    analysis_elapsed = time.perf_counter() - analysis_start
+    run_report.add_time('analysis', analysis_elapsed)
+    for result, frame_metrics in zip(results, metrics):
+        if frame_metrics is not None:
+            motion = f"{frame_metrics.motion:.2f}" if frame_metrics.motion is not None else "-"
+            print(f"📊 {result.channel_name}: {frame_metrics.health} (nitidez {frame_metrics.sharpness:.2f}, "
+                  f"luminancia {frame_metrics.luminance:.1f}, movimiento {motion})")
+    with run_report.timer('db_write'), HealthStore(HEALTH_DB, scheduler) as health_store:
+        health_store.record(results, metrics)
+    health_counts = Counter(frame_metrics.health for frame_metrics in metrics if frame_metrics is not None)
+    print(f"🩺 Estado de los streams: {dict(health_counts)} ({analysis_elapsed * 1000:.1f} ms de análisis)")
+
+    # Paso 4: Hash perceptual de los frames de los streams sanos (los negros o
+    # las cartas de ajuste se parecen todos entre sí) y agrupar los que
+    # muestran la misma imagen: espejos del mismo canal o canales mal etiquetados
+    names = {}
+    stream_hashes = {}
+    with run_report.timer('phash'):
+        for result, frame_metrics in zip(results, metrics):
+            if frame_metrics is not None and frame_metrics.health == HEALTH_OK:
+                key = stream_key(result.stream_url)
+                names[key] = result.channel_name
+                stream_hashes[key] = dhash(result.frames)
+        clusters = cluster_streams(stream_hashes)
+    with run_report.timer('db_write'):
+        with PHashIndex(HEALTH_DB) as phash_index:
+            phash_index.add(time.strftime('%Y-%m-%d %H:%M:%S'), stream_hashes)
+        with HealthStore(HEALTH_DB) as health_store:
+            health_store.set_clusters(clusters)
+
+    members = defaultdict(list)
+    for key, cluster_id in clusters.items():
+        members[cluster_id].append(names[key])
+    for cluster_id, channel_names in members.items():
+        if len(channel_names) > 1:
+            print(f"🔗 Misma imagen en {len(channel_names)} streams: {', '.join(sorted(channel_names))}")
+    return results
 
 if __name__ == "__main__":
     print("🚀 Iniciando procesamiento del archivo M3U")
+    run_report.start('process_m3u', REPORT_FILE)
     start_time = time.time()
     
     process_m3u_file()
@@ -140,3 +190,4 @@ if __name__ == "__main__":
     print(f"\n✅ Proceso completado en {elapsed:.2f} segundos")
     print(f"📂 Logos guardados en: {LOGOS_DIR}")
     print(f"📂 Screenshots guardados en: {SCREENSHOTS_DIR}")
+    print(f"⏱️ Informe de la ejecución en: {REPORT_FILE}")
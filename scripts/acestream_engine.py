@@ -0,0 +1,222 @@
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+import run_report
+from http_session import create_session
+
+# Sesión de reproducción abierta en el motor: URLs devueltas por getstream
+EngineSession = namedtuple('EngineSession', ['content_id', 'playback_url', 'stat_url', 'command_url'])
+
+# Estados de stat_url: prebuf mientras llena el buffer, dl cuando ya reproduce
+STAT_PREBUFFERING = 'prebuf'
+STAT_DOWNLOADING = 'dl'
+
+
+class EngineError(Exception):
+    """El motor AceStream devolvió un error o no responde"""
+
+
+class EngineUnavailable(EngineError):
+    """No se puede contactar con el motor (conexión, HTTP o respuesta inválida)"""
+
+
+class AceStreamEngine:
+    """Cliente de la API HTTP de un motor AceStream (getstream / stat / command).
+
+    start() abre una sesión con ?format=json, que devuelve las URLs de
+    reproducción, estadísticas y control en lugar del stream; wait_ready()
+    consulta stat_url hasta que el motor ha llenado el buffer.
+    """
+
+    def __init__(self, host='127.0.0.1', port=6878, session=None, request_timeout=5):
+        self.base_url = f"http://{host}:{port}"
+        self.session = session or create_session()
+        self.request_timeout = request_timeout
+
+    def _get_json(self, url, params=None):
+        try:
+            with run_report.timer('http.acestream'):
+                response = self.session.get(url, params=params, timeout=self.request_timeout)
+                response.raise_for_status()
+                data = response.json()
+        except Exception as e:
+            raise EngineUnavailable(f"{self.base_url}: {e}") from e
+        if data.get('error'):
+            raise EngineError(f"{self.base_url}: {data['error']}")
+        return data.get('response') or {}
+
+    def start(self, content_id):
+        # pid distinto por sesión para que el motor no reutilice la de otro hilo
+        response = self._get_json(f"{self.base_url}/ace/getstream",
+                                  {'id': content_id, 'format': 'json', 'pid': uuid.uuid4().hex})
+        if not response.get('playback_url'):
+            raise EngineError(f"{self.base_url}: getstream sin playback_url para {content_id}")
+        return EngineSession(content_id, response['playback_url'], response.get('stat_url'), response.get('command_url'))
+
+    def stat(self, engine_session):
+        return self._get_json(engine_session.stat_url)
+
+    def wait_ready(self, engine_session, timeout, poll_interval=0.5):
+        """Espera a que el stream esté reproduciéndose; devuelve False si se agota el plazo"""
+        if not engine_session.stat_url:
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.stat(engine_session).get('status') == STAT_DOWNLOADING:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(poll_interval, remaining))
+
+    def stop(self, engine_session):
+        if engine_session.command_url:
+            self._get_json(engine_session.command_url, {'method': 'stop'})
+
+    def close(self):
+        self.session.close()
+
+
+class EngineSessionPool:
+    """Limita las sesiones abiertas a la vez en un motor y las cierra al terminar.
+
+    Con session(content_id) se espera un hueco libre, se abre la sesión, se
+    espera a que el buffer esté listo y al salir del bloque se para la
+    sesión, también si hubo un error. Con timeout (segundos) la espera del
+    hueco y la del buffer no pasan de ese plazo en total.
+    """
+
+    def __init__(self, engine, size=4, ready_timeout=15, poll_interval=0.5):
+        self.engine = engine
+        self.size = size
+        self.ready_timeout = ready_timeout
+        self.poll_interval = poll_interval
+        self._slots = threading.BoundedSemaphore(size)
+
+    def open(self, content_id, timeout=None):
+        """Ocupa un hueco y abre una sesión lista para reproducir; hay que liberarla con release()"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise EngineUnavailable(f"{self.engine.base_url}: sin huecos libres en {timeout:.0f}s")
+        try:
+            engine_session = self.engine.start(content_id)
+        except BaseException:
+            self._slots.release()
+            raise
+        ready_timeout = self.ready_timeout if deadline is None else min(self.ready_timeout, max(0.0, deadline - time.monotonic()))
+        try:
+            if not self.engine.wait_ready(engine_session, ready_timeout, self.poll_interval):
+                raise TimeoutError(f"el motor no tiene el stream listo en {ready_timeout:.0f}s")
+        except BaseException:
+            self.release(engine_session)
+            raise
+        return engine_session
+
+    def release(self, engine_session):
+        try:
+            self.engine.stop(engine_session)
+        except EngineError:
+            pass
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def session(self, content_id, timeout=None):
+        engine_session = self.open(content_id, timeout)
+        try:
+            yield engine_session
+        finally:
+            self.release(engine_session)
+
+
+class EngineCluster:
+    """Reparte las sesiones entre varios motores AceStream.
+
+    Cada sesión va al motor menos cargado (sesiones abiertas / tamaño de su
+    pool) que tenga hueco. Si un motor no responde se marca como caído
+    durante retry_after segundos y la sesión se intenta en otro. Tiene la
+    misma interfaz session() que EngineSessionPool, y stats acumula por motor
+    las sesiones abiertas, las fallidas y las veces que no respondió.
+    """
+
+    def __init__(self, pools, retry_after=60):
+        self.pools = list(pools)
+        self.retry_after = retry_after
+        self.stats = [{'engine': pool.engine.base_url, 'sessions': 0, 'errors': 0, 'unavailable': 0} for pool in self.pools]
+        self._active = [0] * len(self.pools)
+        self._down_until = [0.0] * len(self.pools)
+        self._condition = threading.Condition()
+
+    @property
+    def size(self):
+        return sum(pool.size for pool in self.pools)
+
+    def _acquire(self, tried, deadline=None):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                live = [index for index in range(len(self.pools)) if index not in tried and self._down_until[index] <= now]
+                if not live:
+                    raise EngineUnavailable("ningún motor AceStream disponible")
+                free = [index for index in live if self._active[index] < self.pools[index].size]
+                if free:
+                    index = min(free, key=lambda index: (self._active[index] / self.pools[index].size, index))
+                    self._active[index] += 1
+                    return index
+                if deadline is not None and now >= deadline:
+                    raise EngineUnavailable("ningún motor AceStream con huecos libres a tiempo")
+                self._condition.wait(timeout=1 if deadline is None else min(1, deadline - now))
+
+    def _release(self, index):
+        with self._condition:
+            self._active[index] -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def session(self, content_id, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        tried = set()
+        while True:
+            index = self._acquire(tried, deadline)
+            try:
+                engine_session = self.pools[index].open(content_id, None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except EngineUnavailable:
+                with self._condition:
+                    self.stats[index]['unavailable'] += 1
+                    self._down_until[index] = time.monotonic() + self.retry_after
+                self._release(index)
+                tried.add(index)
+                continue
+            except BaseException:
+                with self._condition:
+                    self.stats[index]['errors'] += 1
+                self._release(index)
+                raise
+            break
+
+        with self._condition:
+            self.stats[index]['sessions'] += 1
+        try:
+            yield engine_session
+        finally:
+            self.pools[index].release(engine_session)
+            self._release(index)
+
+    def close(self):
+        for pool in self.pools:
+            pool.engine.close()
+
+
+def parse_endpoints(text, default_host='127.0.0.1'):
+    """Convierte 'host:puerto,puerto,...' en una lista de (host, puerto)"""
+    endpoints = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.rpartition(':')
+        endpoints.append((host or default_host, int(port)))
+    return endpoints
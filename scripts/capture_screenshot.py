@@ -1,27 +1,28 @@
 import os
-import time
 import subprocess
 
+from acestream_engine import AceStreamEngine, EngineError, EngineSessionPool
+
 def capture_screenshot(output_folder):
     # Ace Stream content ID
     content_id = "1205151f6fa5d95c0eeb543cbce43ccfa6a1b216"
-    
-    # Start playback in the container (using full path to acestreamengine)
-    stream_command = f"docker exec acestream /opt/acestream/acestreamengine --client-console --play-and-exit {content_id}"
-    process = subprocess.Popen(stream_command, shell=True)
-    
-    # Wait for stream to be available
-    time.sleep(15)
-    
-    # Capture screenshot using ffmpeg
-    screenshot_command = f"ffmpeg -y -i http://127.0.0.1:6878/ace/getstream -vframes 1 {output_folder}/screenshot.png"
+
+    # Abrir la sesión en el motor (API HTTP en 6878) y esperar a que el
+    # buffer esté listo consultando sus estadísticas, en vez de dormir 15 s
+    engine = AceStreamEngine(port=6878)
+    pool = EngineSessionPool(engine, size=1, ready_timeout=30)
     try:
-        subprocess.run(screenshot_command, shell=True, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Failed to capture screenshot: {e}")
-    
-    # Stop the process
-    process.terminate()
+        with pool.session(content_id) as session:
+            # Capture screenshot using ffmpeg
+            screenshot_command = ["ffmpeg", "-y", "-i", session.playback_url, "-vframes", "1", f"{output_folder}/screenshot.png"]
+            try:
+                subprocess.run(screenshot_command, check=True)
+            except subprocess.CalledProcessError as e:
+                print(f"Failed to capture screenshot: {e}")
+    except (EngineError, TimeoutError) as e:
+        print(f"Failed to start stream: {e}")
+    finally:
+        engine.close()
 
 if __name__ == "__main__":
     # Define output folder
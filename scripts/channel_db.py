@@ -0,0 +1,214 @@
+import csv
+import logging
+import re
+
+# Columnas de canales_iptv_temp en el orden en que se insertan
+CANALES_COLUMNS = (
+    'import_date', 'name_original', 'iptv_epg_id_original', 'iptv_epg_id_new', 'iptv_group_original',
+    'iptv_group_new', 'iptv_url', 'name_new', 'activo', 'FHD'
+)
+# Columnas del histórico de cada canal, al final de la tabla
+CANALES_HISTORY_COLUMNS = ('acestream_id', 'first_seen', 'last_seen', 'presente')
+
+ACESTREAM_ID_RE = re.compile(r'[?&]id=([0-9A-Za-z]+)')
+
+
+def stream_key(url):
+    """Clave estable de un canal: el id de Acestream de la URL, o la URL entera si no lo tiene"""
+    match = ACESTREAM_ID_RE.search(url)
+    return match.group(1) if match else url
+
+
+def configure_connection(conn):
+    """Ajusta los PRAGMA de SQLite para cargas masivas.
+
+    WAL con synchronous=NORMAL evita un fsync por transacción sin arriesgar la
+    integridad del fichero, y las tablas/índices temporales de los ORDER BY se
+    quedan en memoria.
+    """
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA encoding = "UTF-8";')
+    cursor.execute('PRAGMA journal_mode = WAL;')
+    cursor.execute('PRAGMA synchronous = NORMAL;')
+    cursor.execute('PRAGMA temp_store = MEMORY;')
+
+
+def table_exists(cursor, name):
+    return cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def read_correspondencias_csv(csv_path):
+    """Lee el CSV de correspondencias y devuelve las filas listas para insertar"""
+    rows = []
+    with open(csv_path, mode='r', encoding='utf-8') as file:
+        reader = csv.DictReader(file, delimiter=',')
+        for row in reader:
+            if 'channel_root' in row and 'channel_epg_id' in row and 'channel_name' in row and 'channel_group' in row:
+                rows.append((row['channel_root'], row['channel_epg_id'], row['channel_name'], row['channel_group']))
+            else:
+                print("Falta una de las claves necesarias en la fila:", row)
+    return rows
+
+
+def recreate_correspondencia_table(cursor, rows):
+    """Vuelve a crear correspondencia_canales y la carga con un único executemany"""
+    cursor.execute('DROP TABLE IF EXISTS correspondencia_canales')
+    cursor.execute('''
+    CREATE TABLE "correspondencia_canales" (
+        "channel_root" TEXT UNIQUE,
+        "channel_epg_id" TEXT,
+        "channel_name" TEXT,
+        "channel_group" TEXT,
+        "id" INTEGER PRIMARY KEY AUTOINCREMENT
+    )
+    ''')
+    cursor.executemany('''
+        INSERT INTO correspondencia_canales (channel_root, channel_epg_id, channel_name, channel_group)
+        VALUES (?, ?, ?, ?)
+    ''', rows)
+    logging.info("Insertadas %d correspondencias de canales", len(rows))
+
+
+def _create_canales_table(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS canales_iptv_temp (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        import_date TEXT,
+        name_original TEXT,
+        name_new TEXT,
+        iptv_epg_id_original TEXT,
+        iptv_epg_id_new TEXT,
+        iptv_group_original TEXT,
+        iptv_group_new TEXT,
+        FHD INTEGER,
+        iptv_url TEXT,
+        activo INTEGER DEFAULT 0,
+        acestream_id TEXT,
+        first_seen TEXT,
+        last_seen TEXT,
+        presente INTEGER DEFAULT 1
+    )''')
+
+
+def ensure_canales_table(cursor):
+    """Crea canales_iptv_temp si no existe y migra las tablas sin histórico.
+
+    Las tablas de versiones anteriores, que se regeneraban en cada ejecución,
+    conservan sus filas: se añaden las columnas nuevas, se rellena
+    acestream_id a partir de iptv_url y se eliminan los streams repetidos.
+    """
+    _create_canales_table(cursor)
+    existing = {row[1] for row in cursor.execute('PRAGMA table_info(canales_iptv_temp)')}
+    if 'acestream_id' not in existing:
+        cursor.execute('ALTER TABLE canales_iptv_temp ADD COLUMN acestream_id TEXT')
+        cursor.execute('ALTER TABLE canales_iptv_temp ADD COLUMN first_seen TEXT')
+        cursor.execute('ALTER TABLE canales_iptv_temp ADD COLUMN last_seen TEXT')
+        cursor.execute('ALTER TABLE canales_iptv_temp ADD COLUMN presente INTEGER DEFAULT 1')
+        rows = cursor.execute('SELECT id, iptv_url FROM canales_iptv_temp').fetchall()
+        cursor.executemany('UPDATE canales_iptv_temp SET acestream_id = ?, first_seen = import_date, last_seen = import_date WHERE id = ?',
+                           [(stream_key(url or ''), id_temp) for id_temp, url in rows])
+        cursor.execute('DELETE FROM canales_iptv_temp WHERE id NOT IN (SELECT MIN(id) FROM canales_iptv_temp GROUP BY acestream_id)')
+        cursor.execute('DROP INDEX IF EXISTS idx_canales_activo_grupo_nombre')
+        cursor.execute('DROP INDEX IF EXISTS idx_canales_activo_nombre_original')
+        logging.info("Migrada la tabla canales_iptv_temp con %d filas al formato con histórico", len(rows))
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_canales_acestream_id ON canales_iptv_temp (acestream_id)')
+
+
+def insert_canales(cursor, rows, columns=CANALES_COLUMNS):
+    """Inserta en bloque las filas de canales_iptv_temp (tuplas en el orden de columns)"""
+    placeholders = ', '.join('?' for _ in columns)
+    cursor.executemany(f'''INSERT INTO canales_iptv_temp (
+        {', '.join(columns)}
+    ) VALUES ({placeholders})''', rows)
+    logging.info("Insertados %d canales en canales_iptv_temp", len(rows))
+
+
+def _match_values(matcher, channel_name, epg_index=None):
+    """(iptv_epg_id_new, iptv_group_new, name_new, activo) según la mejor correspondencia.
+
+    Los canales sin correspondencia siguen sin activar, pero si están en la
+    guía (epg_index) se guarda su id en iptv_epg_id_new.
+    """
+    mejor_correspondencia = matcher.best_match(channel_name)
+    if mejor_correspondencia:
+        _, _, epg_id_new, group_new, name_new = mejor_correspondencia
+        return epg_id_new, group_new, name_new, 1
+    epg_id = epg_index.match(channel_name) if epg_index is not None else None
+    return epg_id or "", "", "", 0
+
+
+def sync_canales(cursor, canales, matcher, import_date, rematch_all=False, epg_index=None):
+    """Actualiza canales_iptv_temp con la lista importada usando el id de Acestream como clave.
+
+    canales son tuplas (channel_name, tvg_id, group_title, url, fhd). Los
+    canales nuevos se insertan, los que han cambiado se actualizan y los que
+    ya no están en la lista se marcan con presente = 0; su last_seen se queda
+    con la última importación en la que aparecieron. activo sigue indicando
+    si el canal tiene correspondencia.
+
+    Solo se busca la correspondencia de los canales nuevos, renombrados o que
+    reaparecen, salvo con rematch_all (cuando ha cambiado la tabla de
+    correspondencias o la guía). Los canales sin correspondencia toman el id
+    de epg_index si está en la guía. Devuelve los contadores de cada caso.
+    """
+    existentes = {}
+    for row in cursor.execute('''SELECT id, acestream_id, name_original, iptv_epg_id_original, iptv_group_original, iptv_url, FHD,
+                                        iptv_epg_id_new, iptv_group_new, name_new, activo, presente
+                                 FROM canales_iptv_temp'''):
+        existentes[row[1]] = row
+
+    stats = {'nuevos': 0, 'actualizados': 0, 'desaparecidos': 0, 'recalculados': 0, 'repetidos': 0}
+    nuevos = []
+    actualizados = []
+    vistos = set()
+    for channel_name, tvg_id, group_title, url, fhd in canales:
+        key = stream_key(url)
+        if key in vistos:
+            # El mismo stream aparece varias veces en la lista: vale la primera
+            stats['repetidos'] += 1
+            continue
+        vistos.add(key)
+
+        existente = existentes.get(key)
+        if existente is None:
+            epg_id_new, group_new, name_new, activo = _match_values(matcher, channel_name, epg_index)
+            stats['recalculados'] += 1
+            nuevos.append((import_date, channel_name, tvg_id, epg_id_new, group_title, group_new, url, name_new, activo, fhd,
+                           key, import_date, import_date, 1))
+            continue
+
+        id_temp = existente[0]
+        guardado = existente[2:11]
+        presente = existente[11]
+        datos_match = guardado[5:]
+        if rematch_all or guardado[0] != channel_name or not presente:
+            datos_match = _match_values(matcher, channel_name, epg_index)
+            stats['recalculados'] += 1
+        fila = (channel_name, tvg_id, group_title, url, fhd) + tuple(datos_match)
+        if fila != guardado or not presente:
+            actualizados.append(fila + (id_temp,))
+
+    desaparecidos = [(row[0],) for key, row in existentes.items() if row[11] and key not in vistos]
+
+    insert_canales(cursor, nuevos, CANALES_COLUMNS + CANALES_HISTORY_COLUMNS)
+    cursor.executemany('''UPDATE canales_iptv_temp SET name_original = ?, iptv_epg_id_original = ?, iptv_group_original = ?,
+            iptv_url = ?, FHD = ?, iptv_epg_id_new = ?, iptv_group_new = ?, name_new = ?, activo = ?, presente = 1
+        WHERE id = ?''', actualizados)
+    cursor.executemany('UPDATE canales_iptv_temp SET presente = 0 WHERE id = ?', desaparecidos)
+    cursor.execute('UPDATE canales_iptv_temp SET import_date = ?, last_seen = ? WHERE presente = 1', (import_date, import_date))
+
+    stats['nuevos'] = len(nuevos)
+    stats['actualizados'] = len(actualizados)
+    stats['desaparecidos'] = len(desaparecidos)
+    logging.info("Canales: %d nuevos, %d actualizados, %d desaparecidos, %d correspondencias recalculadas, %d repetidos",
+                 stats['nuevos'], stats['actualizados'], stats['desaparecidos'], stats['recalculados'], stats['repetidos'])
+    return stats
+
+
+def create_export_indexes(cursor):
+    """Crea los índices que usan los ORDER BY de la exportación a M3U.
+
+    Se crean después de la carga masiva, que es más barato que mantenerlos
+    fila a fila durante los INSERT.
+    """
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_canales_presente_activo_grupo_nombre ON canales_iptv_temp (presente, activo, iptv_group_new, name_new)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_canales_presente_activo_nombre_original ON canales_iptv_temp (presente, activo, name_original)')
@@ -0,0 +1,125 @@
+import re
+
+import Levenshtein
+
+# Tabla para pasar a mayúsculas solo los caracteres ASCII, igual que hace el
+# operador LIKE de SQLite (que no distingue mayúsculas/minúsculas solo en ASCII)
+_ASCII_UPPER = {c: c - 32 for c in range(ord('a'), ord('z') + 1)}
+
+
+def _ascii_upper(text):
+    return text.translate(_ASCII_UPPER)
+
+
+class ChannelMatcher:
+    """Busca correspondencias de canales con un autómata Aho-Corasick.
+
+    Reproduce la consulta ``? LIKE '%' || channel_root || '%'`` sobre
+    correspondencia_canales: encuentra en una sola pasada todos los
+    channel_root contenidos en el nombre y desempata con Levenshtein.
+
+    Cada correspondencia es una tupla
+    (id, channel_root, channel_epg_id, channel_group, channel_name),
+    en el mismo orden que devolvía la consulta SQL.
+    """
+
+    def __init__(self, correspondencias):
+        # Mantener el orden por id, que es el orden en el que SQLite devolvía
+        # los candidatos (min() se queda con el primero en caso de empate)
+        self.correspondencias = sorted(correspondencias, key=lambda c: c[0])
+
+        # Nodos del autómata: transiciones, enlace de fallo y salidas
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        # Raíces vacías o con comodines LIKE (% y _) no caben en el autómata
+        self._comodines = []
+
+        for index, correspondencia in enumerate(self.correspondencias):
+            root = correspondencia[1]
+            # Con una raíz NULL el LIKE da NULL y no casa con nada; una vacía
+            # ('%%') casa con todos los nombres
+            if root is None:
+                continue
+            if not root or '%' in root or '_' in root:
+                self._comodines.append((index, self._like_regex(root)))
+            else:
+                self._add_pattern(_ascii_upper(root), index)
+        self._build_failure_links()
+
+    @classmethod
+    def from_db(cls, cursor):
+        """Carga las correspondencias desde la tabla correspondencia_canales"""
+        cursor.execute("SELECT id, channel_root, channel_epg_id, channel_group, channel_name FROM correspondencia_canales")
+        return cls(cursor.fetchall())
+
+    @staticmethod
+    def _like_regex(root):
+        parts = []
+        for char in _ascii_upper(root):
+            if char == '%':
+                parts.append('.*')
+            elif char == '_':
+                parts.append('.')
+            else:
+                parts.append(re.escape(char))
+        return re.compile('.*' + ''.join(parts) + '.*', re.DOTALL)
+
+    def _add_pattern(self, pattern, index):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][char] = next_node
+            node = next_node
+        self._out[node].append(index)
+
+    def _build_failure_links(self):
+        # Recorrido en anchura: el enlace de fallo de cada nodo apunta al
+        # sufijo propio más largo que también es prefijo de algún patrón
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                # Heredar las salidas del enlace de fallo (ya calculado por BFS)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def candidates(self, name):
+        """Devuelve todas las correspondencias cuyo channel_root está contenido en name"""
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        found = set()
+        node = 0
+        for char in _ascii_upper(name):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+
+        if self._comodines:
+            upper_name = _ascii_upper(name)
+            for index, regex in self._comodines:
+                if regex.fullmatch(upper_name):
+                    found.add(index)
+
+        return [self.correspondencias[index] for index in sorted(found)]
+
+    def best_match(self, name):
+        """Devuelve la correspondencia más parecida a name o None si no hay ninguna"""
+        posibles_correspondencias = self.candidates(name)
+        if not posibles_correspondencias:
+            return None
+        return min(posibles_correspondencias, key=lambda x: Levenshtein.distance(name, x[1]))
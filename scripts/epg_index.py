@@ -0,0 +1,136 @@
+import gzip
+import logging
+import os
+import re
+import unicodedata
+import xml.etree.ElementTree as ET
+
+import run_report
+from match_cache import normalize_channel_name
+
+# Tokens de calidad que no forman parte del nombre del canal en la guía
+_QUALITY_RE = re.compile(r'\b(?:UHD|FHD|HD|SD|4K|1080P?|720P?)\b')
+# Sufijo de 4 caracteres hexadecimales que lleva el nombre de cada stream de la lista
+_STREAM_SUFFIX_RE = re.compile(r'\s[0-9A-F]{4}$')
+_NON_ALNUM_RE = re.compile(r'[^0-9A-Z]+')
+# Los trozos de nombre que se buscan en la guía tienen al menos estas
+# palabras, para no emparejar por una palabra suelta como "SPORTS"
+MIN_PARTIAL_WORDS = 2
+
+
+def epg_key(name):
+    """Clave con la que se comparan los nombres de la lista y los de la guía:
+    mayúsculas ASCII (sin tildes), sin " -->...", sin el sufijo del stream ni la calidad"""
+    name = normalize_channel_name(unicodedata.normalize('NFKD', name)).split(' -->')[0].strip()
+    name = _STREAM_SUFFIX_RE.sub('', name)
+    name = _QUALITY_RE.sub(' ', name)
+    return ' '.join(_NON_ALNUM_RE.sub(' ', name).split())
+
+
+def open_xmltv(path):
+    """Abre la guía en binario, descomprimiéndola si es gzip (por la cabecera, no por la extensión)"""
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    return gzip.open(path, 'rb') if magic == b'\x1f\x8b' else open(path, 'rb')
+
+
+def iter_xmltv_channels(path):
+    """Recorre los <channel> de una guía XMLTV y devuelve (id, [display-name]).
+
+    Se lee en streaming con iterparse y cada elemento se libera al
+    procesarlo, así la memoria no depende del tamaño de la guía. Según el
+    DTD de XMLTV los <channel> van antes que los <programme>, así que la
+    lectura se detiene en el primer <programme> sin descomprimir el resto.
+    """
+    with open_xmltv(path) as f:
+        root = None
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                elif elem.tag == 'programme':
+                    break
+                continue
+            if elem.tag == 'channel':
+                names = [name.text.strip() for name in elem.iter('display-name') if name.text and name.text.strip()]
+                channel_id = elem.get('id')
+                # Liberar el elemento y quitarlo de la raíz antes de seguir
+                elem.clear()
+                root.clear()
+                if channel_id:
+                    yield channel_id, names
+
+
+def ensure_epg_tables(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS epg_sources (
+        source TEXT PRIMARY KEY,
+        hash TEXT,
+        channels INTEGER
+    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS epg_channels (
+        source TEXT,
+        key TEXT,
+        channel_id TEXT,
+        PRIMARY KEY (source, key)
+    )''')
+
+
+class EpgIndex:
+    """Índice nombre normalizado -> id de canal de una o varias guías XMLTV.
+
+    El índice de cada guía se guarda en zz_canales.db (epg_sources y
+    epg_channels) junto con el sha256 del fichero y solo se vuelve a leer la
+    guía si ha cambiado. Con varias guías tiene preferencia la primera.
+    """
+
+    def __init__(self):
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, cursor, guides):
+        """guides: lista de (ruta, sha256) en orden de preferencia"""
+        index = cls()
+        ensure_epg_tables(cursor)
+        for path, digest in guides:
+            source = os.path.basename(path)
+            row = cursor.execute('SELECT hash FROM epg_sources WHERE source = ?', (source,)).fetchone()
+            if row is None or row[0] != digest:
+                with run_report.timer('epg.parse'):
+                    keys = {}
+                    channels = 0
+                    for channel_id, names in iter_xmltv_channels(path):
+                        channels += 1
+                        for key in [epg_key(channel_id)] + [epg_key(name) for name in names]:
+                            if key:
+                                keys.setdefault(key, channel_id)
+                cursor.execute('DELETE FROM epg_channels WHERE source = ?', (source,))
+                cursor.executemany('INSERT INTO epg_channels (source, key, channel_id) VALUES (?, ?, ?)',
+                                   [(source, key, channel_id) for key, channel_id in keys.items()])
+                cursor.execute('INSERT OR REPLACE INTO epg_sources (source, hash, channels) VALUES (?, ?, ?)', (source, digest, channels))
+                logging.info("Guía %s indexada: %d canales, %d nombres", source, channels, len(keys))
+            for key, channel_id in cursor.execute('SELECT key, channel_id FROM epg_channels WHERE source = ? ORDER BY rowid', (source,)):
+                index.ids.setdefault(key, channel_id)
+        run_report.count('epg.keys', len(index.ids))
+        return index
+
+    def match(self, name):
+        """Id de la guía para un nombre de canal de la lista, o None.
+
+        Primero se busca el nombre completo y luego el trozo de palabras
+        consecutivas más largo que sea un nombre de la guía (p. ej. "DAZN 1"
+        dentro de "ELEVEN DAZN 1").
+        """
+        key = epg_key(name)
+        channel_id = self.ids.get(key)
+        if channel_id is not None or not key:
+            return channel_id
+        words = key.split(' ')
+        for length in range(len(words) - 1, MIN_PARTIAL_WORDS - 1, -1):
+            for start in range(len(words) - length + 1):
+                part = ' '.join(words[start:start + length])
+                if part in self.ids:
+                    return self.ids[part]
+        return None
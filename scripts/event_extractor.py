@@ -0,0 +1,281 @@
+import re
+
+EVENT_FIELDS = ['date', 'event_id', 'time', 'competition', 'match', 'group', 'acestream_id', 'quality']
+
+ACESTREAM_ONCLICK_RE = re.compile(r"openAcestream\('([a-f0-9]+)'")
+DATE_RE = re.compile(r'(\d{2}/\d{2}/\d{4})')
+
+# Etiquetas cuyo texto no cuenta para get_text() en BeautifulSoup
+_NON_TEXT_TAGS = frozenset(['script', 'style', 'template'])
+
+
+def replace_commas_with_dots(data):
+    """Reemplaza comas por puntos en todos los campos de un diccionario"""
+    for key in data:
+        if isinstance(data[key], str):
+            data[key] = data[key].replace(",", ".")
+    return data
+
+
+def _resolve_event_id(event_id, time, match):
+    # Crear un event_id más descriptivo si el actual es genérico
+    if event_id.endswith('--'):
+        teams = match.split(' vs ') if ' vs ' in match else [match]
+        event_id = f"{time}-{'-'.join([t.strip() for t in teams])}"
+    return event_id
+
+
+def _quality(link_text):
+    # Determinar calidad (FHD, SD, etc.)
+    return 'FHD' if 'FHD' in link_text else ('SD' if 'SD' in link_text else '')
+
+
+def _day_date(date_from_attr, h2_text):
+    # Extraer fecha del atributo data-date o del texto h2
+    date_from_text = DATE_RE.search(h2_text)
+    return date_from_attr if date_from_attr else (date_from_text.group(1) if date_from_text else 'Fecha desconocida')
+
+
+# --- Backend BeautifulSoup (html.parser) ---------------------------------
+
+def _bs4_format_match_info(match_cell):
+    """Formatea correctamente la información del partido, manteniendo espacios entre elementos span"""
+    match_info = match_cell.find('div', class_='match-info')
+    if match_info:
+        # Extraer texto preservando espacios entre elementos
+        parts = []
+        for element in match_info.find_all(['span', 'img']):
+            if element.name == 'span':
+                parts.append(element.get_text(strip=True))
+            elif 'vs-text' in element.get('class', []):
+                parts.append(' vs ')  # Mantener espacios alrededor del "vs"
+
+        return ' '.join(parts).replace('  ', ' ').strip()
+    else:
+        # Si no hay match-info, usar el texto normal
+        return match_cell.get_text(' ', strip=True)
+
+
+def _bs4_format_competition_info(competition_cell):
+    """Formatea correctamente la información de la competición, combinando nombre y fase"""
+    competition_info = competition_cell.find('div', class_='competition-info')
+    if competition_info:
+        name = competition_info.find('span', class_='competition-name')
+        fase = competition_info.find('div', class_='fase')
+
+        name_text = name.get_text(strip=True) if name else ''
+        fase_text = fase.get_text(strip=True) if fase else ''
+
+        # Combinar con un espacio si ambos existen
+        if name_text and fase_text:
+            return f"{name_text} {fase_text}"
+        else:
+            return name_text or fase_text
+    else:
+        return competition_cell.get_text(' ', strip=True)
+
+
+def _bs4_events(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    events_container = soup.find('div', id='eventsContainer')
+    if not events_container:
+        return None
+
+    events = []
+    for day in events_container.find_all('div', class_='events-day'):
+        date = _day_date(day.get('data-date', ''), day.h2.get_text() if day.h2 else '')
+
+        # Índice data-event-id -> fila de detalles, en una sola pasada por día
+        # (se queda con la primera fila de cada id, como hacía find())
+        details = {}
+        for detail_row in day.find_all('tr', class_='event-detail'):
+            details.setdefault(detail_row.get('data-event-id'), detail_row)
+
+        for event_row in day.find_all('tr', class_='event-row'):
+            event_id = event_row.get('data-event-id', '')
+            detail_row = details.get(event_id)
+            if not detail_row:
+                continue  # Si no hay fila de detalles, saltar este evento
+
+            cols = event_row.find_all('td')
+            if len(cols) < 4:
+                continue
+
+            time = cols[0].get_text(strip=True)
+            competition = _bs4_format_competition_info(cols[1])
+            match = _bs4_format_match_info(cols[2])
+            event_id = _resolve_event_id(event_id, time, match)
+
+            for group in detail_row.find_all('div', class_='stream-channel-group'):
+                h4 = group.find('h4')
+                group_name = h4.get_text(strip=True) if h4 else 'Sin grupo'
+
+                for link in group.find_all('a', class_='stream-link', onclick=ACESTREAM_ONCLICK_RE):
+                    acestream_id = ACESTREAM_ONCLICK_RE.search(link['onclick']).group(1)
+                    events.append(replace_commas_with_dots({
+                        'date': date,
+                        'event_id': event_id,
+                        'time': time,
+                        'competition': competition,
+                        'match': match,
+                        'group': group_name,
+                        'acestream_id': acestream_id,
+                        'quality': _quality(link.get_text())
+                    }))
+    return events
+
+
+# --- Backend lxml ----------------------------------------------------------
+
+def _lxml_strings(element):
+    """Textos de un elemento y sus descendientes, como los recorre BeautifulSoup"""
+    if element.text and isinstance(element.tag, str) and element.tag not in _NON_TEXT_TAGS:
+        yield element.text
+    for child in element:
+        if isinstance(child.tag, str) and child.tag not in _NON_TEXT_TAGS:
+            yield from _lxml_strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def _lxml_text(element, separator='', strip=False):
+    if strip:
+        return separator.join(s.strip() for s in _lxml_strings(element) if s.strip())
+    return separator.join(_lxml_strings(element))
+
+
+def _has_class(element, class_name):
+    return class_name in (element.get('class') or '').split()
+
+
+def _lxml_find(element, tag, class_name=None):
+    for found in element.iter(tag):
+        if found is not element and (class_name is None or _has_class(found, class_name)):
+            return found
+    return None
+
+
+def _lxml_find_all(element, tag, class_name):
+    return [found for found in element.iter(tag) if found is not element and _has_class(found, class_name)]
+
+
+def _lxml_format_match_info(match_cell):
+    match_info = _lxml_find(match_cell, 'div', 'match-info')
+    if match_info is not None:
+        parts = []
+        for element in match_info.iter('span', 'img'):
+            if element is match_info:
+                continue
+            if element.tag == 'span':
+                parts.append(_lxml_text(element, strip=True))
+            elif _has_class(element, 'vs-text'):
+                parts.append(' vs ')
+        return ' '.join(parts).replace('  ', ' ').strip()
+    return _lxml_text(match_cell, ' ', strip=True)
+
+
+def _lxml_format_competition_info(competition_cell):
+    competition_info = _lxml_find(competition_cell, 'div', 'competition-info')
+    if competition_info is not None:
+        name = _lxml_find(competition_info, 'span', 'competition-name')
+        fase = _lxml_find(competition_info, 'div', 'fase')
+
+        name_text = _lxml_text(name, strip=True) if name is not None else ''
+        fase_text = _lxml_text(fase, strip=True) if fase is not None else ''
+
+        if name_text and fase_text:
+            return f"{name_text} {fase_text}"
+        return name_text or fase_text
+    return _lxml_text(competition_cell, ' ', strip=True)
+
+
+def _lxml_events(html):
+    import lxml.html
+
+    root = lxml.html.document_fromstring(html)
+    events_container = next((div for div in root.iter('div') if div.get('id') == 'eventsContainer'), None)
+    if events_container is None:
+        return None
+
+    events = []
+    for day in _lxml_find_all(events_container, 'div', 'events-day'):
+        h2 = _lxml_find(day, 'h2')
+        date = _day_date(day.get('data-date', ''), _lxml_text(h2) if h2 is not None else '')
+
+        # Recorrer una vez las filas del día separando eventos y detalles
+        event_rows = []
+        details = {}
+        for row in day.iter('tr'):
+            if _has_class(row, 'event-row'):
+                event_rows.append(row)
+            if _has_class(row, 'event-detail'):
+                details.setdefault(row.get('data-event-id'), row)
+
+        for event_row in event_rows:
+            event_id = event_row.get('data-event-id', '')
+            detail_row = details.get(event_id)
+            if detail_row is None:
+                continue
+
+            cols = [td for td in event_row.iter('td') if td is not event_row]
+            if len(cols) < 4:
+                continue
+
+            time = _lxml_text(cols[0], strip=True)
+            competition = _lxml_format_competition_info(cols[1])
+            match = _lxml_format_match_info(cols[2])
+            event_id = _resolve_event_id(event_id, time, match)
+
+            for group in _lxml_find_all(detail_row, 'div', 'stream-channel-group'):
+                h4 = _lxml_find(group, 'h4')
+                group_name = _lxml_text(h4, strip=True) if h4 is not None else 'Sin grupo'
+
+                for link in _lxml_find_all(group, 'a', 'stream-link'):
+                    onclick_match = ACESTREAM_ONCLICK_RE.search(link.get('onclick') or '')
+                    if not onclick_match:
+                        continue
+                    events.append(replace_commas_with_dots({
+                        'date': date,
+                        'event_id': event_id,
+                        'time': time,
+                        'competition': competition,
+                        'match': match,
+                        'group': group_name,
+                        'acestream_id': onclick_match.group(1),
+                        'quality': _quality(_lxml_text(link))
+                    }))
+    return events
+
+
+BACKENDS = {
+    'lxml': _lxml_events,
+    'bs4': _bs4_events,
+}
+
+
+def available_backends():
+    """Backends instalados, por orden de preferencia"""
+    available = []
+    for name, module in (('lxml', 'lxml.html'), ('bs4', 'bs4')):
+        try:
+            __import__(module)
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+
+def extract_events(html, backend='auto'):
+    """Extrae las entradas de eventos (diccionarios con EVENT_FIELDS) del HTML.
+
+    Devuelve None si la página no tiene div#eventsContainer. Con backend
+    'auto' se usa lxml si está instalado y si no BeautifulSoup.
+    """
+    if backend == 'auto':
+        available = available_backends()
+        if not available:
+            raise ImportError("Hace falta lxml o beautifulsoup4 para extraer los eventos")
+        backend = available[0]
+    return BACKENDS[backend](html)
@@ -0,0 +1,103 @@
+import os
+import re
+import sqlite3
+from collections import namedtuple
+
+from channel_db import stream_key, table_exists
+from m3u import M3UReader
+
+# Canal que emite un stream: nombre para mostrar y tvg-id de la guía
+ChannelInfo = namedtuple('ChannelInfo', ['name', 'tvg_id'])
+
+# Formas de repartir los eventos en listas más pequeñas: nombre -> clave de
+# cada evento, que da nombre al fichero <clave>.m3u
+SPLIT_MODES = {
+    'day': lambda event: event['date'],
+    'competition': lambda event: slugify(event['competition']),
+}
+
+_SLUG_RE = re.compile(r'[^0-9a-z]+')
+
+
+def slugify(text):
+    return _SLUG_RE.sub('_', text.lower()).strip('_') or 'otros'
+
+
+def _clean_name(name):
+    # Quitar " -->" y lo que le sigue, como en las listas de canales
+    return name.split(" -->")[0].strip()
+
+
+class EventChannelIndex:
+    """Índice acestream_id -> canal para etiquetar las entradas de eventos.
+
+    Se carga con la lista de canales de get.txt (nombre y tvg-id originales)
+    y, encima, con los canales con correspondencia de canales_iptv_temp
+    (nombre normalizado, calidad y tvg-id de la guía).
+    """
+
+    def __init__(self):
+        self.channels = {}
+
+    def __len__(self):
+        return len(self.channels)
+
+    def get(self, acestream_id):
+        return self.channels.get(acestream_id)
+
+    def add_m3u(self, lines):
+        """Añade los canales de una lista M3U (fichero abierto o líneas)"""
+        for entry in M3UReader(lines):
+            self.channels[stream_key(entry.url)] = ChannelInfo(_clean_name(entry.name), entry.tvg_id)
+
+    def add_m3u_file(self, path):
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                self.add_m3u(file)
+
+    def add_db(self, db_path):
+        """Añade los canales presentes con correspondencia de canales_iptv_temp"""
+        if not os.path.exists(db_path):
+            return
+        conn = sqlite3.connect(db_path)
+        try:
+            cursor = conn.cursor()
+            if not table_exists(cursor, 'canales_iptv_temp'):
+                return
+            columns = {row[1] for row in cursor.execute('PRAGMA table_info(canales_iptv_temp)')}
+            if 'acestream_id' not in columns:
+                return
+            for acestream_id, name_new, epg_id, fhd in cursor.execute(
+                    'SELECT acestream_id, name_new, iptv_epg_id_new, FHD FROM canales_iptv_temp '
+                    'WHERE presente = 1 AND activo = 1 ORDER BY id'):
+                self.channels[acestream_id] = ChannelInfo(f"{name_new} {'FHD' if fhd == 1 else 'HD'}", epg_id)
+        finally:
+            conn.close()
+
+
+def event_sort_key(event):
+    """Orden estable de las entradas de eventos, para que las listas no cambien
+    de una ejecución a otra si la página solo reordena los eventos"""
+    return (event['date'], event['time'], event['competition'], event['match'], event['group'], event['acestream_id'])
+
+
+def unique_events(events):
+    """Eventos sin repetir el mismo stream en el mismo evento (aunque aparezca
+    en varios grupos de la página), en el orden de la página"""
+    seen = set()
+    unique = []
+    for event in events:
+        key = (event['date'], event['event_id'], event['acestream_id'])
+        if key not in seen:
+            seen.add(key)
+            unique.append(event)
+    return unique
+
+
+def split_events(events, mode):
+    """Reparte los eventos por la clave de SPLIT_MODES[mode]: clave -> lista"""
+    key_of = SPLIT_MODES[mode]
+    groups = {}
+    for event in events:
+        groups.setdefault(key_of(event), []).append(event)
+    return groups
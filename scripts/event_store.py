@@ -0,0 +1,127 @@
+import sqlite3
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from event_index import ChannelInfo, EventChannelIndex
+
+# Zona horaria de las horas de la página
+DEFAULT_TIMEZONE = 'Europe/Madrid'
+
+# Ventana de eventos: desde WINDOW_BEFORE antes de ahora (eventos que pueden
+# seguir en juego) hasta N días después
+WINDOW_BEFORE = timedelta(hours=3)
+# Lista "en directo": eventos empezados dentro de WINDOW_BEFORE o que empiezan
+# en los próximos LIVE_AHEAD
+LIVE_AHEAD = timedelta(minutes=30)
+
+_EVENT_COLUMNS = ('date', 'event_id', 'time', 'competition', 'match', 'group_name', 'acestream_id', 'quality')
+
+
+def parse_start(date, time, tz):
+    """Inicio del evento en segundos UTC desde 1970, o None si la fecha u hora no se entienden"""
+    try:
+        start = datetime.strptime(f'{date} {time}', '%Y-%m-%d %H:%M')
+    except (TypeError, ValueError):
+        return None
+    return int(start.replace(tzinfo=tz).timestamp())
+
+
+class EventStore:
+    """Eventos de la última página importada, guardados en la tabla eventos de zz_canales.db.
+
+    La fecha y hora de cada evento se convierten una sola vez, al importar, en
+    start_ts (indexada), y también se guarda el canal que lo emite, así las
+    listas por ventana de tiempo se pueden regenerar en cada ejecución sin
+    volver a procesar la página.
+    """
+
+    def __init__(self, db_path, timezone=DEFAULT_TIMEZONE):
+        self.conn = sqlite3.connect(db_path)
+        self._owns_conn = True
+        self.tz = ZoneInfo(timezone)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS eventos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            start_ts INTEGER,
+            date TEXT,
+            event_id TEXT,
+            time TEXT,
+            competition TEXT,
+            match TEXT,
+            group_name TEXT,
+            acestream_id TEXT,
+            quality TEXT,
+            channel_name TEXT,
+            tvg_id TEXT
+        )''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_eventos_start_ts ON eventos (start_ts)')
+        self.conn.commit()
+
+    @classmethod
+    def reader(cls, conn, timezone=DEFAULT_TIMEZONE):
+        """Solo consultas, sobre una conexión ya abierta (p. ej. con mode=ro) en
+        la que ya existe la tabla eventos: no escribe en la base de datos y
+        close() no cierra la conexión"""
+        store = cls.__new__(cls)
+        store.conn = conn
+        store._owns_conn = False
+        store.tz = ZoneInfo(timezone)
+        return store
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM eventos').fetchone()[0]
+
+    def replace(self, events, channel_index=None):
+        """Sustituye los eventos guardados por los de esta importación"""
+        rows = []
+        for event in events:
+            channel = channel_index.get(event['acestream_id']) if channel_index is not None else None
+            rows.append((parse_start(event['date'], event['time'], self.tz), event['date'], event['event_id'], event['time'],
+                         event['competition'], event['match'], event['group'], event['acestream_id'], event['quality'],
+                         channel.name if channel else None, channel.tvg_id if channel else None))
+        with self.conn:
+            self.conn.execute('DELETE FROM eventos')
+            self.conn.executemany(f'''INSERT INTO eventos (start_ts, {', '.join(_EVENT_COLUMNS)}, channel_name, tvg_id)
+                VALUES ({', '.join('?' for _ in range(len(_EVENT_COLUMNS) + 3))})''', rows)
+        return sum(1 for row in rows if row[0] is None)
+
+    def _select(self, where='', params=()):
+        cursor = self.conn.execute(f'''SELECT start_ts, {', '.join(_EVENT_COLUMNS)} FROM eventos {where}
+            ORDER BY start_ts, competition, match, group_name, acestream_id''', params)
+        events = []
+        for row in cursor:
+            event = dict(zip(('start_ts',) + _EVENT_COLUMNS, row))
+            event['group'] = event.pop('group_name')
+            events.append(event)
+        return events
+
+    def between(self, start, end):
+        """Eventos que empiezan entre start y end (datetime con zona), por hora de
+        inicio y en el orden de event_sort_key, como diccionarios con los campos
+        del CSV y start_ts"""
+        return self._select('WHERE start_ts >= ? AND start_ts <= ?', (int(start.timestamp()), int(end.timestamp())))
+
+    def dated(self):
+        """Todos los eventos con hora de inicio, en el mismo orden que between()"""
+        return self._select('WHERE start_ts IS NOT NULL')
+
+    def window(self, days, now=None):
+        """Eventos desde WINDOW_BEFORE antes de now hasta days días después"""
+        now = now or datetime.now(self.tz)
+        return self.between(now - WINDOW_BEFORE, now + timedelta(days=days))
+
+    def live(self, now=None):
+        """Eventos en directo o a punto de empezar"""
+        now = now or datetime.now(self.tz)
+        return self.between(now - WINDOW_BEFORE, now + LIVE_AHEAD)
+
+    def channel_index(self):
+        """Índice acestream_id -> canal con los canales guardados al importar"""
+        index = EventChannelIndex()
+        for acestream_id, name, tvg_id in self.conn.execute(
+                'SELECT acestream_id, channel_name, tvg_id FROM eventos WHERE channel_name IS NOT NULL'):
+            index.channels[acestream_id] = ChannelInfo(name, tvg_id)
+        return index
+
+    def close(self):
+        if self._owns_conn:
+            self.conn.close()
@@ -0,0 +1,56 @@
+import hashlib
+import sqlite3
+from datetime import datetime
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """sha256 de un fichero leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FingerprintStore:
+    """Huellas (sha256) de las entradas de cada etapa, guardadas en zz_canales.db.
+
+    Permite que cada etapa compruebe si sus entradas han cambiado desde la
+    última ejecución correcta y se salte el trabajo si no es así.
+    """
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS fingerprints (
+            name TEXT PRIMARY KEY,
+            hash TEXT,
+            updated_at TEXT
+        )''')
+        self.conn.commit()
+
+    def get(self, name):
+        row = self.conn.execute('SELECT hash FROM fingerprints WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def unchanged(self, name, digest):
+        return self.get(name) == digest
+
+    def update(self, name, digest):
+        if self.unchanged(name, digest):
+            return
+        self.conn.execute('INSERT OR REPLACE INTO fingerprints (name, hash, updated_at) VALUES (?, ?, ?)',
+                          (name, digest, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,118 @@
+"""Análisis vectorizado de frames crudos (rgb24) capturados con ffmpeg.
+
+ffmpeg entrega los frames escalados a FRAME_WIDTH x FRAME_HEIGHT por stdout
+(-f rawvideo -pix_fmt rgb24 pipe:1), sin pasar por un JPEG en disco. Todos
+los canales con el mismo número de frames se analizan juntos en un único
+array (canales, frames, alto, ancho, 3).
+"""
+from collections import namedtuple
+
+FRAME_WIDTH = 160
+FRAME_HEIGHT = 90
+FRAME_BYTES = FRAME_WIDTH * FRAME_HEIGHT * 3
+
+HEALTH_OK = 'ok'
+HEALTH_BLACK = 'black'
+HEALTH_TEST_PATTERN = 'test_pattern'
+HEALTH_FROZEN = 'frozen'
+
+# Umbrales sobre la luminancia (0-255) de los frames escalados
+BLACK_LUMINANCE = 16.0
+FROZEN_MOTION = 0.5
+# Carta de ajuste: columnas casi uniformes en vertical, colores saturados y
+# pocas transiciones bruscas entre columnas (las barras)
+BARS_VERTICAL_STD = 6.0
+BARS_SATURATION = 80.0
+BARS_MIN_EDGES = 3
+BARS_MAX_EDGES = 16
+BARS_EDGE_STEP = 20.0
+
+# Métricas de un canal. motion es la diferencia media entre frames
+# consecutivos (None si solo hay un frame)
+FrameMetrics = namedtuple('FrameMetrics', ['sharpness', 'luminance', 'test_pattern', 'motion', 'health'])
+
+
+def frames_from_bytes(raw):
+    """Convierte la salida rawvideo de ffmpeg en un array (frames, alto, ancho, 3).
+
+    Descarta un último frame incompleto; devuelve None si no hay ninguno.
+    """
+    import numpy as np
+
+    count = len(raw) // FRAME_BYTES
+    if count == 0:
+        return None
+    return np.frombuffer(raw, dtype=np.uint8, count=count * FRAME_BYTES).reshape(count, FRAME_HEIGHT, FRAME_WIDTH, 3)
+
+
+def _analyze_group(frames):
+    """Métricas de un grupo de canales con el mismo número de frames.
+
+    frames es un array uint8 (canales, frames, alto, ancho, 3); devuelve un
+    diccionario de arrays de longitud canales.
+    """
+    import numpy as np
+
+    rgb = frames.astype(np.float32)
+    luma = rgb[..., 0] * 0.299 + rgb[..., 1] * 0.587 + rgb[..., 2] * 0.114
+
+    luminance = luma.mean(axis=(1, 2, 3))
+
+    # Varianza del laplaciano (núcleo de 4 vecinos) del primer frame
+    first = luma[:, 0]
+    laplacian = (first[:, :-2, 1:-1] + first[:, 2:, 1:-1] + first[:, 1:-1, :-2] + first[:, 1:-1, 2:]
+                 - 4 * first[:, 1:-1, 1:-1])
+    sharpness = laplacian.var(axis=(1, 2))
+
+    if luma.shape[1] > 1:
+        motion = np.abs(np.diff(luma, axis=1)).mean(axis=(2, 3)).max(axis=1)
+    else:
+        motion = np.full(len(luma), np.nan, dtype=np.float32)
+
+    # Carta de ajuste en los dos tercios superiores del primer frame
+    top = rgb[:, 0, :FRAME_HEIGHT * 2 // 3]
+    vertical_std = top.std(axis=1).mean(axis=(1, 2))
+    saturation = (top.max(axis=3) - top.min(axis=3)).mean(axis=(1, 2))
+    column_means = top.mean(axis=1)
+    edges = (np.abs(np.diff(column_means, axis=1)).max(axis=2) > BARS_EDGE_STEP).sum(axis=1)
+    test_pattern = ((vertical_std < BARS_VERTICAL_STD) & (saturation > BARS_SATURATION)
+                    & (edges >= BARS_MIN_EDGES) & (edges <= BARS_MAX_EDGES))
+
+    return {'sharpness': sharpness, 'luminance': luminance, 'test_pattern': test_pattern, 'motion': motion}
+
+
+def classify(luminance, test_pattern, motion):
+    if luminance < BLACK_LUMINANCE:
+        return HEALTH_BLACK
+    if test_pattern:
+        return HEALTH_TEST_PATTERN
+    if motion is not None and motion < FROZEN_MOTION:
+        return HEALTH_FROZEN
+    return HEALTH_OK
+
+
+def analyze_batch(frame_arrays):
+    """Analiza los frames de muchos canales; devuelve una lista de FrameMetrics.
+
+    frame_arrays es una lista de arrays (frames, alto, ancho, 3) o None; los
+    canales sin frames devuelven None en su posición. Los canales se agrupan
+    por número de frames para analizar cada grupo con una sola llamada.
+    """
+    import numpy as np
+
+    groups = {}
+    for index, frames in enumerate(frame_arrays):
+        if frames is not None:
+            groups.setdefault(len(frames), []).append(index)
+
+    results = [None] * len(frame_arrays)
+    for indexes in groups.values():
+        metrics = _analyze_group(np.stack([frame_arrays[index] for index in indexes]))
+        for position, index in enumerate(indexes):
+            motion = float(metrics['motion'][position])
+            motion = None if np.isnan(motion) else motion
+            luminance = float(metrics['luminance'][position])
+            test_pattern = bool(metrics['test_pattern'][position])
+            results[index] = FrameMetrics(float(metrics['sharpness'][position]), luminance, test_pattern, motion,
+                                          classify(luminance, test_pattern, motion))
+    return results
@@ -0,0 +1,11 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def create_session(pool_size=8):
+    """Sesión HTTP compartida con un pool de conexiones reutilizables"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
@@ -0,0 +1,32 @@
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def setup_logging(log_path, verbose=False):
+    """Envía el logging del proceso a log_path, vaciándolo antes.
+
+    Los registros se encolan (QueueHandler) y un hilo aparte (QueueListener)
+    los escribe en el fichero, así que los bucles que registran no esperan a
+    la escritura. Por defecto se registra a partir de INFO; con verbose
+    también los mensajes DEBUG de traza por canal. El listener se para al
+    salir del proceso, después de vaciar la cola.
+    """
+    file_handler = logging.FileHandler(log_path, mode='w', encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
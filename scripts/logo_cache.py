@@ -0,0 +1,189 @@
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+
+import run_report
+from http_session import create_session
+
+INDEX_FILE = 'logos.db'
+STORE_DIR = 'store'
+
+
+def safe_filename(name):
+    return re.sub(r'[\\/*?:"<>|]', "_", name).strip()
+
+
+class LogoCache:
+    """Caché persistente de logos con peticiones HTTP condicionales.
+
+    El índice (logos.db) guarda por URL el ETag, el Last-Modified y el
+    sha256 del contenido. Los ficheros se guardan una sola vez en un almacén
+    direccionado por contenido (store/<sha256><ext>) y los nombres visibles
+    <tvg_id>[-N]<ext> se enlazan a ellos, con su hash también en el índice,
+    así que no hace falta volver a leer ni hashear ficheros ya conocidos.
+    """
+
+    def __init__(self, logos_dir, session=None, timeout=10, max_workers=8):
+        self.logos_dir = logos_dir
+        self.store_dir = os.path.join(logos_dir, STORE_DIR)
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.session = session or create_session(max_workers)
+        self.stats = {'downloaded': 0, 'not_modified': 0, 'hashed_files': 0}
+        # URL -> Future con (sha256, ext) de las URLs ya pedidas en esta
+        # ejecución (varios canales comparten logo); se reclama con el cerrojo
+        # para que cada URL se descargue una sola vez
+        self._fetched = {}
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(logos_dir, INDEX_FILE), check_same_thread=False)
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS logo_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            sha256 TEXT,
+            ext TEXT,
+            fetched_at TEXT
+        )''')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS logo_files (
+            filename TEXT PRIMARY KEY,
+            sha256 TEXT
+        )''')
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _blob_path(self, sha256, ext):
+        return os.path.join(self.store_dir, f"{sha256}{ext}")
+
+    def _write_blob(self, sha256, ext, content):
+        blob_path = self._blob_path(sha256, ext)
+        if not os.path.exists(blob_path):
+            tmp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, blob_path)
+        return blob_path
+
+    def fetch(self, url):
+        """Descarga (o revalida) un logo y devuelve (sha256, ext) de su blob.
+
+        Si otro hilo ya está con la misma URL se espera a su resultado (o a su error).
+        """
+        with self._lock:
+            future = self._fetched.get(url)
+            owner = future is None
+            if owner:
+                future = self._fetched[url] = Future()
+        if not owner:
+            return future.result()
+        try:
+            result = self._download(url)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result
+
+    def _download(self, url):
+        with self._lock:
+            cached = self._conn.execute('SELECT etag, last_modified, sha256, ext FROM logo_cache WHERE url = ?', (url,)).fetchone()
+
+        headers = {}
+        if cached and os.path.exists(self._blob_path(cached[2], cached[3])):
+            etag, last_modified, _, _ = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        else:
+            cached = None
+
+        with run_report.timer('http.logos'):
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self.stats['not_modified'] += 1
+            return cached[2], cached[3]
+        response.raise_for_status()
+
+        ext = os.path.splitext(urlparse(url).path)[1] or ".png"
+        sha256 = hashlib.sha256(response.content).hexdigest()
+        self._write_blob(sha256, ext, response.content)
+        with self._lock:
+            self.stats['downloaded'] += 1
+            self._conn.execute('INSERT OR REPLACE INTO logo_cache (url, etag, last_modified, sha256, ext, fetched_at) VALUES (?, ?, ?, ?, ?, ?)',
+                               (url, response.headers.get('ETag'), response.headers.get('Last-Modified'), sha256, ext,
+                                datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            self._conn.commit()
+        return sha256, ext
+
+    def _file_hash(self, filename):
+        """Hash de un fichero con nombre visible, leyéndolo solo si el índice no lo conoce"""
+        row = self._conn.execute('SELECT sha256 FROM logo_files WHERE filename = ?', (filename,)).fetchone()
+        if row:
+            return row[0]
+        with open(os.path.join(self.logos_dir, filename), 'rb') as f:
+            sha256 = hashlib.sha256(f.read()).hexdigest()
+        self.stats['hashed_files'] += 1
+        self._conn.execute('INSERT OR REPLACE INTO logo_files (filename, sha256) VALUES (?, ?)', (filename, sha256))
+        return sha256
+
+    def _link_named_file(self, tvg_id, sha256, ext):
+        """Devuelve la ruta <tvg_id>[-N]<ext> con ese contenido, creándola si no existe"""
+        with self._lock:
+            counter = 0
+            while True:
+                suffix = f"-{counter}" if counter else ""
+                filename = f"{safe_filename(tvg_id)}{suffix}{ext}"
+                path = os.path.join(self.logos_dir, filename)
+                if not os.path.exists(path):
+                    break
+                if self._file_hash(filename) == sha256:
+                    self._conn.commit()
+                    return path
+                counter += 1
+
+            try:
+                os.link(self._blob_path(sha256, ext), path)
+            except OSError:
+                shutil.copyfile(self._blob_path(sha256, ext), path)
+            self._conn.execute('INSERT OR REPLACE INTO logo_files (filename, sha256) VALUES (?, ?)', (filename, sha256))
+            self._conn.commit()
+            return path
+
+    def get(self, url, tvg_id):
+        """Devuelve la ruta del logo de tvg_id descargado desde url"""
+        sha256, ext = self.fetch(url)
+        return self._link_named_file(tvg_id, sha256, ext)
+
+    def get_many(self, logos):
+        """Descarga en paralelo los logos (url, tvg_id).
+
+        Genera (url, tvg_id, ruta, error) en el orden de entrada; ruta es None
+        si hubo un error.
+        """
+        def task(item):
+            url, tvg_id = item
+            try:
+                return url, tvg_id, self.get(url, tvg_id), None
+            except Exception as e:
+                return url, tvg_id, None, e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='logo') as executor:
+            yield from executor.map(task, logos)
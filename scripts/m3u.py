@@ -0,0 +1,94 @@
+import re
+from collections import namedtuple
+
+# Entrada de una lista M3U. options guarda las directivas (#EXTVLCOPT, ...)
+# que aparecen entre la línea EXTINF y la URL
+M3UEntry = namedtuple('M3UEntry', ['tvg_id', 'tvg_logo', 'group_title', 'name', 'url', 'options'])
+
+_EXTINF_RE = re.compile(r'#EXTINF:\s*-?[\d.]+(?P<attrs>(?:\s*[\w-]+="[^"]*")*)\s*,(?P<name>.*)')
+_ATTR_RE = re.compile(r'([\w-]+)="([^"]*)"')
+
+
+def parse_extinf(line):
+    """Devuelve (atributos, nombre) de una línea #EXTINF"""
+    match = _EXTINF_RE.match(line)
+    if match:
+        return dict(_ATTR_RE.findall(match.group('attrs'))), match.group('name').strip()
+    # Línea mal formada: buscar atributos en toda la línea y quedarse con lo
+    # que haya tras la última coma como nombre
+    return dict(_ATTR_RE.findall(line)), line.rsplit(',', 1)[-1].strip()
+
+
+class M3UReader:
+    """Recorre una lista M3U línea a línea generando M3UEntry.
+
+    No carga el fichero en memoria, así que sirve para listas de cualquier
+    tamaño. Tras recorrerlo, line_count tiene el número de líneas leídas y
+    header la línea #EXTM3U (si la había).
+    """
+
+    def __init__(self, lines):
+        self._lines = lines
+        self.line_count = 0
+        self.header = None
+
+    def __iter__(self):
+        attrs = None
+        name = None
+        options = []
+        for line in self._lines:
+            self.line_count += 1
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('#EXTINF:'):
+                attrs, name = parse_extinf(line)
+                options = []
+            elif line.startswith('#EXTM3U'):
+                self.header = line
+            elif line.startswith('#'):
+                if attrs is not None:
+                    options.append(line)
+            elif attrs is not None:
+                yield M3UEntry(attrs.get('tvg-id', ''), attrs.get('tvg-logo', ''), attrs.get('group-title', ''),
+                               name, line, tuple(options))
+                attrs = None
+
+
+def iter_m3u_file(path):
+    """Genera las entradas de un fichero M3U abriéndolo y cerrándolo automáticamente"""
+    with open(path, 'r', encoding='utf-8') as file:
+        yield from M3UReader(file)
+
+
+def format_extinf(name, tvg_id=None, group_title=None, tvg_logo=None):
+    """Construye una línea #EXTINF (con salto de línea) con los atributos que no sean None"""
+    parts = ['#EXTINF:-1']
+    if tvg_id is not None:
+        parts.append(f' tvg-id="{tvg_id}"')
+    if tvg_logo is not None:
+        parts.append(f' tvg-logo="{tvg_logo}"')
+    if group_title is not None:
+        parts.append(f' group-title="{group_title}"')
+    parts.append(f', {name}\n')
+    return ''.join(parts)
+
+
+class M3UWriter:
+    """Escribe entradas M3U de forma incremental sobre un fichero abierto"""
+
+    def __init__(self, file):
+        self._file = file
+
+    def write_header(self, header):
+        self._file.write(header)
+
+    def write(self, extinf_line, url):
+        self._file.write(extinf_line)
+        self._file.write(f'{url}\n')
+
+    def write_entry(self, entry):
+        self._file.write(format_extinf(entry.name, entry.tvg_id, entry.group_title, entry.tvg_logo or None))
+        for option in entry.options:
+            self._file.write(f'{option}\n')
+        self._file.write(f'{entry.url}\n')
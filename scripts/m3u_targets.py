@@ -0,0 +1,130 @@
+import logging
+import os
+
+ACESTREAM_URL_PREFIX = "http://127.0.0.1:6878/ace/getstream?id="
+
+M3U_HEADER = (
+    '#EXTM3U url-tvg="https://raw.githubusercontent.com/davidmuma/EPG_dobleM/refs/heads/master/guiatv.xml, https://epgshare01.online/epgshare01/epg_ripper_NL1.xml.gz"\n'
+    '#EXTVLCOPT:network-caching=2000\n\n'
+)
+
+# Registro de destinos de salida: sufijo del fichero -> transformación de la URL
+OUTPUT_TARGETS = {}
+
+
+def register_target(name, url_transform):
+    """Registra un nuevo reproductor destino; se genera <base>_<name>.m3u"""
+    OUTPUT_TARGETS[name] = url_transform
+
+
+def _replace_prefix(new_prefix):
+    return lambda url: url.replace(ACESTREAM_URL_PREFIX, new_prefix)
+
+
+register_target('ott', lambda url: url)
+register_target('ace', _replace_prefix("acestream://"))
+register_target('kodi', _replace_prefix("plugin://script.module.horus?action=play&id="))
+
+
+class AtomicFile:
+    """Fichero de texto con buffer que solo sustituye al destino al confirmarlo.
+
+    Se escribe en un temporal del mismo directorio y se renombra con
+    os.replace, así quien lea el destino a mitad de escritura ve siempre la
+    versión anterior completa. Si falla la escritura de la cabecera el
+    temporal se borra antes de propagar el error.
+    """
+
+    def __init__(self, path, header='', buffering=1 << 16):
+        self.path = path
+        directory, filename = os.path.split(path)
+        self.tmp_path = os.path.join(directory, f".{filename}.{os.getpid()}.tmp")
+        self._file = open(self.tmp_path, 'w', encoding='utf-8', buffering=buffering)
+        try:
+            self._file.write(header)
+        except BaseException:
+            self.discard()
+            raise
+
+    def write(self, text):
+        self._file.write(text)
+
+    def commit(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+
+class MultiTargetWriter:
+    """Reparte cada entrada EXTINF entre los ficheros de todos los destinos.
+
+    La línea EXTINF se formatea una sola vez y cada destino aplica su propia
+    transformación de URL. Si un destino falla se descarta solo ese fichero y
+    el resto se sigue generando.
+    """
+
+    def __init__(self, base_path, header=M3U_HEADER, targets=None):
+        self.base_path = base_path
+        self.header = header
+        self.targets = dict(OUTPUT_TARGETS if targets is None else targets)
+        self._files = {}
+        # Destinos que no se han podido generar
+        self.failed = []
+
+    def path_for(self, name):
+        return f"{self.base_path}_{name}.m3u"
+
+    def __enter__(self):
+        try:
+            for name, url_transform in self.targets.items():
+                try:
+                    atomic_file = AtomicFile(self.path_for(name), header=self.header)
+                except OSError as e:
+                    logging.error("Error al generar lista %s: %s", name, e)
+                    self.failed.append(name)
+                    continue
+                self._files[name] = (atomic_file, url_transform)
+        except BaseException as e:
+            # Sin __exit__, los temporales ya abiertos se quedarían en disco
+            self.__exit__(type(e), e, e.__traceback__)
+            raise
+        return self
+
+    def write_entry(self, extinf_line, url):
+        for name, (atomic_file, url_transform) in list(self._files.items()):
+            try:
+                atomic_file.write(extinf_line)
+                atomic_file.write(f'{url_transform(url)}\n')
+            except Exception as e:
+                logging.error("Error al generar lista %s: %s", name, e)
+                atomic_file.discard()
+                del self._files[name]
+                self.failed.append(name)
+
+    def __exit__(self, exc_type, exc, tb):
+        for name, (atomic_file, _) in self._files.items():
+            if exc_type is not None:
+                atomic_file.discard()
+                continue
+            try:
+                atomic_file.commit()
+            except OSError as e:
+                logging.error("Error al generar lista %s: %s", name, e)
+                atomic_file.discard()
+                self.failed.append(name)
+        self._files = {}
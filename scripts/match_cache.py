@@ -0,0 +1,83 @@
+import logging
+import re
+from functools import lru_cache
+
+import run_report
+
+# Caracteres no ASCII que se eliminan de los nombres importados
+NON_ASCII_RE = re.compile(r'[^\x00-\x7F]+')
+
+
+def normalize_channel_name(name):
+    """Nombre de canal tal y como se guarda y se busca: en mayúsculas y solo ASCII"""
+    return NON_ASCII_RE.sub('', name.upper())
+
+
+class MatchCache:
+    """Caché persistente de correspondencias por nombre normalizado.
+
+    La tabla match_cache de zz_canales.db guarda, para cada nombre, el id de
+    la fila de correspondencia_canales elegida (NULL si no tiene). Cada
+    entrada lleva el hash del CSV de correspondencias con el que se calculó;
+    las de otro hash se borran al abrir la caché. Encima hay un lru_cache en
+    memoria, y el ChannelMatcher solo se construye si algún nombre falla.
+
+    Tiene la misma interfaz best_match que ChannelMatcher.
+    """
+
+    def __init__(self, cursor, correspondencias_hash, maxsize=4096):
+        self.cursor = cursor
+        self.correspondencias_hash = correspondencias_hash
+        self.stats = {'memoria': 0, 'base_datos': 0, 'fallos': 0}
+        self._matcher = None
+        # Traza por canal solo con el log en DEBUG (--verbose)
+        self._trace = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+        cursor.execute('''CREATE TABLE IF NOT EXISTS match_cache (
+            name TEXT PRIMARY KEY,
+            correspondencia_id INTEGER,
+            correspondencias_hash TEXT
+        )''')
+        cursor.execute('DELETE FROM match_cache WHERE correspondencias_hash != ?', (correspondencias_hash,))
+        if cursor.rowcount > 0:
+            logging.info("Caché de correspondencias invalidada: %d entradas de otro CSV", cursor.rowcount)
+
+        cursor.execute('SELECT id, channel_root, channel_epg_id, channel_group, channel_name FROM correspondencia_canales')
+        self._correspondencias = {row[0]: row for row in cursor.fetchall()}
+        self._lookup = lru_cache(maxsize=maxsize)(self._lookup_db)
+
+    @property
+    def matcher(self):
+        if self._matcher is None:
+            # Levenshtein solo se importa si algún nombre no está en la caché
+            from channel_matcher import ChannelMatcher
+
+            self._matcher = ChannelMatcher(self._correspondencias.values())
+        return self._matcher
+
+    def _lookup_db(self, name):
+        row = self.cursor.execute('SELECT correspondencia_id FROM match_cache WHERE name = ?', (name,)).fetchone()
+        if row is not None:
+            self.stats['base_datos'] += 1
+            return self._correspondencias.get(row[0])
+
+        self.stats['fallos'] += 1
+        mejor_correspondencia = self.matcher.best_match(name)
+        self.cursor.execute('INSERT OR REPLACE INTO match_cache (name, correspondencia_id, correspondencias_hash) VALUES (?, ?, ?)',
+                            (name, mejor_correspondencia[0] if mejor_correspondencia else None, self.correspondencias_hash))
+        return mejor_correspondencia
+
+    def best_match(self, name):
+        """Devuelve la correspondencia más parecida a name o None si no hay ninguna"""
+        with run_report.timer('match'):
+            correspondencia = self._lookup(normalize_channel_name(name))
+        if self._trace:
+            logging.debug("Correspondencia de %s: %s", name, correspondencia[1] if correspondencia else None)
+        return correspondencia
+
+    def log_stats(self):
+        self.stats['memoria'] = self._lookup.cache_info().hits
+        logging.info("Caché de correspondencias: %d aciertos en memoria, %d en la base de datos, %d fallos",
+                     self.stats['memoria'], self.stats['base_datos'], self.stats['fallos'])
+        for name, value in self.stats.items():
+            run_report.count(f"match_cache.{name}", value)
@@ -1,234 +1,329 @@
-from bs4 import BeautifulSoup
 import csv
-import re
+from collections import namedtuple
 from datetime import datetime
-import argparse  # Añadir este import
+from functools import lru_cache
+import argparse
+import io
 import os
 import sys
 
-# Configurar el parser de argumentos
-parser = argparse.ArgumentParser(description='Procesar eventos desde HTML a CSV y M3U')
-parser.add_argument('--aux_folder', required=True, help='Directorio auxiliar para entrada HTML y salida CSV')
-parser.add_argument('--listas_folder', required=True, help='Directorio para los archivos M3U de salida')
-parser.add_argument('--html_file', help='Nombre del archivo HTML de entrada (sin ruta)')
-parser.add_argument('--csv_file', help='Nombre del archivo CSV de salida (sin ruta)')
-parser.add_argument('--m3u_events_file', help='Nombre del archivo M3U de eventos (sin ruta)')
-parser.add_argument('--m3u_channels_file', help='Nombre del archivo M3U de canales (sin ruta)')
-
-args = parser.parse_args()
-
-# Establecer nombres por defecto si no se especifican
-html_filename = args.html_file
-csv_filename = args.csv_file
-m3u_events_filename = args.m3u_events_file
-m3u_channels_filename = args.m3u_channels_file
+from event_extractor import EVENT_FIELDS, extract_events
+from event_index import SPLIT_MODES, EventChannelIndex, event_sort_key, split_events, unique_events
+from event_store import DEFAULT_TIMEZONE, EventStore
+from fingerprints import FingerprintStore, text_hash
+from m3u import M3UWriter, format_extinf
+from m3u_targets import ACESTREAM_URL_PREFIX
+from publish import publish_folder
+import run_report
 
 # Obtener la ruta del directorio padre del script
 script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(script_dir)
 
-# Construir rutas completas
-aux_folder = os.path.join(parent_dir, args.aux_folder)
-listas_folder = os.path.join(parent_dir, args.listas_folder)
-
-# Crear directorios si no existen
-os.makedirs(aux_folder, exist_ok=True)
-os.makedirs(listas_folder, exist_ok=True)
-
-# Rutas completas de archivos
-html_file = os.path.join(aux_folder, html_filename)
-csv_ekitaldiak_file_name = os.path.join(aux_folder, csv_filename)
-m3u_ekitaldiak_file_name = os.path.join(listas_folder, m3u_events_filename)
-m3u_kanalak_jatorrizko_file_name = os.path.join(aux_folder, m3u_channels_filename)
-
-# Verificar que el archivo HTML existe
-if not os.path.exists(html_file):
-    print(f"Error: El archivo HTML {html_file} no existe")
-    sys.exit(1)
-
-def extract_and_save_kanalak_m3u(input_file, output_file):
-    # Leer el contenido del archivo HTML
-    with open(input_file, 'r', encoding='utf-8') as file:
-        content = file.read()
-    
-    # Buscar el contenido de get.txt usando una expresión regular
-    pattern = r"const fileContents = \{.*?'get\.txt': `(.*?)`.*?\}"
-    match = re.search(pattern, content, re.DOTALL)
-    
-    if not match:
-        print("No se encontró el contenido de get.txt en el archivo HTML")
-        return
-    
-    m3u_content = match.group(1)
+FILE_CONTENTS_MARKER = "const fileContents = {"
+GET_TXT_MARKER = "'get.txt': `"
+
+EVENTS_M3U_HEADER = (
+    '#EXTM3U url-tvg="https://raw.githubusercontent.com/davidmuma/EPG_dobleM/refs/heads/master/guiatv.xml"\n'
+    '#EXTVLCOPT:network-caching=2000\n'
+    '\n'
+)
+
+# Resultado de parse_iframe_data(): channels_m3u es el texto de la lista de
+# canales escrita en esta ejecución y event_count el número de eventos
+# escritos (None si no han cambiado o no están en la página)
+IframeResult = namedtuple('IframeResult', ['channels_m3u', 'event_count'])
+
 
+def add_arguments(parser):
+    parser.add_argument('--aux_folder', required=True, help='Directorio auxiliar para entrada HTML y salida CSV')
+    parser.add_argument('--listas_folder', required=True, help='Directorio para los archivos M3U de salida')
+    parser.add_argument('--html_file', help='Nombre del archivo HTML de entrada (sin ruta)')
+    parser.add_argument('--csv_file', help='Nombre del archivo CSV de salida (sin ruta)')
+    parser.add_argument('--m3u_events_file', help='Nombre del archivo M3U de eventos (sin ruta)')
+    parser.add_argument('--m3u_channels_file', help='Nombre del archivo M3U de canales (sin ruta)')
+    parser.add_argument('--db_file', help='Nombre del archivo sqlite donde se guardan las huellas de las entradas (sin ruta)')
+    parser.add_argument('--force', action='store_true', help='Regenerar las salidas aunque las entradas no hayan cambiado')
+    parser.add_argument('--html_backend', default='auto', choices=['auto', 'lxml', 'bs4'], help='Parser HTML para extraer los eventos (auto usa lxml si está instalado)')
+    parser.add_argument('--split_events', choices=sorted(SPLIT_MODES), help='Generar además una lista de eventos por día o por competición')
+    parser.add_argument('--window', type=int, metavar='DIAS', help='Limitar las listas de eventos a los de las 3 últimas horas y los próximos DIAS días, por hora de inicio, y generar la lista de eventos en directo (requiere --db_file)')
+    parser.add_argument('--timezone', default=DEFAULT_TIMEZONE, help='Zona horaria de las horas de los eventos de la página')
+
+
+def find_get_txt(content):
+    """Devuelve el contenido (aún escapado) de get.txt o None si no está.
+
+    La búsqueda se ancla en los marcadores con str.find, sin expresiones
+    regulares que recorran todo el documento.
+    """
+    start = content.find(FILE_CONTENTS_MARKER)
+    if start != -1:
+        start = content.find(GET_TXT_MARKER, start + len(FILE_CONTENTS_MARKER))
+    end = content.find('`', start + len(GET_TXT_MARKER)) if start != -1 else -1
+
+    if end == -1 or content.find('}', end) == -1:
+        return None
+    return content[start + len(GET_TXT_MARKER):end]
+
+def save_kanalak_m3u(m3u_content, output_file):
+    """Guarda get.txt sin escapar en output_file y devuelve el texto guardado"""
     # Reemplazar las secuencias de escape \n por saltos de línea reales
     m3u_content = m3u_content.replace('\\n', '\n')  # Convertir \n en saltos de línea reales
     m3u_content = m3u_content.replace('\\"', '"')   # Eliminar el escape de las comillas
     m3u_content = m3u_content.replace('\\\\', '\\') # Reemplazar \\ con \
-    
+
     # Guardar el contenido en el archivo de salida
     with open(output_file, 'w', encoding='utf-8') as file:
         file.write(m3u_content)
-    
+
     print(f"Archivo M3U guardado correctamente en {output_file}")
+    return m3u_content
+
+def events_section(content):
+    """Parte del documento desde div#eventsContainer, para calcular su huella"""
+    start = content.find('id="eventsContainer"')
+    return content[start:] if start != -1 else ''
+
+@lru_cache(maxsize=None)
+def format_event_date(date):
+    """Convierte YYYY-MM-DD en DD/MM; se calcula una sola vez por fecha"""
+    return datetime.strptime(date, '%Y-%m-%d').strftime('%d/%m')
+
+def event_extinf(row, channel_index):
+    """Línea EXTINF de un evento, con el canal que lo emite si está en el índice"""
+    # Get quality if available, otherwise empty string
+    quality = row['quality'] if row['quality'] else ''
+    name = f'{row["time"]} {row["match"]} {row["group"]} {quality}'
+    tvg_id = ""
+    channel = channel_index.get(row['acestream_id']) if channel_index is not None else None
+    if channel is not None:
+        name = f'{name.rstrip()} - {channel.name}'
+        tvg_id = channel.tvg_id
+    return format_extinf(name, tvg_id=tvg_id, group_title=f'{format_event_date(row["date"])} {row["competition"]}')
+
+def write_events_m3u(events, m3u_path, channel_index=None):
+    with open(m3u_path, 'w', encoding='utf-8') as out_file:
+        writer = M3UWriter(out_file)
+        writer.write_header(EVENTS_M3U_HEADER)
+        for row in events:
+            writer.write(event_extinf(row, channel_index), f'{ACESTREAM_URL_PREFIX}{row["acestream_id"]}')
+
+def write_events(events, csv_path, m3u_path, channel_index=None):
+    """Escribe todos los eventos en el CSV y en el M3U (si m3u_path no es None)
+    una entrada por evento y stream, en el orden de event_sort_key; devuelve
+    las entradas sin repetir"""
+    with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+        csv_writer = csv.DictWriter(csvfile, fieldnames=EVENT_FIELDS)
+        csv_writer.writeheader()
+        csv_writer.writerows(events)
+
+    events = sorted(unique_events(events), key=event_sort_key)
+    if m3u_path is not None:
+        write_events_m3u(events, m3u_path, channel_index)
+    return events
+
+def write_split_events(events, folder, mode, channel_index=None):
+    """Escribe una lista <clave>.m3u por día o competición en folder, borrando
+    las de ejecuciones anteriores que ya no tocan"""
+    os.makedirs(folder, exist_ok=True)
+    groups = split_events(events, mode)
+    keep = set()
+    for key, group in groups.items():
+        keep.add(f"{key}.m3u")
+        write_events_m3u(group, os.path.join(folder, f"{key}.m3u"), channel_index)
+    for filename in os.listdir(folder):
+        if filename.endswith('.m3u') and filename not in keep:
+            os.remove(os.path.join(folder, filename))
+    return len(groups)
+
+def write_window_events(event_store, days, listas_folder, m3u_events_file, split_mode=None):
+    """Regenera desde la tabla eventos la lista de eventos de la ventana de
+    tiempo (y sus listas por día o competición) y la de eventos en directo"""
+    channel_index = event_store.channel_index()
+    stem = os.path.splitext(m3u_events_file)[0]
+    window = event_store.window(days)
+    live = event_store.live()
+    write_events_m3u(window, os.path.join(listas_folder, m3u_events_file), channel_index)
+    write_events_m3u(live, os.path.join(listas_folder, f"{stem}_live.m3u"), channel_index)
+    if split_mode:
+        write_split_events(window, os.path.join(listas_folder, stem), split_mode, channel_index)
+    run_report.count('events.window', len(window))
+    run_report.count('events.live', len(live))
+    print(f"Lista de eventos de los próximos {days} días: {len(window)} entradas, {len(live)} en directo")
+
+def parse_iframe_data(aux_folder, listas_folder, html_file, csv_file, m3u_events_file, m3u_channels_file, db_file=None,
+                      force=False, html_backend='auto', split_events=None, window_days=None, timezone=DEFAULT_TIMEZONE):
+    """Extrae la lista de canales (get.txt) y los eventos de la página descargada.
+
+    Las carpetas son relativas a la raíz del repositorio y los ficheros
+    relativos a ellas, como en la línea de comandos. Las etapas cuyas
+    entradas no han cambiado (según las huellas de db_file) se saltan salvo
+    con force. Devuelve un IframeResult con lo que se ha escrito.
+
+    Cada entrada de la lista de eventos lleva el nombre y el tvg-id del canal
+    que la emite (según get.txt y canales_iptv_temp), sin repetir el mismo
+    stream en un evento. Con split_events ('day' o 'competition') se escribe
+    además una lista por día o competición en la carpeta <m3u_events_file
+    sin extensión> dentro de listas_folder.
 
-def format_match_info(match_cell):
-    """Formatea correctamente la información del partido, manteniendo espacios entre elementos span"""
-    match_info = match_cell.find('div', class_='match-info')
-    if match_info:
-        # Extraer texto preservando espacios entre elementos
-        parts = []
-        for element in match_info.find_all(['span', 'img']):
-            if element.name == 'span':
-                parts.append(element.get_text(strip=True))
-            elif 'vs-text' in element.get('class', []):
-                parts.append(' vs ')  # Mantener espacios alrededor del "vs"
-        
-        return ' '.join(parts).replace('  ', ' ').strip()
-    else:
-        # Si no hay match-info, usar el texto normal
-        return match_cell.get_text(' ', strip=True)
-
-def format_competition_info(competition_cell):
-    """Formatea correctamente la información de la competición, combinando nombre y fase"""
-    competition_info = competition_cell.find('div', class_='competition-info')
-    if competition_info:
-        name = competition_info.find('span', class_='competition-name')
-        fase = competition_info.find('div', class_='fase')
-        
-        name_text = name.get_text(strip=True) if name else ''
-        fase_text = fase.get_text(strip=True) if fase else ''
-        
-        # Combinar con un espacio si ambos existen
-        if name_text and fase_text:
-            return f"{name_text} {fase_text}"
+    Con db_file los eventos se guardan además en la tabla eventos con su hora
+    de inicio ya convertida. Con window_days las listas de eventos se
+    regeneran en cada ejecución desde esa tabla, aunque la página no haya
+    cambiado: solo los eventos de la ventana, ordenados por hora de inicio,
+    más la lista <m3u_events_file>_live.m3u con los que están en directo.
+    """
+    # Construir rutas completas
+    aux_folder = os.path.join(parent_dir, aux_folder)
+    listas_folder = os.path.join(parent_dir, listas_folder)
+
+    # Crear directorios si no existen
+    os.makedirs(aux_folder, exist_ok=True)
+    os.makedirs(listas_folder, exist_ok=True)
+
+    # Rutas completas de archivos
+    html_path = os.path.join(aux_folder, html_file)
+    csv_ekitaldiak_file_name = os.path.join(aux_folder, csv_file)
+    m3u_ekitaldiak_file_name = os.path.join(listas_folder, m3u_events_file)
+    m3u_kanalak_jatorrizko_file_name = os.path.join(aux_folder, m3u_channels_file)
+    db_path = os.path.join(aux_folder, db_file) if db_file else None
+
+    if window_days is not None and not db_path:
+        print("Error: --window necesita --db_file para guardar los eventos")
+        sys.exit(1)
+
+    # Verificar que el archivo HTML existe
+    if not os.path.exists(html_path):
+        print(f"Error: El archivo HTML {html_path} no existe")
+        sys.exit(1)
+
+    # Leer el HTML una única vez y usar el mismo buffer para canales y eventos
+    with run_report.timer('read_html'), open(html_path, 'r', encoding='utf-8') as file:
+        html_content = file.read()
+    run_report.count('html_bytes', len(html_content))
+
+    # Huellas de las entradas para saltar las etapas que no han cambiado
+    fingerprints = FingerprintStore(db_path) if db_path else None
+
+    def stage_unchanged(name, digest, outputs):
+        if fingerprints is None or force:
+            return False
+        return fingerprints.unchanged(name, digest) and all(os.path.exists(path) for path in outputs)
+
+    def stage_done(name, digest):
+        if fingerprints is not None:
+            fingerprints.update(name, digest)
+
+    # Tabla de eventos; con la ventana de tiempo hay que importar los eventos
+    # aunque la página no haya cambiado si la tabla todavía está vacía
+    event_store = EventStore(db_path, timezone) if db_path else None
+    events_stored = window_days is None or event_store.count() > 0
+
+    def extract_page():
+        page_hash = text_hash(html_content)
+        page_outputs = [m3u_kanalak_jatorrizko_file_name, csv_ekitaldiak_file_name, m3u_ekitaldiak_file_name]
+        if events_stored and stage_unchanged(html_file, page_hash, page_outputs):
+            print(f"El archivo {html_file} no ha cambiado desde la última ejecución; no se regenera nada.")
+            return IframeResult(None, None)
+
+        # Ejecutar la extracción m3u
+        channels_m3u = None
+        get_txt = find_get_txt(html_content)
+        if get_txt is None:
+            print("No se encontró el contenido de get.txt en el archivo HTML")
         else:
-            return name_text or fase_text
-    else:
-        return competition_cell.get_text(' ', strip=True)
-
-def replace_commas_with_dots(data):
-    """Reemplaza comas por puntos en todos los campos de un diccionario"""
-    for key in data:
-        if isinstance(data[key], str):
-            data[key] = data[key].replace(",", ".")
-    return data
-
-with open(html_file, 'r', encoding='utf-8') as file:
-    soup = BeautifulSoup(file.read(), 'html.parser')
-
-# Ejecutar la extracción m3u
-extract_and_save_kanalak_m3u(html_file, m3u_kanalak_jatorrizko_file_name)
-
-csv_data = []
-
-# Buscar el contenedor de eventos
-events_container = soup.find('div', id='eventsContainer')
-if not events_container:
-    print("No se encontró el contenedor de eventos (div#eventsContainer)")
-    exit()
-
-# Procesar cada día de eventos
-for day in events_container.find_all('div', class_='events-day'):
-    # Extraer fecha del atributo data-date o del texto h2
-    date_from_attr = day.get('data-date', '')
-    date_from_text = re.search(r'(\d{2}/\d{2}/\d{4})', day.h2.get_text() if day.h2 else '')
-    
-    date = date_from_attr if date_from_attr else (date_from_text.group(1) if date_from_text else 'Fecha desconocida')
-    
-    # Buscar todas las filas de evento principal (event-row)
-    for event_row in day.find_all('tr', class_='event-row'):
-        event_id = event_row.get('data-event-id', '')
-        
-        # Buscar la fila de detalles correspondiente (mismo data-event-id)
-        detail_row = day.find('tr', class_='event-detail', attrs={'data-event-id': event_id})
-        if not detail_row:
-            continue  # Si no hay fila de detalles, saltar este evento
-        
-        # Extraer información básica del evento
-        cols = event_row.find_all('td')
-        if len(cols) < 4:
-            continue
-        
-        time = cols[0].get_text(strip=True)
-        competition = format_competition_info(cols[1])  # Usamos la nueva función de formateo
-        match = format_match_info(cols[2])
-        
-        # Crear un event_id más descriptivo si el actual es genérico
-        if event_id.endswith('--'):
-            teams = match.split(' vs ') if ' vs ' in match else [match]
-            event_id = f"{time}-{'-'.join([t.strip() for t in teams])}"
-        
-        # Procesar los grupos de streams
-        for group in detail_row.find_all('div', class_='stream-channel-group'):
-            group_name = group.find('h4').get_text(strip=True) if group.find('h4') else 'Sin grupo'
-            
-            # Buscar todos los enlaces de Acestream en este grupo
-            for link in group.find_all('a', class_='stream-link', 
-                                     onclick=re.compile(r"openAcestream\('([a-f0-9]+)'")):
-                acestream_id = re.search(r"openAcestream\('([a-f0-9]+)'", link['onclick']).group(1)
-                
-                # Determinar calidad (FHD, SD, etc.)
-                quality = 'FHD' if 'FHD' in link.get_text() else ('SD' if 'SD' in link.get_text() else '')
-                
-                # Crear el diccionario y reemplazar comas por puntos
-                entry = {
-                    'date': date,
-                    'event_id': event_id,
-                    'time': time,
-                    'competition': competition,
-                    'match': match,
-                    'group': group_name,
-                    'acestream_id': acestream_id,
-                    'quality': quality
-                }
-                csv_data.append(replace_commas_with_dots(entry))
-
-# Escribir el archivo CSV
-if csv_data:
-    with open(csv_ekitaldiak_file_name, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['date', 'event_id', 'time', 'competition', 'match', 'group', 'acestream_id', 'quality']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        writer.writeheader()
-        writer.writerows(csv_data)
-    print(f"Archivo CSV creado exitosamente con {len(csv_data)} entradas de Acestream.")
-else:
-    print("No se encontraron eventos con IDs de Acestream.")
-
-
-
-# Write the header lines
-header_lines = [
-    '#EXTM3U url-tvg="https://raw.githubusercontent.com/davidmuma/EPG_dobleM/refs/heads/master/guiatv.xml"\n',
-    '#EXTVLCOPT:network-caching=2000\n',
-    '\n'
-]
-
-with open(m3u_ekitaldiak_file_name, 'w', encoding='utf-8') as out_file:
-    # Write header
-    out_file.writelines(header_lines)
-    
-    # Read CSV and write entries
-    with open(csv_ekitaldiak_file_name, 'r', encoding='utf-8') as in_file:
-        reader = csv.DictReader(in_file)
-        
-        for row in reader:
-            # Format date from YYYY-MM-DD to DD-MM
-            date_obj = datetime.strptime(row['date'], '%Y-%m-%d')
-            date_formated = date_obj.strftime('%d/%m')
-            
-            # Get quality if available, otherwise empty string
-            quality = row['quality'] if row['quality'] else ''
-            
-            # Create EXTINF line
-            extinf_line = f'#EXTINF:-1 tvg-id="" group-title="{date_formated} {row["competition"]}", {row["time"]} {row["match"]} {row["group"]} {quality}\n'
-            
-            # Create URL line
-            url_line = f'http://127.0.0.1:6878/ace/getstream?id={row["acestream_id"]}\n'
-            
-            # Write both lines to output file
-            out_file.write(extinf_line)
-            out_file.write(url_line)
-
-print(f"M3U file generated successfully at {m3u_ekitaldiak_file_name}")
+            get_txt_hash = text_hash(get_txt)
+            if stage_unchanged('get.txt', get_txt_hash, [m3u_kanalak_jatorrizko_file_name]):
+                print("El contenido de get.txt no ha cambiado; se mantiene la lista de canales.")
+            else:
+                with run_report.timer('export.kanalak_m3u'):
+                    channels_m3u = save_kanalak_m3u(get_txt, m3u_kanalak_jatorrizko_file_name)
+                stage_done('get.txt', get_txt_hash)
+
+        events_hash = text_hash(events_section(html_content))
+        if events_stored and stage_unchanged('eventsContainer', events_hash, [csv_ekitaldiak_file_name, m3u_ekitaldiak_file_name]):
+            print("Los eventos no han cambiado; se mantienen el CSV y el M3U de eventos.")
+            stage_done(html_file, page_hash)
+            return IframeResult(channels_m3u, None)
+
+        # Extraer los eventos del contenedor div#eventsContainer
+        with run_report.timer('parse.events'):
+            csv_data = extract_events(html_content, backend=html_backend)
+        if csv_data is None:
+            print("No se encontró el contenedor de eventos (div#eventsContainer)")
+            stage_done(html_file, page_hash)
+            return IframeResult(channels_m3u, None)
+
+        if not csv_data:
+            print("No se encontraron eventos con IDs de Acestream.")
+            stage_done(html_file, page_hash)
+            return IframeResult(channels_m3u, None)
+
+        # Índice acestream_id -> canal: la lista de get.txt (en memoria si se
+        # acaba de extraer) y los canales con correspondencia de la base de datos
+        with run_report.timer('index.events'):
+            channel_index = EventChannelIndex()
+            if channels_m3u is not None:
+                channel_index.add_m3u(io.StringIO(channels_m3u, newline=None))
+            else:
+                channel_index.add_m3u_file(m3u_kanalak_jatorrizko_file_name)
+            if db_path:
+                channel_index.add_db(db_path)
+
+        # Con la ventana de tiempo las listas se generan después desde la tabla
+        with run_report.timer('export.events'):
+            m3u_path = m3u_ekitaldiak_file_name if window_days is None else None
+            m3u_events = write_events(csv_data, csv_ekitaldiak_file_name, m3u_path, channel_index)
+            if split_events and window_days is None:
+                split_folder = os.path.join(listas_folder, os.path.splitext(m3u_events_file)[0])
+                split_count = write_split_events(m3u_events, split_folder, split_events, channel_index)
+                print(f"Generadas {split_count} listas de eventos por {split_events} en {split_folder}")
+
+        if event_store is not None:
+            with run_report.timer('db_write.events'):
+                undated = event_store.replace(m3u_events, channel_index)
+            if undated:
+                print(f"{undated} eventos sin fecha u hora válidas; no entran en las listas por ventana de tiempo")
+
+        stage_done('eventsContainer', events_hash)
+        stage_done(html_file, page_hash)
+        run_report.count('events', len(csv_data))
+        run_report.count('events.m3u', len(m3u_events))
+        run_report.count('events.channels_resolved', sum(1 for row in m3u_events if channel_index.get(row['acestream_id'])))
+
+        print(f"Archivo CSV creado exitosamente con {len(csv_data)} entradas de Acestream.")
+        if window_days is None:
+            print(f"M3U file generated successfully at {m3u_ekitaldiak_file_name} ({len(m3u_events)} entradas sin repetir)")
+        return IframeResult(channels_m3u, len(csv_data))
+    try:
+        result = extract_page()
+        if window_days is not None:
+            with run_report.timer('export.window'):
+                write_window_events(event_store, window_days, listas_folder, m3u_events_file, split_events)
+        return result
+    finally:
+        if fingerprints is not None:
+            fingerprints.close()
+        if event_store is not None:
+            event_store.close()
+
+def run(args):
+    """Ejecuta la etapa con los argumentos de add_arguments, con su informe de ejecución"""
+    # Informe de tiempos y contadores de la ejecución, junto al CSV de eventos
+    run_report.start('parse_iframe_data', run_report.report_path(os.path.join(parent_dir, args.aux_folder), 'parse_iframe_data'))
+    result = parse_iframe_data(args.aux_folder, args.listas_folder, args.html_file, args.csv_file, args.m3u_events_file,
+                               args.m3u_channels_file, db_file=args.db_file, force=args.force, html_backend=args.html_backend,
+                               split_events=args.split_events, window_days=args.window, timezone=args.timezone)
+    # Copias .m3u.gz y manifest.json de las listas
+    publish_folder(os.path.join(parent_dir, args.listas_folder))
+    # Sin cambios no se guarda el informe, para no tocar la carpeta auxiliar
+    if result.channels_m3u is None and result.event_count is None:
+        run_report.discard()
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Procesar eventos desde HTML a CSV y M3U')
+    add_arguments(parser)
+    run(parser.parse_args(argv))
+
+if __name__ == "__main__":
+    main()
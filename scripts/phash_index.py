@@ -0,0 +1,183 @@
+"""Índice de hashes perceptuales (dHash de 64 bits) de los frames sondeados.
+
+Los hashes se guardan en la tabla snapshot_hashes de stream_health.db y se
+cargan en un array uint64 de NumPy; buscar por distancia de Hamming es un
+XOR y un popcount sobre todo el array.
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+HASH_SIZE = 8
+# Distancia de Hamming máxima (sobre 64 bits) para considerar que dos frames
+# muestran la misma imagen
+SAME_PICTURE_DISTANCE = 10
+# Días de histórico que se conservan; los hashes más antiguos se borran al añadir
+HISTORY_DAYS = 30
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _popcount(values):
+    import numpy as np
+
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    table = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+    return table[values.view(np.uint8).reshape(values.shape + (8,))].sum(axis=-1)
+
+
+def dhash(frames):
+    """dHash de cada frame de un array (..., alto, ancho, 3) uint8; devuelve uint64 (...)"""
+    import numpy as np
+
+    rgb = frames.astype(np.float32)
+    luma = rgb[..., 0] * 0.299 + rgb[..., 1] * 0.587 + rgb[..., 2] * 0.114
+    height, width = luma.shape[-2:]
+
+    # Reducir a HASH_SIZE x (HASH_SIZE + 1) con la media de cada bloque
+    row_edges = np.linspace(0, height, HASH_SIZE + 1).astype(int)
+    col_edges = np.linspace(0, width, HASH_SIZE + 2).astype(int)
+    small = np.add.reduceat(np.add.reduceat(luma, row_edges[:-1], axis=-2), col_edges[:-1], axis=-1)
+    small /= np.outer(np.diff(row_edges), np.diff(col_edges))
+
+    bits = (small[..., :, 1:] > small[..., :, :-1]).reshape(small.shape[:-2] + (HASH_SIZE * HASH_SIZE,))
+    weights = np.uint64(1) << np.arange(HASH_SIZE * HASH_SIZE, dtype=np.uint64)
+    return (bits.astype(np.uint64) * weights).sum(axis=-1, dtype=np.uint64)
+
+
+def hamming(a, b):
+    """Distancia de Hamming entre hashes uint64 (con broadcasting de NumPy)"""
+    import numpy as np
+
+    return _popcount(np.bitwise_xor(a, b)).astype(np.int64)
+
+
+def _to_signed(value):
+    # SQLite guarda enteros de 64 bits con signo
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _cutoff(moment, history_days):
+    return (moment - timedelta(days=history_days)).strftime(TIME_FORMAT)
+
+
+def within_distance(hashes, value, max_distance=SAME_PICTURE_DISTANCE):
+    """Posiciones de los hashes a distancia <= max_distance de value y sus
+    distancias, ordenadas por distancia; un XOR y un popcount sobre el array"""
+    import numpy as np
+
+    distances = hamming(hashes, np.uint64(value))
+    found = np.flatnonzero(distances <= max_distance)
+    found = found[np.argsort(distances[found], kind='stable')]
+    return found, distances[found]
+
+
+class PHashIndex:
+    """Histórico de hashes de los frames de cada stream, con búsqueda por Hamming.
+
+    Solo se guardan y se cargan los de los últimos history_days días
+    (captured_at en formato TIME_FORMAT). El histórico se lee de la base de
+    datos en la primera llamada a nearest.
+    """
+
+    def __init__(self, db_path, history_days=HISTORY_DAYS):
+        import numpy as np
+
+        self.history_days = history_days
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS snapshot_hashes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            acestream_id TEXT,
+            captured_at TEXT,
+            dhash INTEGER
+        )''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_snapshot_hashes_captured_at ON snapshot_hashes (captured_at)')
+        self.conn.commit()
+        # El histórico se carga en la primera búsqueda: quien solo añade no lo necesita
+        self.keys = None
+        self.hashes = None
+
+    def _load(self):
+        import numpy as np
+
+        if self.hashes is None:
+            rows = self.conn.execute('SELECT acestream_id, captured_at, dhash FROM snapshot_hashes WHERE captured_at >= ? ORDER BY id',
+                                     (_cutoff(datetime.now(), self.history_days),)).fetchall()
+            self.keys = [(acestream_id, captured_at) for acestream_id, captured_at, _ in rows]
+            self.hashes = np.array([value & 0xFFFFFFFFFFFFFFFF for _, _, value in rows], dtype=np.uint64)
+
+    def add(self, captured_at, stream_hashes):
+        """Añade los hashes de un sondeo (acestream_id -> array de hashes de sus frames)
+        y borra los anteriores a history_days días antes de captured_at"""
+        import numpy as np
+
+        keys = []
+        values = []
+        for acestream_id, hashes in stream_hashes.items():
+            for value in np.asarray(hashes, dtype=np.uint64).ravel():
+                keys.append((acestream_id, captured_at))
+                values.append(int(value))
+        cutoff = _cutoff(datetime.strptime(captured_at, TIME_FORMAT), self.history_days)
+        self.conn.executemany('INSERT INTO snapshot_hashes (acestream_id, captured_at, dhash) VALUES (?, ?, ?)',
+                              [(acestream_id, captured_at, _to_signed(value)) for (acestream_id, captured_at), value in zip(keys, values)])
+        self.conn.execute('DELETE FROM snapshot_hashes WHERE captured_at < ?', (cutoff,))
+        self.conn.commit()
+
+        if self.hashes is None:
+            return
+        keep = [index for index, (_, key_captured_at) in enumerate(self.keys) if key_captured_at >= cutoff]
+        self.keys = [self.keys[index] for index in keep] + keys
+        self.hashes = np.concatenate([self.hashes[keep], np.array(values, dtype=np.uint64)])
+
+    def nearest(self, value, max_distance=SAME_PICTURE_DISTANCE):
+        """Frames del histórico a distancia <= max_distance de value: lista de
+        (acestream_id, captured_at, distancia) ordenada por distancia"""
+        self._load()
+        found, distances = within_distance(self.hashes, value, max_distance)
+        return [self.keys[index] + (int(distance),) for index, distance in zip(found, distances)]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def cluster_streams(stream_hashes, max_distance=SAME_PICTURE_DISTANCE):
+    """Agrupa los streams cuyos frames muestran la misma imagen.
+
+    stream_hashes es un diccionario acestream_id -> array de hashes de los
+    frames de un mismo sondeo. Dos streams van al mismo grupo si alguno de
+    sus frames está a distancia <= max_distance (así se toleran pequeños
+    desfases entre espejos). Devuelve acestream_id -> id del grupo, que es el
+    menor acestream_id del grupo para que sea estable entre ejecuciones.
+    """
+    import numpy as np
+
+    keys = sorted(stream_hashes)
+    if not keys:
+        return {}
+    owners = np.concatenate([np.full(len(stream_hashes[key]), index) for index, key in enumerate(keys)])
+    hashes = np.concatenate([np.asarray(stream_hashes[key], dtype=np.uint64).ravel() for key in keys])
+
+    # Unión de conjuntos sobre todos los pares de frames cercanos
+    parent = list(range(len(keys)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    # Cada frame se busca entre los siguientes, como en PHashIndex.nearest, en
+    # vez de calcular la matriz de distancias de todos los pares
+    for a in range(len(hashes) - 1):
+        found, _ = within_distance(hashes[a + 1:], hashes[a], max_distance)
+        for b in found + a + 1:
+            root_a, root_b = find(owners[a]), find(owners[b])
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    return {key: keys[find(index)] for index, key in enumerate(keys)}
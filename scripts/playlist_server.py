@@ -0,0 +1,391 @@
+"""Servidor HTTP local de listas M3U generadas al vuelo desde zz_canales.db.
+
+    python scripts/playlist_server.py --aux_folder aux --db_file zz_canales.db --port 8080
+
+    /kanalak.m3u?target=ace&group=DEPORTES&quality=FHD
+    /ekitaldiak.m3u?days=2&competition=LaLiga
+    /ekitaldiak_live.m3u?target=kodi
+
+Los canales presentes de canales_iptv_temp y la tabla eventos se cargan en
+memoria al arrancar (con el estado de los streams de stream_health.db, de la
+misma carpeta) y se vuelven a cargar cuando cambia alguna de las dos bases de
+datos. Las
+listas se generan según los filtros de la petición y se guardan en una caché
+LRU; cada respuesta lleva su ETag para que los clientes puedan preguntar con
+If-None-Match y recibir un 304 sin cuerpo.
+"""
+import argparse
+import asyncio
+import bisect
+import gzip
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+from urllib.parse import parse_qs, urlsplit
+
+from channel_db import table_exists
+from event_store import DEFAULT_TIMEZONE, LIVE_AHEAD, WINDOW_BEFORE, EventStore
+from m3u_targets import ACESTREAM_URL_PREFIX, M3U_HEADER, OUTPUT_TARGETS
+from parse_iframe_data import EVENTS_M3U_HEADER, event_extinf
+from process_channel_list import channel_entries
+from stream_health import HEALTH_DB_FILE, attach_health_db
+
+# Obtener la ruta del directorio padre del script
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+
+CONTENT_TYPE = 'audio/x-mpegurl; charset=utf-8'
+# Tamaño máximo de la cabecera de una petición
+MAX_REQUEST_HEAD = 16 * 1024
+# Las listas de eventos con ventana de tiempo se regeneran como mucho una vez por minuto
+TIME_BUCKET = 60
+# Días máximos de la ventana de eventos (?days=)
+MAX_DAYS = 366
+
+# Entrada de eventos ya formateada; start_ts permite buscar la ventana con bisect
+EventEntry = namedtuple('EventEntry', ['start_ts', 'group', 'competition', 'quality', 'extinf', 'url'])
+# Datos cargados de la base de datos: canales (ChannelEntry), eventos (EventEntry
+# ordenados por start_ts) y la lista de sus start_ts
+PlaylistData = namedtuple('PlaylistData', ['channels', 'events', 'event_starts'])
+
+
+class BadRequest(Exception):
+    pass
+
+
+class Response:
+    """Cuerpo de una lista ya generada, con su ETag y su versión comprimida"""
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self._gzip_body = None
+
+    @property
+    def gzip_body(self):
+        # Se comprime la primera vez que un cliente la pide con gzip
+        if self._gzip_body is None:
+            self._gzip_body = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._gzip_body
+
+
+class LRUCache:
+    """Caché de respuestas con expulsión de la menos usada recientemente"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        response = self._items.get(key)
+        if response is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return response
+
+    def put(self, key, response):
+        self._items[key] = response
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
+
+
+def db_version(db_path):
+    """Marca de modificación de la base de datos y de su WAL"""
+    version = []
+    for path in (db_path, f'{db_path}-wal'):
+        try:
+            stat = os.stat(path)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+
+def health_db_path(db_path):
+    return os.path.join(os.path.dirname(db_path), HEALTH_DB_FILE)
+
+
+def load_data(db_path, timezone=DEFAULT_TIMEZONE):
+    """Carga los canales presentes y los eventos con las líneas EXTINF ya formateadas.
+
+    La base de datos se abre en solo lectura: el servidor nunca escribe en ella.
+    """
+    channels = []
+    events = []
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        cursor = conn.cursor()
+        if table_exists(cursor, 'canales_iptv_temp'):
+            attach_health_db(conn, health_db_path(db_path))
+            channels = list(channel_entries(cursor))
+        if table_exists(cursor, 'eventos'):
+            store = EventStore.reader(conn, timezone)
+            channel_index = store.channel_index()
+            for event in store.dated():
+                events.append(EventEntry(event['start_ts'], event['group'], event['competition'], event['quality'] or '',
+                                         event_extinf(event, channel_index), f'{ACESTREAM_URL_PREFIX}{event["acestream_id"]}'))
+    finally:
+        conn.close()
+    return PlaylistData(channels, events, [event.start_ts for event in events])
+
+
+def _query_values(query, name):
+    return frozenset(value for value in query.get(name, []) if value)
+
+
+def _target(query):
+    target = query.get('target', ['ott'])[-1]
+    if target not in OUTPUT_TARGETS:
+        raise BadRequest(f"target desconocido: {target}")
+    return target
+
+
+def _days(query):
+    if 'days' not in query:
+        return None
+    try:
+        days = float(query['days'][-1])
+    except ValueError:
+        raise BadRequest(f"days no es un número: {query['days'][-1]}")
+    if not math.isfinite(days) or days < 0 or days > MAX_DAYS:
+        raise BadRequest(f"days tiene que estar entre 0 y {MAX_DAYS}")
+    return days
+
+
+def render_channels(data, query):
+    """Lista de canales filtrada por group (uno o varios) y quality (FHD/HD)"""
+    url_transform = OUTPUT_TARGETS[_target(query)]
+    groups = _query_values(query, 'group')
+    qualities = {value.upper() for value in _query_values(query, 'quality')}
+    if qualities - {'FHD', 'HD'}:
+        raise BadRequest("quality tiene que ser FHD o HD")
+    parts = [M3U_HEADER]
+    for entry in data.channels:
+        if groups and entry.group not in groups:
+            continue
+        if qualities and (entry.fhd is None or ('FHD' if entry.fhd else 'HD') not in qualities):
+            continue
+        parts.append(entry.extinf)
+        parts.append(f'{url_transform(entry.url)}\n')
+    return ''.join(parts)
+
+
+def render_events(data, query, start=None, end=None):
+    """Lista de eventos entre start y end (segundos UTC) filtrada por competition,
+    group y quality"""
+    url_transform = OUTPUT_TARGETS[_target(query)]
+    competitions = _query_values(query, 'competition')
+    groups = _query_values(query, 'group')
+    qualities = {value.upper() for value in _query_values(query, 'quality')}
+    low = 0 if start is None else bisect.bisect_left(data.event_starts, start)
+    high = len(data.events) if end is None else bisect.bisect_right(data.event_starts, end)
+    parts = [EVENTS_M3U_HEADER]
+    for entry in data.events[low:high]:
+        if competitions and entry.competition not in competitions:
+            continue
+        if groups and entry.group not in groups:
+            continue
+        if qualities and entry.quality.upper() not in qualities:
+            continue
+        parts.append(entry.extinf)
+        parts.append(f'{url_transform(entry.url)}\n')
+    return ''.join(parts)
+
+
+class PlaylistServer:
+    """Servidor HTTP/1.1 mínimo (GET y HEAD, conexiones persistentes) sobre asyncio"""
+
+    def __init__(self, db_path, timezone=DEFAULT_TIMEZONE, cache_size=256, reload_interval=2.0):
+        self.db_path = db_path
+        self.timezone = timezone
+        self.cache = LRUCache(cache_size)
+        self.reload_interval = reload_interval
+        self.version = None
+        self.data = PlaylistData([], [], [])
+
+    async def reload(self):
+        """Vuelve a cargar los datos si la base de datos ha cambiado"""
+        version = db_version(self.db_path) + db_version(health_db_path(self.db_path))
+        if version == self.version:
+            return
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(None, load_data, self.db_path, self.timezone)
+        except sqlite3.Error as e:
+            # Puede estar a mitad de una importación: se reintenta en la siguiente comprobación
+            logging.warning("No se ha podido cargar %s: %s", self.db_path, e)
+            return
+        if self.version is not None:
+            logging.info("La base de datos ha cambiado; caché: %d aciertos y %d fallos desde la última carga",
+                         self.cache.hits, self.cache.misses)
+        self.data = data
+        self.version = version
+        self.cache.clear()
+        self.cache.hits = self.cache.misses = 0
+        logging.info("Cargados %d canales y %d eventos de %s", len(data.channels), len(data.events), self.db_path)
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await self.reload()
+
+    def render(self, path, query):
+        now = int(time.time())
+        bucket = None
+        if path == '/kanalak.m3u':
+            render = lambda: render_channels(self.data, query)
+        elif path == '/ekitaldiak.m3u':
+            days = _days(query)
+            if days is None:
+                render = lambda: render_events(self.data, query)
+            else:
+                bucket = now // TIME_BUCKET
+                start = bucket * TIME_BUCKET - int(WINDOW_BEFORE.total_seconds())
+                end = bucket * TIME_BUCKET + int(timedelta(days=days).total_seconds())
+                render = lambda: render_events(self.data, query, start, end)
+        elif path == '/ekitaldiak_live.m3u':
+            bucket = now // TIME_BUCKET
+            start = bucket * TIME_BUCKET - int(WINDOW_BEFORE.total_seconds())
+            end = bucket * TIME_BUCKET + int(LIVE_AHEAD.total_seconds())
+            render = lambda: render_events(self.data, query, start, end)
+        else:
+            return None
+
+        key = (path, tuple(sorted((name, tuple(values)) for name, values in query.items())), bucket)
+        response = self.cache.get(key)
+        if response is None:
+            response = Response(render().encode('utf-8'))
+            self.cache.put(key, response)
+        return response
+
+    def respond(self, method, target, headers):
+        """(estado, cabeceras, cuerpo) de una petición"""
+        if method not in ('GET', 'HEAD'):
+            return '405 Method Not Allowed', [('Allow', 'GET, HEAD')], b''
+        url = urlsplit(target)
+        try:
+            response = self.render(url.path, parse_qs(url.query))
+        except BadRequest as e:
+            return '400 Bad Request', [('Content-Type', 'text/plain; charset=utf-8')], f'{e}\n'.encode('utf-8')
+        if response is None:
+            return '404 Not Found', [('Content-Type', 'text/plain; charset=utf-8')], b'No existe\n'
+
+        use_gzip = 'gzip' in headers.get('accept-encoding', '')
+        etag = f'{response.etag[:-1]}-gz"' if use_gzip else response.etag
+        response_headers = [('ETag', etag), ('Cache-Control', 'no-cache'), ('Vary', 'Accept-Encoding')]
+        if_none_match = headers.get('if-none-match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))):
+            return '304 Not Modified', response_headers, b''
+        response_headers.append(('Content-Type', CONTENT_TYPE))
+        if use_gzip:
+            response_headers.append(('Content-Encoding', 'gzip'))
+            return '200 OK', response_headers, response.gzip_body
+        return '200 OK', response_headers, response.body
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                except ValueError:
+                    writer.write(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(':')
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                # Cuerpo de la petición, que no se usa
+                if headers.get('content-length', '0').isdigit() and int(headers.get('content-length', '0')) > 0:
+                    await reader.readexactly(int(headers['content-length']))
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                try:
+                    status, response_headers, body = self.respond(method, target, headers)
+                except Exception:
+                    logging.exception("Error al responder a %s %s", method, target)
+                    status, response_headers, body = '500 Internal Server Error', [('Content-Type', 'text/plain; charset=utf-8')], b'Error interno\n'
+                    keep_alive = False
+
+                head_lines = [f'HTTP/1.1 {status}', f'Content-Length: {len(body)}']
+                head_lines.extend(f'{name}: {value}' for name, value in response_headers)
+                head_lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+                writer.write(('\r\n'.join(head_lines) + '\r\n\r\n').encode('latin-1'))
+                if method != 'HEAD' and body:
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        await self.reload()
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_REQUEST_HEAD)
+        watcher = asyncio.create_task(self.watch())
+        logging.info("Sirviendo listas en http://%s:%d/", host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+
+def add_arguments(parser):
+    parser.add_argument('--aux_folder', default='aux', help='Directorio auxiliar donde está la base de datos')
+    parser.add_argument('--db_file', default='zz_canales.db', help='Nombre del archivo sqlite (sin ruta)')
+    parser.add_argument('--host', default='127.0.0.1', help='Dirección en la que escuchar')
+    parser.add_argument('--port', type=int, default=8080, help='Puerto en el que escuchar')
+    parser.add_argument('--cache_size', type=int, default=256, help='Número de listas generadas que se guardan en memoria')
+    parser.add_argument('--reload_interval', type=float, default=2.0, help='Segundos entre comprobaciones de cambios en la base de datos')
+    parser.add_argument('--timezone', default=DEFAULT_TIMEZONE, help='Zona horaria de las horas de los eventos de la página')
+
+
+def run(args):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db_path = os.path.join(parent_dir, args.aux_folder, args.db_file)
+    if not os.path.exists(db_path):
+        print(f"Error: La base de datos {db_path} no existe")
+        sys.exit(1)
+    # uvloop, si está instalado, da bastantes más peticiones por segundo
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    server = PlaylistServer(db_path, timezone=args.timezone, cache_size=args.cache_size, reload_interval=args.reload_interval)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Servir las listas de canales y eventos por HTTP con filtros')
+    add_arguments(parser)
+    run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
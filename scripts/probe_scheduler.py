@@ -0,0 +1,98 @@
+from collections import namedtuple
+from datetime import timedelta
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+BASE_INTERVAL = timedelta(hours=1)
+FLAPPING_INTERVAL = timedelta(minutes=15)
+MAX_INTERVAL = timedelta(days=7)
+# Cada cambio sano <-> caído suma 1 y cada sondeo divide la puntuación entre
+# dos: dos cambios seguidos bastan para considerar que el stream parpadea
+FLAP_DECAY = 0.5
+FLAPPING_SCORE = 1.5
+
+# Estado de planificación de un stream, tal y como se guarda en stream_health
+ScheduleState = namedtuple('ScheduleState', ['healthy', 'consecutive_failures', 'flap_score', 'next_probe_at', 'elapsed'])
+
+
+def format_time(moment):
+    return moment.strftime(TIME_FORMAT)
+
+
+class ProbeScheduler:
+    """Decide qué streams sondear en cada ejecución y cuándo volver a hacerlo.
+
+    Un stream sano se vuelve a sondear cada base_interval; uno caído espera
+    el doble tras cada fallo seguido (hasta max_interval) y uno que alterna
+    entre sano y caído se sondea cada flapping_interval. En cada ejecución se
+    eligen primero los streams nunca sondeados, luego los que parpadean, los
+    sanos y por último los caídos, y dentro de cada grupo los más atrasados,
+    hasta agotar el presupuesto de tiempo.
+    """
+
+    def __init__(self, base_interval=BASE_INTERVAL, flapping_interval=FLAPPING_INTERVAL, max_interval=MAX_INTERVAL,
+                 default_cost=15):
+        self.base_interval = base_interval
+        self.flapping_interval = flapping_interval
+        self.max_interval = max_interval
+        # Segundos estimados para un stream sin sondeos previos
+        self.default_cost = default_cost
+
+    def next_state(self, previous, healthy, elapsed, now):
+        """Estado tras un sondeo con resultado healthy a la hora now.
+
+        Solo para sondeos que llegaron al stream: si falló el motor no hay
+        resultado y el estado anterior no cambia (sigue pendiente).
+        """
+        failures = 0 if healthy else (previous.consecutive_failures if previous else 0) + 1
+        flap_score = previous.flap_score * FLAP_DECAY if previous else 0.0
+        if previous is not None and previous.healthy is not None and bool(previous.healthy) != healthy:
+            flap_score += 1
+
+        if flap_score >= FLAPPING_SCORE:
+            interval = self.flapping_interval
+        elif healthy:
+            interval = self.base_interval
+        else:
+            interval = min(self.base_interval * 2 ** (failures - 1), self.max_interval)
+        return ScheduleState(int(healthy), failures, flap_score, format_time(now + interval), elapsed)
+
+    def _priority(self, state):
+        if state is None:
+            return (0, '')
+        if state.flap_score >= FLAPPING_SCORE:
+            return (1, state.next_probe_at or '')
+        if state.healthy:
+            return (2, state.next_probe_at or '')
+        return (3, state.next_probe_at or '')
+
+    def select(self, candidates, states, now, budget=None, parallelism=1):
+        """Elige los candidatos (clave, trabajo) que toca sondear.
+
+        states es un diccionario clave -> ScheduleState. Con budget (segundos)
+        se suman los costes estimados repartidos entre parallelism workers y
+        se descartan los que no caben. Devuelve (trabajos elegidos, número de
+        streams que aún no tocaban, número de descartados por presupuesto).
+        """
+        now_text = format_time(now)
+        due = []
+        not_due = 0
+        for key, job in candidates:
+            state = states.get(key)
+            if state is not None and state.next_probe_at and state.next_probe_at > now_text:
+                not_due += 1
+                continue
+            due.append((self._priority(state), key, job, state))
+        due.sort(key=lambda item: item[0])
+
+        selected = []
+        over_budget = 0
+        planned = 0.0
+        for _, key, job, state in due:
+            cost = (state.elapsed if state is not None and state.elapsed else self.default_cost) / parallelism
+            if budget is not None and planned + cost > budget:
+                over_budget += 1
+                continue
+            planned += cost
+            selected.append(job)
+        return selected, not_due, over_budget
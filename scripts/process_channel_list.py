@@ -1,309 +1,343 @@
 import sqlite3
-import requests
+from collections import namedtuple
 from datetime import datetime
-import re
 import sys
 import logging
-import Levenshtein
 import os
 import csv
+import io
 import argparse
 
-# Configurar el parser de argumentos
-parser = argparse.ArgumentParser(description='Procesar lista de canales')
-parser.add_argument('--aux_folder', required=True, help='Directorio auxiliar para entrada HTML y salida CSV')
-parser.add_argument('--listas_folder', required=True, help='Directorio para los archivos M3U de salida')
-parser.add_argument('--list_orig_file', help='Nombre de la lista original (sin ruta)')
-parser.add_argument('--db_file', help='Nombre del archivo sqlite (sin ruta)')
-parser.add_argument('--csv_channels_file', help='Nombre del archivo csv con correspondencia de canales (sin ruta)')
-parser.add_argument('--csv_list_file', help='Nombre del archivo M3U de eventos (sin ruta)')
-parser.add_argument('--m3u_channels_file', help='Nombre del archivo M3U de canales (sin ruta)')
-
-args = parser.parse_args()
-
-# Asignar argumentos
-m3u_file_name = args.list_orig_file
-db_file_name = args.db_file
-correspondencia_csv_name = args.csv_channels_file
-canales_iptv_temp_csv_name = args.csv_list_file
-zz_lista_ott_name = args.m3u_channels_file + "_ott.m3u"
-zz_lista_ace_name = args.m3u_channels_file + "_ace.m3u"
-zz_lista_kodi_name = args.m3u_channels_file + "_kodi.m3u"
+from channel_db import configure_connection, read_correspondencias_csv, recreate_correspondencia_table, ensure_canales_table, sync_canales, create_export_indexes, table_exists
+from match_cache import MatchCache, NON_ASCII_RE, normalize_channel_name
+from epg_index import EpgIndex
+from m3u import M3UReader
+from fingerprints import FingerprintStore, file_hash, text_hash
+from log_setup import setup_logging
+from m3u_targets import OUTPUT_TARGETS, MultiTargetWriter
+from stream_health import HEALTH_DB_FILE, HEALTH_ORDER, attach_health_db, health_fingerprint
+from publish import publish_folder
+import run_report
 
 # Obtener la ruta del directorio padre del script
 script_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(script_dir)
 
-# Construir rutas completas
-aux_folder = os.path.join(parent_dir, args.aux_folder)
-listas_folder = os.path.join(parent_dir, args.listas_folder)
-
-# Crear directorios si no existen
-os.makedirs(aux_folder, exist_ok=True)
-os.makedirs(listas_folder, exist_ok=True)
-
-# Rutas completas de archivos
-m3u_file_path = os.path.join(aux_folder, m3u_file_name)
-db_file_path = os.path.join(aux_folder, db_file_name)
-correspondencia_csv_path = os.path.join(aux_folder, correspondencia_csv_name)
-canales_iptv_temp_csv_path = os.path.join(aux_folder, canales_iptv_temp_csv_name)
-zz_lista_ott_path = os.path.join(listas_folder, zz_lista_ott_name)
-zz_lista_ace_path = os.path.join(listas_folder, zz_lista_ace_name)
-zz_lista_kodi_path = os.path.join(listas_folder, zz_lista_kodi_name)
-
-# Verificar que el archivo HTML existe
-if not os.path.exists(m3u_file_path):
-    print(f"Error: El archivo HTML {m3u_file_path} no existe")
-    sys.exit(1)
-
-# Configuración de logging
-log_file_path = os.path.join(aux_folder, 'debug_canales.txt')
-logging.basicConfig(filename=log_file_path, level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-
-# Borrar el contenido del fichero de log al inicio
-with open(log_file_path, 'w'):
-    pass
-
-# Verificar si el archivo tiene menos de 100 líneas
-try:
-    with open(m3u_file_path, 'r', encoding='utf-8') as file:
-        lines = file.readlines()
-        if len(lines) < 100:
-            logging.error(f"El archivo {m3u_file_path} tiene menos de 100 líneas. Deteniendo la ejecución del script.")
-            sys.exit(1)
-except Exception as e:
-    logging.error(f"Error al leer el archivo {m3u_file_path}: {e}")
-    sys.exit(1)
-
-# Leer el contenido del archivo M3U
-try:
-    with open(m3u_file_path, 'r', encoding='utf-8') as file:
-        m3u_content = file.read()
-except Exception as e:
-    logging.error(f"Error al leer el archivo M3U desde {m3u_file_path}: {e}")
-    sys.exit(1)
-
-# Conectar a la base de datos SQLite
-try:
-    conn = sqlite3.connect(db_file_path)
-    cursor = conn.cursor()
-    cursor.execute('PRAGMA encoding = "UTF-8";')
-
-    # Eliminar la tabla correspondencia_canales si existe
-    cursor.execute('DROP TABLE IF EXISTS correspondencia_canales')
-    
-    # Crear la tabla correspondencia_canales de nuevo
-    create_table_query = '''
-    CREATE TABLE "correspondencia_canales" (
-        "channel_root" TEXT UNIQUE,
-        "channel_epg_id" TEXT,
-        "channel_name" TEXT,
-        "channel_group" TEXT,
-        "id" INTEGER PRIMARY KEY AUTOINCREMENT
-    )
-    '''
-    cursor.execute(create_table_query)
-    
-    # Abrir el fichero CSV e insertar registros en la tabla
-    with open(correspondencia_csv_path, mode='r', encoding='utf-8') as file:
-        reader = csv.DictReader(file, delimiter=',')
-        for row in reader:
-            if 'channel_root' in row and 'channel_epg_id' in row and 'channel_name' in row and 'channel_group' in row:
-                cursor.execute('''
-                    INSERT INTO correspondencia_canales (channel_root, channel_epg_id, channel_name, channel_group)
-                    VALUES (?, ?, ?, ?)
-                ''', (row['channel_root'], row['channel_epg_id'], row['channel_name'], row['channel_group']))
+
+def add_arguments(parser):
+    parser.add_argument('--aux_folder', required=True, help='Directorio auxiliar para entrada HTML y salida CSV')
+    parser.add_argument('--listas_folder', required=True, help='Directorio para los archivos M3U de salida')
+    parser.add_argument('--list_orig_file', help='Nombre de la lista original (sin ruta)')
+    parser.add_argument('--db_file', help='Nombre del archivo sqlite (sin ruta)')
+    parser.add_argument('--csv_channels_file', help='Nombre del archivo csv con correspondencia de canales (sin ruta)')
+    parser.add_argument('--csv_list_file', help='Nombre del archivo M3U de eventos (sin ruta)')
+    parser.add_argument('--m3u_channels_file', help='Nombre del archivo M3U de canales (sin ruta)')
+    parser.add_argument('--epg_file', action='append', help='Guía XMLTV (.xml o .xml.gz, sin ruta) para dar tvg-id a los canales sin correspondencia; se puede repetir')
+    parser.add_argument('--force', action='store_true', help='Regenerar las listas aunque las entradas no hayan cambiado')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Registrar en el log cada canal leído y su correspondencia')
+
+
+# Entrada de las listas de canales: grupo, FHD (1/0, None en VARIOS), línea
+# EXTINF ya formateada y URL del stream
+ChannelEntry = namedtuple('ChannelEntry', ['group', 'fhd', 'extinf', 'url'])
+
+
+def channel_entries(cursor):
+    """Entradas de las listas de canales en el orden en que se escriben.
+
+    La conexión tiene que tener adjunta la base de datos de salud de los
+    streams (attach_health_db).
+
+    Primero los canales con correspondencia (activo = 1); dentro de cada canal
+    van primero los streams que funcionaban en el último sondeo de
+    process_m3u.py (luego los no sondeados y al final los caídos), y los que
+    mostraban la misma imagen van juntos. Después los que no tienen
+    correspondencia, en el grupo VARIOS, con el id de la guía si se encontró
+    en ella o si no con el original.
+    """
+    for row in cursor.execute(f'''SELECT c.iptv_epg_id_new, c.iptv_group_new, c.name_new, c.iptv_url, c.FHD
+                                  FROM canales_iptv_temp c LEFT JOIN health.stream_health h ON h.acestream_id = c.acestream_id
+                                  WHERE c.presente = 1 AND c.activo = 1
+                                  ORDER BY c.iptv_group_new, c.name_new, {HEALTH_ORDER}, h.cluster_id, c.id'''):
+        iptv_epg_id_new, iptv_group_new, name_new, iptv_url, fhd = row
+
+        # Añadir " [FHD]" o " [HD]" al nombre del canal según el valor de FHD
+        if fhd == 1:
+            name_new_with_quality = f"{name_new} FHD"
+        else:
+            name_new_with_quality = f"{name_new} HD"
+
+        yield ChannelEntry(iptv_group_new, 1 if fhd == 1 else 0,
+                           f'#EXTINF:-1 tvg-id="{iptv_epg_id_new}" group-title="{iptv_group_new}", {name_new_with_quality}\n', iptv_url)
+
+    for row in cursor.execute(f'''SELECT COALESCE(NULLIF(c.iptv_epg_id_new, ''), c.iptv_epg_id_original), c.name_original, c.iptv_url
+                                  FROM canales_iptv_temp c LEFT JOIN health.stream_health h ON h.acestream_id = c.acestream_id
+                                  WHERE c.presente = 1 AND c.activo = 0
+                                  ORDER BY c.name_original, {HEALTH_ORDER}, c.id'''):
+        iptv_epg_id_original, name_original, iptv_url = row
+        # Eliminar " -->" y todo el texto que le sigue en name_original
+        if " -->" in name_original:
+            name_original = name_original.split(" -->")[0].strip()
+        yield ChannelEntry('VARIOS', None, f'#EXTINF:-1 tvg-id="{iptv_epg_id_original}" group-title="VARIOS", {name_original}\n', iptv_url)
+
+
+def read_canales(file, trace=False):
+    """Lee en una sola pasada la lista M3U abierta en file.
+
+    Devuelve (canales, número de líneas), con los canales como tuplas
+    (channel_name, tvg_id, group_title, url, fhd) para sync_canales.
+    """
+    canales = []
+    reader = M3UReader(file)
+    for entry in reader:
+        channel_name = normalize_channel_name(entry.name)
+        tvg_id = NON_ASCII_RE.sub('', entry.tvg_id)
+        group_title = NON_ASCII_RE.sub('', entry.group_title)
+        url = NON_ASCII_RE.sub('', entry.url)
+        if trace:
+            logging.debug("Procesando canal: %s", channel_name)
+
+        # Determinar si el canal es FHD
+        if "FHD" in channel_name or "1080" in channel_name:
+            fhd = 1  # Es FHD
+        else:
+            fhd = 0  # No es FHD
+
+        canales.append((channel_name, tvg_id, group_title, url, fhd))
+    return canales, reader.line_count
+
+
+def write_channel_lists(cursor, base_path):
+    """Escribe las listas de todos los reproductores (ott, ace, kodi...) en una
+    sola pasada: cada fila se lee y se formatea una vez para todos los destinos.
+
+    La conexión tiene que tener adjunta la base de datos de salud. Devuelve
+    (canales con correspondencia, canales en VARIOS, True si falló alguna lista).
+    """
+    activos = 0
+    varios = 0
+    with MultiTargetWriter(base_path) as writer:
+        for entry in channel_entries(cursor):
+            writer.write_entry(entry.extinf, entry.url)
+            if entry.fhd is None:
+                varios += 1
             else:
-                print("Falta una de las claves necesarias en la fila:", row)
-
-    # Eliminar la tabla correspondencia_canales si existe
-    cursor.execute('DROP TABLE IF EXISTS canales_iptv_temp')
-    # volver a crearla
-    cursor.execute('''CREATE TABLE IF NOT EXISTS canales_iptv_temp (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        import_date TEXT,
-        name_original TEXT,
-        name_new TEXT,
-        iptv_epg_id_original TEXT,
-        iptv_epg_id_new TEXT,
-        iptv_group_original TEXT,
-        iptv_group_new TEXT,
-        FHD INTEGER,
-        iptv_url TEXT,
-        activo INTEGER DEFAULT 0
-    )''')
-    cursor.execute('DELETE FROM canales_iptv_temp')
-
-    import_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-    lines = m3u_content.splitlines()
-    logging.info(f"Número total de líneas en el archivo M3U: {len(lines)}")
-
-    start_index = next((i for i, line in enumerate(lines) if line.startswith("#EXTINF:-1")), None)
-    if start_index is not None:
-        for i in range(start_index, len(lines), 2):
-            # logging.debug(f"Procesando línea {i}: {lines[i]}")
-            if lines[i].startswith("#EXTINF:-1"):
-                extinf_parts = lines[i].split(',')
-                channel_name = extinf_parts[-1].strip().upper()
-                tvg_id_match = re.search(r'tvg-id="([^"]+)"', lines[i])
-                group_title_match = re.search(r'group-title="([^"]+)"', lines[i])
-                tvg_id = tvg_id_match.group(1) if tvg_id_match else ""
-                group_title = group_title_match.group(1) if group_title_match else ""
-                url = lines[i + 1] if i + 1 < len(lines) else ""
-                channel_name = re.sub(r'[^\x00-\x7F]+', '', channel_name)
-                tvg_id = re.sub(r'[^\x00-\x7F]+', '', tvg_id)
-                group_title = re.sub(r'[^\x00-\x7F]+', '', group_title)
-                url = re.sub(r'[^\x00-\x7F]+', '', url)
-                logging.info(f"Procesando canal: {channel_name}")
-                # logging.debug(f"tvg-id: {tvg_id}")
-                # logging.debug(f"group-title: {group_title}")
-                # logging.debug(f"url: {url}")
-
-                # Determinar si el canal es FHD
-                if "FHD" in channel_name or "1080" in channel_name:
-                    fhd = 1  # Es FHD
-                else:
-                    fhd = 0  # No es FHD
-    
-                # Insertar el registro en la tabla canales_iptv_temp
-                cursor.execute('''INSERT INTO canales_iptv_temp (
-                    import_date, name_original, iptv_epg_id_original, iptv_epg_id_new, iptv_group_original, iptv_group_new, iptv_url, name_new, activo, FHD
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', (import_date, channel_name, tvg_id, "", group_title, "", url, "", 0, fhd))
-                
-    cursor.execute("SELECT id, name_original FROM canales_iptv_temp")
-    canales_iptv_temp = cursor.fetchall()
-    for canal in canales_iptv_temp:
-        id_temp, name_original = canal
-        cursor.execute("SELECT id, channel_root, channel_epg_id, channel_group, channel_name FROM correspondencia_canales WHERE ? LIKE '%' || channel_root || '%'", (name_original,))
-        posibles_correspondencias = cursor.fetchall()
-        if posibles_correspondencias:
-            mejor_correspondencia = min(posibles_correspondencias, key=lambda x: Levenshtein.distance(name_original, x[1]))
-            cursor.execute('''UPDATE canales_iptv_temp SET activo = 1, iptv_epg_id_new = ?, iptv_group_new = ?, name_new = ? WHERE id = ?''', (mejor_correspondencia[2], mejor_correspondencia[3], mejor_correspondencia[4], id_temp))
+                activos += 1
+    return activos, varios, writer.failed
+
+
+def process_channel_list(aux_folder, listas_folder, list_orig_file, db_file, csv_channels_file, csv_list_file, m3u_channels_file,
+                         force=False, verbose=False, m3u_text=None, epg_files=None):
+    """Importa la lista original en zz_canales.db y genera las listas de cada reproductor.
+
+    Las carpetas son relativas a la raíz del repositorio y los ficheros
+    relativos a ellas, como en la línea de comandos. Con m3u_text (el
+    contenido de list_orig_file ya en memoria, p. ej. recién extraído por
+    parse_iframe_data) no se vuelve a leer el fichero. Con epg_files (guías
+    XMLTV de aux_folder, en orden de preferencia) los canales que no están en
+    el CSV de correspondencias toman el tvg-id de la guía. Devuelve False si
+    las entradas no han cambiado y no se ha regenerado nada.
+    """
+    # Asignar argumentos
+    m3u_file_name = list_orig_file
+    db_file_name = db_file
+    correspondencia_csv_name = csv_channels_file
+    canales_iptv_temp_csv_name = csv_list_file
+
+    # Construir rutas completas
+    aux_folder = os.path.join(parent_dir, aux_folder)
+    listas_folder = os.path.join(parent_dir, listas_folder)
+
+    # Crear directorios si no existen
+    os.makedirs(aux_folder, exist_ok=True)
+    os.makedirs(listas_folder, exist_ok=True)
+
+    # Rutas completas de archivos
+    m3u_file_path = os.path.join(aux_folder, m3u_file_name)
+    db_file_path = os.path.join(aux_folder, db_file_name)
+    health_db_path = os.path.join(aux_folder, HEALTH_DB_FILE)
+    correspondencia_csv_path = os.path.join(aux_folder, correspondencia_csv_name)
+    canales_iptv_temp_csv_path = os.path.join(aux_folder, canales_iptv_temp_csv_name)
+    # Ruta base de las listas generadas: se añade _<destino>.m3u por cada reproductor
+    zz_lista_base_path = os.path.join(listas_folder, m3u_channels_file)
+
+    # Verificar que el archivo HTML existe
+    if m3u_text is None and not os.path.exists(m3u_file_path):
+        print(f"Error: El archivo HTML {m3u_file_path} no existe")
+        sys.exit(1)
+
+    # Huellas de las entradas: si ni la lista original, ni el CSV de correspondencias,
+    # ni las guías ni la salud de los streams han cambiado desde la última
+    # ejecución correcta, no hay nada que regenerar.
+    # Se comprueba antes de tocar el log para no modificar ningún fichero.
+    input_hashes = {
+        m3u_file_name: text_hash(m3u_text) if m3u_text is not None else file_hash(m3u_file_path),
+        correspondencia_csv_name: file_hash(correspondencia_csv_path),
+    }
+    epg_guides = []
+    for epg_file in epg_files or []:
+        epg_path = os.path.join(aux_folder, epg_file)
+        if os.path.exists(epg_path):
+            epg_guides.append((epg_path, file_hash(epg_path)))
         else:
-            cursor.execute("UPDATE canales_iptv_temp SET activo = 0 WHERE id = ?", (id_temp,))
+            print(f"Aviso: la guía {epg_path} no existe; se ignora")
+    output_paths = [canales_iptv_temp_csv_path] + [f"{zz_lista_base_path}_{name}.m3u" for name in OUTPUT_TARGETS]
+    with FingerprintStore(db_file_path) as fingerprints:
+        # Huella del conjunto de guías; también cuando se dejan de usar, para
+        # volver a calcular los ids de los canales sin correspondencia
+        if epg_guides or fingerprints.get('epg') is not None:
+            input_hashes['epg'] = text_hash('\n'.join(f"{os.path.basename(path)} {digest}" for path, digest in epg_guides))
+        # El orden de los streams de cada canal sale del último sondeo de
+        # process_m3u.py, que actualiza stream_health.db sin tocar la lista
+        health_digest = health_fingerprint(health_db_path)
+        if health_digest is not None or fingerprints.get('stream_health') is not None:
+            input_hashes['stream_health'] = health_digest or text_hash('')
+        epg_unchanged = 'epg' not in input_hashes or fingerprints.unchanged('epg', input_hashes['epg'])
+        inputs_unchanged = all(fingerprints.unchanged(name, digest) for name, digest in input_hashes.items())
+        correspondencias_unchanged = fingerprints.unchanged(correspondencia_csv_name, input_hashes[correspondencia_csv_name])
+    if inputs_unchanged and not force and all(os.path.exists(path) for path in output_paths):
+        print(f"Las entradas ({', '.join(input_hashes)}) no han cambiado; no se regeneran las listas.")
+        return False
 
-    conn.commit()
+    # Configuración de logging: el fichero se vacía al abrirlo y se escribe desde
+    # otro hilo; por defecto solo lleva resúmenes por etapa y con --verbose
+    # también una línea por canal
+    log_file_path = os.path.join(aux_folder, 'debug_canales.txt')
+    setup_logging(log_file_path, verbose=verbose)
+    trace = logging.getLogger().isEnabledFor(logging.DEBUG)
 
-    # Borrar el fichero canales_iptv_temp.csv si existe
-    if os.path.exists(canales_iptv_temp_csv_path):
-        os.remove(canales_iptv_temp_csv_path)
-    
-    # Exportar la tabla canales_iptv_temp a un archivo CSV
-    try:
-        with open(canales_iptv_temp_csv_path, 'w', encoding='utf-8', newline='') as csv_file:
-            csv_writer = csv.writer(csv_file, delimiter=',')
-            
-            # Escribir la cabecera del CSV
-            cursor.execute("PRAGMA table_info(canales_iptv_temp)")
-            columns = cursor.fetchall()
-            header = [column[1] for column in columns]  # Obtener los nombres de las columnas
-            csv_writer.writerow(header)
-            
-            # Escribir los datos de la tabla
-            cursor.execute("SELECT * FROM canales_iptv_temp")
-            rows = cursor.fetchall()
-            for row in rows:
-                csv_writer.writerow(row)
-        logging.info("Se ha exportado la tabla canales_iptv_temp a csv")
-    except Exception as e:
-        logging.error(f"Error al exportar la tabla canales_iptv_temp a CSV: {e}")
-
-    # Generar el archivo zz_lista_ott.m3u
-    try:
-        with open(zz_lista_ott_path, 'w', encoding='utf-8') as m3u_file:
-            m3u_file.write('#EXTM3U url-tvg="https://raw.githubusercontent.com/davidmuma/EPG_dobleM/refs/heads/master/guiatv.xml, https://epgshare01.online/epgshare01/epg_ripper_NL1.xml.gz"\n')
-            m3u_file.write('#EXTVLCOPT:network-caching=2000\n\n')
-
-            # Primero escribimos los registros con activo = 1
-            for row in cursor.execute('SELECT iptv_epg_id_new, iptv_group_new, name_new, iptv_url, FHD FROM canales_iptv_temp WHERE activo = 1 ORDER BY iptv_group_new, name_new'):
-                iptv_epg_id_new, iptv_group_new, name_new, iptv_url, fhd = row
-                
-                # Añadir " [FHD]" o " [HD]" al nombre del canal según el valor de FHD
-                if fhd == 1:
-                    name_new_with_quality = f"{name_new} FHD"
-                else:
-                    name_new_with_quality = f"{name_new} HD"
-                
-                m3u_file.write(f'#EXTINF:-1 tvg-id="{iptv_epg_id_new}" group-title="{iptv_group_new}", {name_new_with_quality}\n')
-                m3u_file.write(f'{iptv_url}\n')
-            
-            # Luego escribimos los registros con activo = 0
-            for row in cursor.execute('SELECT iptv_epg_id_original, name_original, iptv_url FROM canales_iptv_temp WHERE activo = 0 ORDER BY name_original'):
-                iptv_epg_id_original, name_original, iptv_url = row
-                # Eliminar " -->" y todo el texto que le sigue en name_original
-                if " -->" in name_original:
-                    name_original = name_original.split(" -->")[0].strip()
-                m3u_file.write(f'#EXTINF:-1 tvg-id="{iptv_epg_id_original}" group-title="VARIOS", {name_original}\n')
-                m3u_file.write(f'{iptv_url}\n')
-    except Exception as e:
-        logging.error(f"Error al generar lista ott: {e}")
-
-    # Generar el archivo zz_lista_ace.m3u
+    # Leer la lista M3U en una sola pasada, sin cargarla entera en memoria (o
+    # desde el texto recibido, con los mismos saltos de línea que al leer el fichero)
+    with run_report.timer('parse'):
+        try:
+            source = io.StringIO(m3u_text, newline=None) if m3u_text is not None else open(m3u_file_path, 'r', encoding='utf-8')
+            with source as file:
+                canales, line_count = read_canales(file, trace=trace)
+        except Exception as e:
+            logging.error("Error al leer el archivo M3U desde %s: %s", m3u_file_path, e)
+            sys.exit(1)
+
+    # Verificar si el archivo tiene menos de 100 líneas
+    if line_count < 100:
+        logging.error("El archivo %s tiene menos de 100 líneas. Deteniendo la ejecución del script.", m3u_file_path)
+        sys.exit(1)
+    logging.info("Leídos %d canales de %s (%d líneas)", len(canales), m3u_file_name, line_count)
+    run_report.count('m3u_lines', line_count)
+    run_report.count('canales', len(canales))
+
+    # Conectar a la base de datos SQLite
+    listas_ok = True
     try:
-        with open(zz_lista_ace_path, 'w', encoding='utf-8') as ace_file:
-            ace_file.write('#EXTM3U url-tvg="https://raw.githubusercontent.com/davidmuma/EPG_dobleM/refs/heads/master/guiatv.xml, https://epgshare01.online/epgshare01/epg_ripper_NL1.xml.gz"\n')
-            ace_file.write('#EXTVLCOPT:network-caching=2000\n\n')
-
-            # Primero escribimos los registros con activo = 1
-            for row in cursor.execute('SELECT iptv_epg_id_new, iptv_group_new, name_new, iptv_url, FHD FROM canales_iptv_temp WHERE activo = 1 ORDER BY iptv_group_new, name_new'):
-                iptv_epg_id_new, iptv_group_new, name_new, iptv_url, fhd = row
-                
-                # Añadir " [FHD]" o " [HD]" al nombre del canal según el valor de FHD
-                if fhd == 1:
-                    name_new_with_quality = f"{name_new} FHD"
-                else:
-                    name_new_with_quality = f"{name_new} HD"
-                
-                ace_file.write(f'#EXTINF:-1 tvg-id="{iptv_epg_id_new}" group-title="{iptv_group_new}", {name_new_with_quality}\n')
-                ace_url = iptv_url.replace("http://127.0.0.1:6878/ace/getstream?id=", "acestream://")
-                ace_file.write(f'{ace_url}\n')
-            
-            # Luego escribimos los registros con activo = 0
-            for row in cursor.execute('SELECT iptv_epg_id_original, name_original, iptv_url FROM canales_iptv_temp WHERE activo = 0 ORDER BY name_original'):
-                iptv_epg_id_original, name_original, iptv_url = row
-                # Eliminar " -->" y todo el texto que le sigue en name_original
-                if " -->" in name_original:
-                    name_original = name_original.split(" -->")[0].strip()
-                ace_file.write(f'#EXTINF:-1 tvg-id="{iptv_epg_id_original}" group-title="VARIOS", {name_original}\n')
-                ace_url = iptv_url.replace("http://127.0.0.1:6878/ace/getstream?id=", "acestream://")
-                ace_file.write(f'{ace_url}\n')
-    except Exception as e:
-        logging.error(f"Error al generar lista ace: {e}")
+        conn = sqlite3.connect(db_file_path)
+        cursor = conn.cursor()
+        configure_connection(conn)
+
+        import_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+        # Escribir todo en una única transacción
+        with run_report.timer('db_write'):
+            cursor.execute('BEGIN')
+
+            # La tabla de correspondencias solo se regenera si ha cambiado el CSV; en
+            # ese caso hay que recalcular la correspondencia de todos los canales
+            rematch_all = force or not correspondencias_unchanged or not table_exists(cursor, 'correspondencia_canales')
+            if rematch_all:
+                recreate_correspondencia_table(cursor, read_correspondencias_csv(correspondencia_csv_path))
+
+            # Las correspondencias ya calculadas salen de la caché persistente (que se
+            # invalida si cambia el CSV) y solo se aplican los cambios respecto a la
+            # importación anterior
+            ensure_canales_table(cursor)
+            matcher = MatchCache(cursor, input_hashes[correspondencia_csv_name])
+            # Segundo nivel: los canales sin correspondencia se buscan en las guías
+            epg_index = EpgIndex.load(cursor, epg_guides) if epg_guides else None
+            sync_stats = sync_canales(cursor, canales, matcher, import_date, rematch_all=rematch_all or not epg_unchanged,
+                                      epg_index=epg_index)
+            matcher.log_stats()
+            if epg_index is not None:
+                sync_stats['guia'] = cursor.execute(
+                    "SELECT COUNT(*) FROM canales_iptv_temp WHERE presente = 1 AND activo = 0 AND iptv_epg_id_new != ''").fetchone()[0]
+                logging.info("Canales sin correspondencia con id de la guía: %d (%d nombres en las guías)",
+                             sync_stats['guia'], len(epg_index))
+            create_export_indexes(cursor)
+            conn.commit()
+        # Estado de los streams del último sondeo de process_m3u.py, para ordenarlos
+        attach_health_db(conn, health_db_path)
+        for name, value in sync_stats.items():
+            run_report.count(f"canales.{name}", value)
+
+        # Borrar el fichero canales_iptv_temp.csv si existe
+        if os.path.exists(canales_iptv_temp_csv_path):
+            os.remove(canales_iptv_temp_csv_path)
     
-    # Generar el archivo zz_lista_kodi.m3u
-    try:
-        with open(zz_lista_kodi_path, 'w', encoding='utf-8') as kodi_file:
-            kodi_file.write('#EXTM3U url-tvg="https://raw.githubusercontent.com/davidmuma/EPG_dobleM/refs/heads/master/guiatv.xml, https://epgshare01.online/epgshare01/epg_ripper_NL1.xml.gz"\n')
-            kodi_file.write('#EXTVLCOPT:network-caching=2000\n\n')
-
-            # Primero escribimos los registros con activo = 1
-            for row in cursor.execute('SELECT iptv_epg_id_new, iptv_group_new, name_new, iptv_url, FHD FROM canales_iptv_temp WHERE activo = 1 ORDER BY iptv_group_new, name_new'):
-                iptv_epg_id_new, iptv_group_new, name_new, iptv_url, fhd = row
-                
-                # Añadir " [FHD]" o " [HD]" al nombre del canal según el valor de FHD
-                if fhd == 1:
-                    name_new_with_quality = f"{name_new} FHD"
-                else:
-                    name_new_with_quality = f"{name_new} HD"
-                
-                kodi_file.write(f'#EXTINF:-1 tvg-id="{iptv_epg_id_new}" group-title="{iptv_group_new}", {name_new_with_quality}\n')
-                kodi_url = iptv_url.replace("http://127.0.0.1:6878/ace/getstream?id=", "plugin://script.module.horus?action=play&id=")
-                kodi_file.write(f'{kodi_url}\n')
+        # Exportar la tabla canales_iptv_temp a un archivo CSV
+        try:
+            with run_report.timer('export.csv'), open(canales_iptv_temp_csv_path, 'w', encoding='utf-8', newline='') as csv_file:
+                csv_writer = csv.writer(csv_file, delimiter=',')
             
-            # Luego escribimos los registros con activo = 0
-            for row in cursor.execute('SELECT iptv_epg_id_original, name_original, iptv_url FROM canales_iptv_temp WHERE activo = 0 ORDER BY name_original'):
-                iptv_epg_id_original, name_original, iptv_url = row
-                # Eliminar " -->" y todo el texto que le sigue en name_original
-                if " -->" in name_original:
-                    name_original = name_original.split(" -->")[0].strip()
-                kodi_file.write(f'#EXTINF:-1 tvg-id="{iptv_epg_id_original}" group-title="VARIOS", {name_original}\n')
-                kodi_url = iptv_url.replace("http://127.0.0.1:6878/ace/getstream?id=", "plugin://script.module.horus?action=play&id=")
-                kodi_file.write(f'{kodi_url}\n')
-    except Exception as e:
-        logging.error(f"Error al generar lista kodi: {e}")
-    
-finally:
-    if conn:
-        conn.close()
+                # Escribir la cabecera del CSV
+                cursor.execute("PRAGMA table_info(canales_iptv_temp)")
+                columns = cursor.fetchall()
+                header = [column[1] for column in columns]  # Obtener los nombres de las columnas
+                csv_writer.writerow(header)
+            
+                # Escribir los datos de la tabla
+                cursor.execute("SELECT * FROM canales_iptv_temp ORDER BY id")
+                rows = cursor.fetchall()
+                for row in rows:
+                    csv_writer.writerow(row)
+            logging.info("Se ha exportado la tabla canales_iptv_temp a csv (%d filas)", len(rows))
+        except Exception as e:
+            logging.error("Error al exportar la tabla canales_iptv_temp a CSV: %s", e)
+            listas_ok = False
+
+        # Generar las listas de todos los reproductores (ott, ace, kodi...) en una
+        # sola pasada: cada fila se lee y se formatea una vez para todos los destinos
+        try:
+            with run_report.timer('export.m3u'):
+                activos, varios, failed = write_channel_lists(cursor, zz_lista_base_path)
+            logging.info("Listas M3U generadas: %d canales con correspondencia y %d en VARIOS", activos, varios)
+            if failed:
+                listas_ok = False
+        except Exception as e:
+            logging.error("Error al generar las listas M3U: %s", e)
+            listas_ok = False
+
+    finally:
+        if conn:
+            conn.close()
+
+    # Guardar las huellas solo si todas las salidas se generaron bien
+    if listas_ok:
+        with FingerprintStore(db_file_path) as fingerprints:
+            for name, digest in input_hashes.items():
+                fingerprints.update(name, digest)
+        logging.info("Las listas se han generado correctamente.")
+    else:
+        logging.error("No se han podido generar todas las listas; se volverán a generar en la próxima ejecución.")
+    return True
+
+
+def run(args):
+    """Ejecuta la etapa con los argumentos de add_arguments, con su informe de ejecución"""
+    # Informe de tiempos y contadores de la ejecución, junto al CSV exportado
+    run_report.start('process_channel_list', run_report.report_path(os.path.join(parent_dir, args.aux_folder), 'process_channel_list'))
+    regenerated = process_channel_list(args.aux_folder, args.listas_folder, args.list_orig_file, args.db_file, args.csv_channels_file,
+                                       args.csv_list_file, args.m3u_channels_file, force=args.force, verbose=args.verbose,
+                                       epg_files=args.epg_file)
+    # Copias .m3u.gz y manifest.json de las listas
+    publish_folder(os.path.join(parent_dir, args.listas_folder))
+    # Sin cambios no se guarda el informe, para no tocar la carpeta auxiliar
+    if not regenerated:
+        run_report.discard()
+    return regenerated
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Procesar lista de canales')
+    add_arguments(parser)
+    run(parser.parse_args(argv))
+
 
-logging.info("Las listas se han generado correctamente.")
+if __name__ == "__main__":
+    main()
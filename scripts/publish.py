@@ -0,0 +1,90 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+
+import run_report
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def _write_atomic(path, data):
+    """Escribe data (bytes) en un temporal del mismo directorio y lo renombra"""
+    directory, filename = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{filename}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _playlists(folder):
+    """Rutas relativas (con /) de las listas .m3u de folder y sus subcarpetas, ordenadas"""
+    paths = []
+    for root, dirs, files in os.walk(folder):
+        for filename in files:
+            if filename.endswith('.m3u'):
+                paths.append(os.path.relpath(os.path.join(root, filename), folder).replace(os.sep, '/'))
+    return sorted(paths)
+
+
+def load_manifest(folder):
+    path = os.path.join(folder, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('files', {})
+    except (OSError, ValueError) as e:
+        logging.warning("No se ha podido leer %s: %s", path, e)
+        return {}
+
+
+def publish_folder(folder):
+    """Genera la copia .m3u.gz de cada lista de folder y el manifest.json con su
+    sha256 y tamaño.
+
+    Las listas que no han cambiado según el manifiesto anterior no se vuelven
+    a comprimir, y el gzip se genera sin fecha ni nombre de fichero, así el
+    mismo contenido da siempre los mismos bytes y ni los clientes ni git ven
+    cambios. Se borran los .m3u.gz de listas que ya no existen. Devuelve el
+    número de listas (comprimidas, sin cambios).
+    """
+    with run_report.timer('publish'):
+        previous = load_manifest(folder)
+        files = {}
+        written = unchanged = 0
+        for name in _playlists(folder):
+            path = os.path.join(folder, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            entry = previous.get(name)
+            if entry is not None and entry.get('sha256') == digest and os.path.exists(path + '.gz'):
+                files[name] = entry
+                unchanged += 1
+                continue
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            _write_atomic(path + '.gz', compressed)
+            files[name] = {
+                'sha256': digest,
+                'size': len(data),
+                'gzip_sha256': hashlib.sha256(compressed).hexdigest(),
+                'gzip_size': len(compressed),
+            }
+            written += 1
+
+        # Copias comprimidas de listas borradas (p. ej. días que ya han pasado)
+        for root, dirs, filenames in os.walk(folder):
+            for filename in filenames:
+                if filename.endswith('.m3u.gz') and not os.path.exists(os.path.join(root, filename[:-3])):
+                    os.remove(os.path.join(root, filename))
+
+        if files != previous or not os.path.exists(os.path.join(folder, MANIFEST_FILE)):
+            manifest = json.dumps({'files': files}, indent=2, sort_keys=True, ensure_ascii=False) + '\n'
+            _write_atomic(os.path.join(folder, MANIFEST_FILE), manifest.encode('utf-8'))
+
+    run_report.count('publish.gzip', written)
+    run_report.count('publish.unchanged', unchanged)
+    logging.info("Publicadas %d listas en %s: %d comprimidas y %d sin cambios", len(files), folder, written, unchanged)
+    return written, unchanged
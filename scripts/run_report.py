@@ -0,0 +1,173 @@
+"""Temporizadores y contadores de una ejecución, guardados en un informe JSON.
+
+Los módulos miden sus etapas con ``with run_report.timer('parse'):`` y
+cuentan elementos con ``run_report.count('canales', n)`` sobre el informe
+global de la ejecución. Si el script no llama a start() no se guarda nada y
+medir solo cuesta un par de perf_counter.
+
+Con la variable de entorno RUN_PROFILE=cprofile (o pyinstrument, si está
+instalado) se perfila además el hilo principal y el perfil se guarda junto
+al informe (.prof para cProfile, .html para pyinstrument).
+"""
+import atexit
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_ENV = 'RUN_PROFILE'
+
+
+class RunReport:
+    """Tiempos acumulados por etapa y contadores de una ejecución.
+
+    Cada etapa guarda los segundos totales, las veces que se ha medido y la
+    medida más larga; las etapas que se ejecutan en varios hilos a la vez
+    (HTTP, ffmpeg) suman el tiempo de todos ellos.
+    """
+
+    def __init__(self):
+        self.script = None
+        self.path = None
+        self.started_at = datetime.now()
+        self.stages = {}
+        self.counters = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._profiler = None
+        self._profile_path = None
+        self._saved = False
+
+    def start(self, script, path):
+        """Empieza a medir una ejecución de script; el informe se guarda en path al salir"""
+        self.script = script
+        self.path = path
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self._start_profiler(os.environ.get(PROFILE_ENV, '').strip().lower())
+        atexit.register(self.save)
+
+    def _start_profiler(self, kind):
+        base_path = os.path.splitext(self.path)[0]
+        if kind == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print(f"{PROFILE_ENV}=pyinstrument pero pyinstrument no está instalado; se usa cProfile", file=sys.stderr)
+                kind = 'cprofile'
+            else:
+                self._profiler = Profiler()
+                self._profile_path = f"{base_path}.html"
+                self._profiler.start()
+        if kind == 'cprofile':
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profile_path = f"{base_path}.prof"
+            self._profiler.enable()
+        elif kind and self._profiler is None:
+            print(f"{PROFILE_ENV}={kind} no reconocido (cprofile o pyinstrument)", file=sys.stderr)
+
+    def _stop_profiler(self):
+        if self._profiler is None:
+            return
+        if hasattr(self._profiler, 'disable'):
+            self._profiler.disable()
+            self._profiler.dump_stats(self._profile_path)
+        else:
+            self._profiler.stop()
+            with open(self._profile_path, 'w', encoding='utf-8') as f:
+                f.write(self._profiler.output_html())
+        print(f"Perfil guardado en {self._profile_path}", file=sys.stderr)
+        self._profiler = None
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {'seconds': 0.0, 'calls': 0, 'max': 0.0}
+            stage['seconds'] += seconds
+            stage['calls'] += 1
+            stage['max'] = max(stage['max'], seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        with self._lock:
+            stages = {name: {'seconds': round(stage['seconds'], 6), 'calls': stage['calls'], 'max': round(stage['max'], 6)}
+                      for name, stage in self.stages.items()}
+            counters = dict(self.counters)
+        return {
+            'script': self.script,
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'elapsed': round(time.perf_counter() - self._start, 6),
+            'python': platform.python_version(),
+            'stages': stages,
+            'counters': counters,
+        }
+
+    def save(self):
+        """Guarda el informe (una sola vez) de forma atómica"""
+        if self.path is None or self._saved:
+            return
+        self._saved = True
+        self._stop_profiler()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.as_dict(), f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        os.replace(tmp_path, self.path)
+
+    def discard(self):
+        """No guardar el informe: la ejecución no ha hecho nada que merezca medirse"""
+        self._saved = True
+        if self._profiler is not None:
+            self._profiler.disable() if hasattr(self._profiler, 'disable') else self._profiler.stop()
+            self._profiler = None
+
+
+# Informe global de la ejecución
+_report = RunReport()
+
+
+def start(script, path):
+    _report.start(script, path)
+
+
+def timer(name):
+    return _report.timer(name)
+
+
+def add_time(name, seconds):
+    _report.add_time(name, seconds)
+
+
+def count(name, value=1):
+    _report.count(name, value)
+
+
+def save():
+    _report.save()
+
+
+def discard():
+    _report.discard()
+
+
+def report_path(folder, script):
+    """Ruta del informe de script dentro de folder: run_report_<script>.json"""
+    return os.path.join(folder, f"run_report_{script}.json")
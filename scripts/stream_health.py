@@ -0,0 +1,184 @@
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+
+from channel_db import stream_key
+from frame_analysis import HEALTH_OK
+from probe_scheduler import ProbeScheduler, ScheduleState
+
+# Columnas añadidas después de crear la tabla: nombre -> tipo
+_LATER_COLUMNS = {
+    'cluster_id': 'TEXT',
+    'healthy': 'INTEGER',
+    'consecutive_failures': 'INTEGER DEFAULT 0',
+    'flap_score': 'REAL DEFAULT 0',
+    'next_probe_at': 'TEXT',
+}
+
+# Base de datos (en la carpeta auxiliar, junto a zz_canales.db) con el estado
+# de los sondeos: stream_health y snapshot_hashes. Solo la escribe
+# process_m3u.py, para que su flujo de trabajo no choque con el que
+# actualiza zz_canales.db
+HEALTH_DB_FILE = 'stream_health.db'
+# Tablas que se guardaban antes en zz_canales.db
+HEALTH_TABLES = ('stream_health', 'snapshot_hashes')
+
+# Expresión ORDER BY (sobre stream_health con alias h) que pone primero los
+# streams sanos, luego los que no se han sondeado y al final los caídos
+HEALTH_ORDER = 'CASE WHEN h.healthy = 1 THEN 0 WHEN h.healthy IS NULL THEN 1 ELSE 2 END'
+
+
+def ensure_health_table(conn, schema='main'):
+    """Crea stream_health si no existe, añadiendo las columnas de versiones posteriores"""
+    conn.execute(f'''CREATE TABLE IF NOT EXISTS {schema}.stream_health (
+        acestream_id TEXT PRIMARY KEY,
+        channel_name TEXT,
+        checked_at TEXT,
+        status TEXT,
+        health TEXT,
+        sharpness REAL,
+        luminance REAL,
+        motion REAL,
+        elapsed REAL
+    )''')
+    existing = {row[1] for row in conn.execute(f'PRAGMA {schema}.table_info(stream_health)')}
+    for column, column_type in _LATER_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f'ALTER TABLE {schema}.stream_health ADD COLUMN {column} {column_type}')
+
+
+def attach_health_db(conn, health_db_path):
+    """Adjunta la base de datos de salud como esquema health para consultar
+    health.stream_health. Solo se lee; si aún no existe o no tiene la tabla
+    se adjunta una tabla vacía en memoria, sin crear el fichero."""
+    if os.path.exists(health_db_path):
+        conn.execute('ATTACH DATABASE ? AS health', (health_db_path,))
+        if conn.execute("SELECT 1 FROM health.sqlite_master WHERE type = 'table' AND name = 'stream_health'").fetchone():
+            return
+        conn.execute('DETACH DATABASE health')
+    conn.execute("ATTACH DATABASE ':memory:' AS health")
+    ensure_health_table(conn, 'health')
+
+
+def health_fingerprint(health_db_path):
+    """sha256 de lo que usan las listas de stream_health (healthy y cluster_id
+    de cada stream), o None si no hay base de datos de salud. No cambia con
+    las horas de sondeo, así que un sondeo que no altera el orden no obliga a
+    regenerar las listas."""
+    if not os.path.exists(health_db_path):
+        return None
+    digest = hashlib.sha256()
+    conn = sqlite3.connect(health_db_path)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stream_health'").fetchone():
+            return None
+        for row in conn.execute('SELECT acestream_id, healthy, cluster_id FROM stream_health ORDER BY acestream_id'):
+            digest.update(repr(row).encode('utf-8'))
+    finally:
+        conn.close()
+    return digest.hexdigest()
+
+
+def migrate_health_db(health_db_path, legacy_db_path):
+    """Crea la base de datos de salud con las tablas de HEALTH_TABLES que
+    hubiera en legacy_db_path (zz_canales.db), para no perder el historial.
+    No hace nada si ya existe; devuelve True si la ha creado."""
+    if os.path.exists(health_db_path) or not os.path.exists(legacy_db_path):
+        return False
+    conn = sqlite3.connect(health_db_path)
+    try:
+        conn.execute('ATTACH DATABASE ? AS legacy', (legacy_db_path,))
+        placeholders = ', '.join('?' for _ in HEALTH_TABLES)
+        # Primero las tablas y luego sus índices
+        for (sql,) in conn.execute(f'''SELECT sql FROM legacy.sqlite_master
+                                     WHERE tbl_name IN ({placeholders}) AND sql IS NOT NULL
+                                     ORDER BY type = 'index', name''', HEALTH_TABLES).fetchall():
+            conn.execute(sql)
+        for table in HEALTH_TABLES:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+                conn.execute(f'INSERT INTO main.{table} SELECT * FROM legacy.{table}')
+        conn.commit()
+        conn.execute('DETACH DATABASE legacy')
+    finally:
+        conn.close()
+    return True
+
+
+class HealthStore:
+    """Estado de los streams según el último sondeo, guardado en stream_health.db.
+
+    Cada stream (por su id de Acestream) guarda el estado de la captura
+    (ok/timeout/error), la clasificación de sus frames (ok, black,
+    test_pattern, frozen) y las métricas con las que se decidió. cluster_id
+    agrupa los streams que mostraban la misma imagen en el último sondeo.
+
+    healthy (captura correcta y frames sanos) y el resto de columnas de
+    planificación las mantiene el ProbeScheduler para decidir cuándo volver
+    a sondear cada stream.
+    """
+
+    def __init__(self, db_path, scheduler=None):
+        self.conn = sqlite3.connect(db_path)
+        self.scheduler = scheduler or ProbeScheduler()
+        ensure_health_table(self.conn)
+        self.conn.commit()
+
+    def states(self):
+        """Estado de planificación de cada stream: acestream_id -> ScheduleState"""
+        rows = self.conn.execute('SELECT acestream_id, healthy, consecutive_failures, flap_score, next_probe_at, elapsed FROM stream_health')
+        return {row[0]: ScheduleState(row[1], row[2] or 0, row[3] or 0.0, row[4], row[5]) for row in rows}
+
+    def record(self, results, metrics):
+        """Guarda los ProbeResult junto con sus FrameMetrics (None si no hubo frames)
+        y planifica el siguiente sondeo de cada stream. Los fallos del motor
+        (STATUS_ENGINE) no se guardan."""
+        # stream_probe arrastra el cliente HTTP del motor; process_channel_list
+        # solo necesita HEALTH_ORDER y ensure_health_table
+        from stream_probe import STATUS_ENGINE, STATUS_OK
+
+        now = datetime.now()
+        checked_at = now.strftime('%Y-%m-%d %H:%M:%S')
+        states = self.states()
+        rows = []
+        for result, frame_metrics in zip(results, metrics):
+            # Si falló el motor no se sabe nada del stream: se deja como estaba,
+            # sin contar un fallo, y sigue pendiente para la próxima ejecución
+            if result.status == STATUS_ENGINE:
+                continue
+            key = stream_key(result.stream_url)
+            if frame_metrics is None:
+                health, sharpness, luminance, motion = result.status, None, None, None
+            else:
+                health = frame_metrics.health
+                sharpness, luminance, motion = frame_metrics.sharpness, frame_metrics.luminance, frame_metrics.motion
+            healthy = result.status == STATUS_OK and health == HEALTH_OK
+            state = self.scheduler.next_state(states.get(key), healthy, result.elapsed, now)
+            rows.append((key, result.channel_name, checked_at, result.status, health, sharpness, luminance, motion, result.elapsed,
+                         state.healthy, state.consecutive_failures, state.flap_score, state.next_probe_at))
+        self.conn.executemany('''INSERT INTO stream_health
+            (acestream_id, channel_name, checked_at, status, health, sharpness, luminance, motion, elapsed,
+             healthy, consecutive_failures, flap_score, next_probe_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (acestream_id) DO UPDATE SET
+                channel_name = excluded.channel_name, checked_at = excluded.checked_at, status = excluded.status,
+                health = excluded.health, sharpness = excluded.sharpness, luminance = excluded.luminance,
+                motion = excluded.motion, elapsed = excluded.elapsed, healthy = excluded.healthy,
+                consecutive_failures = excluded.consecutive_failures, flap_score = excluded.flap_score,
+                next_probe_at = excluded.next_probe_at, cluster_id = NULL''', rows)
+        self.conn.commit()
+
+    def set_clusters(self, clusters):
+        """Guarda el grupo de imagen (acestream_id -> cluster_id) del último sondeo"""
+        self.conn.executemany('UPDATE stream_health SET cluster_id = ? WHERE acestream_id = ?',
+                              [(cluster_id, acestream_id) for acestream_id, cluster_id in clusters.items()])
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,155 @@
+import subprocess
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import run_report
+from acestream_engine import EngineError
+from channel_db import stream_key
+from frame_analysis import FRAME_HEIGHT, FRAME_WIDTH, frames_from_bytes
+
+STATUS_OK = 'ok'
+STATUS_TIMEOUT = 'timeout'
+STATUS_ERROR = 'error'
+# El fallo es del motor AceStream (caído, sin huecos o con error al abrir la
+# sesión), no del stream: no cuenta en su historial de salud
+STATUS_ENGINE = 'engine_error'
+
+# Resultado de sondear un canal. frames es el array (frames, alto, ancho, 3)
+# que se pasa a frame_analysis.analyze_batch (None si no hubo captura)
+ProbeResult = namedtuple('ProbeResult', ['channel_name', 'stream_url', 'output_path', 'status', 'elapsed', 'frames', 'error'])
+
+
+class StreamProber:
+    """Sondea streams en paralelo con ffmpeg, con un límite de concurrencia.
+
+    Cada canal tiene su propio plazo (timeout segundos desde que empieza su
+    sondeo, contando la espera del motor); al agotarse se mata el proceso
+    ffmpeg. Cada stream (por su id) se sondea una sola vez. cancel() mata todos los
+    procesos en curso y descarta los canales pendientes.
+
+    ffmpeg guarda la captura JPEG en output_path y, en la misma ejecución,
+    envía por stdout `frames` frames crudos escalados (a `fps` por segundo)
+    que se analizan en memoria.
+
+    Con engine_pool (un EngineSessionPool) cada stream se abre primero en el
+    motor AceStream y ffmpeg lee de la playback_url de la sesión cuando el
+    buffer ya está listo, en vez de arrancar el stream en frío.
+    """
+
+    def __init__(self, parallelism=4, timeout=15, seek=10, frames=3, fps=2, engine_pool=None):
+        self.parallelism = parallelism
+        self.timeout = timeout
+        self.seek = seek
+        self.frames = frames
+        self.fps = fps
+        self.engine_pool = engine_pool
+        self._processes = set()
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    def _ffmpeg_command(self, stream_url, output_path):
+        return [
+            'ffmpeg',
+            '-y',
+            '-ss', str(self.seek),
+            '-i', stream_url,
+            '-loglevel', 'error',
+            '-map', '0:v:0', '-frames:v', '1', '-f', 'image2', output_path,
+            '-map', '0:v:0', '-vf', f'fps={self.fps},scale={FRAME_WIDTH}:{FRAME_HEIGHT}',
+            '-frames:v', str(self.frames), '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1'
+        ]
+
+    def capture(self, stream_url, output_path, timeout=None):
+        """Captura la imagen y los frames crudos en timeout segundos (por defecto
+        self.timeout); devuelve (estado, mensaje de error, bytes de stdout)"""
+        timeout = self.timeout if timeout is None else timeout
+        if self._cancelled.is_set():
+            return STATUS_ERROR, 'cancelado', b''
+        try:
+            process = subprocess.Popen(self._ffmpeg_command(stream_url, output_path),
+                                       stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            return STATUS_ERROR, str(e), b''
+
+        with self._lock:
+            self._processes.add(process)
+        if self._cancelled.is_set():
+            process.kill()
+        try:
+            try:
+                with run_report.timer('ffmpeg'):
+                    raw, stderr = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                return STATUS_TIMEOUT, f"sin respuesta en {timeout:.0f}s", b''
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+
+        if self._cancelled.is_set():
+            return STATUS_ERROR, 'cancelado', b''
+        if process.returncode != 0:
+            message = stderr.decode('utf-8', errors='replace').strip().splitlines()
+            return STATUS_ERROR, message[-1] if message else f"ffmpeg terminó con código {process.returncode}", b''
+        return STATUS_OK, None, raw
+
+    def probe(self, channel_name, stream_url, output_path):
+        # Un solo plazo por canal para el hueco en el motor, el buffer y ffmpeg
+        start = time.monotonic()
+        deadline = start + self.timeout
+        if self.engine_pool is None:
+            status, error, raw = self.capture(stream_url, output_path)
+        else:
+            try:
+                with self.engine_pool.session(stream_key(stream_url), timeout=self.timeout) as engine_session:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        status, error, raw = STATUS_TIMEOUT, f"sin tiempo para capturar en {self.timeout}s", b''
+                    else:
+                        status, error, raw = self.capture(engine_session.playback_url, output_path, remaining)
+            except TimeoutError as e:
+                status, error, raw = STATUS_TIMEOUT, str(e), b''
+            except EngineError as e:
+                status, error, raw = STATUS_ENGINE, str(e), b''
+        frames = None
+        if status == STATUS_OK:
+            frames = frames_from_bytes(raw)
+            if frames is None:
+                status, error = STATUS_ERROR, 'captura vacía o corrupta'
+        return ProbeResult(channel_name, stream_url, output_path, status, time.monotonic() - start, frames, error)
+
+    def probe_all(self, jobs):
+        """Sondea los trabajos (channel_name, stream_url, output_path) y genera
+        los ProbeResult según van terminando. Si varios trabajos son del mismo
+        stream solo se sondea el primero."""
+        unique = {}
+        duplicates = 0
+        for job in jobs:
+            if unique.setdefault(stream_key(job[1]), job) is not job:
+                duplicates += 1
+        if duplicates:
+            run_report.count('streams.duplicates', duplicates)
+        jobs = list(unique.values())
+        with ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix='probe') as executor:
+            futures = [executor.submit(self.probe, *job) for job in jobs]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            except BaseException:
+                self.cancel()
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            try:
+                process.kill()
+            except OSError:
+                pass
@@ -0,0 +1,110 @@
+"""Línea de comandos única para generar las listas.
+
+    python scripts/zerrendak.py eventos ...   (= parse_iframe_data.py)
+    python scripts/zerrendak.py canales ...   (= process_channel_list.py)
+    python scripts/zerrendak.py run ...       (las dos etapas en un proceso)
+    python scripts/zerrendak.py serve ...     (= playlist_server.py)
+
+run ejecuta las dos etapas en el mismo proceso: la lista de canales extraída
+de la página pasa en memoria a la importación, sin volver a leerla del disco,
+aunque se siguen escribiendo los mismos ficheros intermedios para depurar.
+Las dependencias pesadas (bs4/lxml, Levenshtein) solo se importan cuando una
+etapa de verdad las necesita.
+"""
+import argparse
+import os
+
+from publish import publish_folder
+import run_report
+
+# Obtener la ruta del directorio padre del script
+script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(script_dir)
+
+
+def command_run(args):
+    from parse_iframe_data import parse_iframe_data
+    from process_channel_list import process_channel_list
+
+    run_report.start('zerrendak', run_report.report_path(os.path.join(parent_dir, args.aux_folder), 'zerrendak'))
+    with run_report.timer('stage.eventos'):
+        result = parse_iframe_data(args.aux_folder, args.listas_folder, args.html_file, args.events_csv_file, args.m3u_events_file,
+                                   args.list_orig_file, db_file=args.db_file, force=args.force, html_backend=args.html_backend,
+                                   split_events=args.split_events, window_days=args.window, timezone=args.timezone)
+    with run_report.timer('stage.canales'):
+        regenerated = process_channel_list(args.aux_folder, args.listas_folder, args.list_orig_file, args.db_file,
+                                           args.csv_channels_file, args.csv_list_file, args.m3u_channels_file,
+                                           force=args.force, verbose=args.verbose, m3u_text=result.channels_m3u,
+                                           epg_files=args.epg_file)
+    # Copias .m3u.gz y manifest.json de las listas de las dos etapas
+    publish_folder(os.path.join(parent_dir, args.listas_folder))
+    # Sin cambios no se guarda el informe, para no tocar la carpeta auxiliar
+    if not regenerated and result.channels_m3u is None and result.event_count is None:
+        run_report.discard()
+    return result
+
+
+def command_serve(args, argv):
+    # El servidor (y con él asyncio) solo se importa al usarlo; sus opciones
+    # las lee su propio parser
+    import playlist_server
+
+    parser = argparse.ArgumentParser(prog='zerrendak.py serve', description='Servir las listas de canales y eventos por HTTP con filtros')
+    playlist_server.add_arguments(parser)
+    playlist_server.run(parser.parse_args(argv))
+
+
+def build_parser():
+    import parse_iframe_data
+    import process_channel_list
+
+    parser = argparse.ArgumentParser(description='Generar las listas de eventos y canales')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    eventos = subparsers.add_parser('eventos', help='Extraer los eventos y la lista de canales de la página descargada')
+    parse_iframe_data.add_arguments(eventos)
+    eventos.set_defaults(func=parse_iframe_data.run)
+
+    canales = subparsers.add_parser('canales', help='Importar la lista de canales y generar las listas de cada reproductor')
+    process_channel_list.add_arguments(canales)
+    canales.set_defaults(func=process_channel_list.run)
+
+    run = subparsers.add_parser('run', help='Ejecutar las dos etapas en un solo proceso')
+    run.add_argument('--aux_folder', default='aux', help='Directorio auxiliar para entrada HTML y salida CSV')
+    run.add_argument('--listas_folder', default='zerrendak', help='Directorio para los archivos M3U de salida')
+    run.add_argument('--html_file', default='page_iframe_content.html', help='Nombre del archivo HTML de entrada (sin ruta)')
+    run.add_argument('--events_csv_file', default='ekitaldiak.csv', help='Nombre del archivo CSV de eventos (sin ruta)')
+    run.add_argument('--m3u_events_file', default='ekitaldiak.m3u', help='Nombre del archivo M3U de eventos (sin ruta)')
+    run.add_argument('--list_orig_file', default='kanalak_jatorrizko.m3u', help='Nombre de la lista original de canales (sin ruta)')
+    run.add_argument('--db_file', default='zz_canales.db', help='Nombre del archivo sqlite (sin ruta)')
+    run.add_argument('--csv_channels_file', default='correspondencia_canales.csv', help='Nombre del archivo csv con correspondencia de canales (sin ruta)')
+    run.add_argument('--csv_list_file', default='canales_iptv_temp.csv', help='Nombre del CSV con la tabla canales_iptv_temp (sin ruta)')
+    run.add_argument('--m3u_channels_file', default='kanalak', help='Nombre base de los archivos M3U de canales (sin ruta)')
+    run.add_argument('--epg_file', action='append', help='Guía XMLTV (.xml o .xml.gz, sin ruta) para dar tvg-id a los canales sin correspondencia; se puede repetir')
+    run.add_argument('--force', action='store_true', help='Regenerar las salidas aunque las entradas no hayan cambiado')
+    run.add_argument('--html_backend', default='auto', choices=['auto', 'lxml', 'bs4'], help='Parser HTML para extraer los eventos (auto usa lxml si está instalado)')
+    run.add_argument('--split_events', choices=sorted(parse_iframe_data.SPLIT_MODES), help='Generar además una lista de eventos por día o por competición')
+    run.add_argument('--window', type=int, metavar='DIAS', help='Limitar las listas de eventos a los de las 3 últimas horas y los próximos DIAS días, por hora de inicio, y generar la lista de eventos en directo')
+    run.add_argument('--timezone', default=parse_iframe_data.DEFAULT_TIMEZONE, help='Zona horaria de las horas de los eventos de la página')
+    run.add_argument('-v', '--verbose', action='store_true', help='Registrar en el log cada canal leído y su correspondencia')
+    run.set_defaults(func=command_run)
+
+    serve = subparsers.add_parser('serve', add_help=False, help='Servir las listas por HTTP con filtros, generadas desde la base de datos '
+                                                                 '(opciones en serve --help)')
+    serve.set_defaults(func=command_serve)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.func is command_serve:
+        command_serve(args, extra)
+    elif extra:
+        parser.error(f"argumentos no reconocidos: {' '.join(extra)}")
+    else:
+        args.func(args)
+
+
+if __name__ == "__main__":
+    main()